@@ -0,0 +1,59 @@
+"""
+## Archive - ย้าย transactions ที่คืนแล้วไปเก็บใน archive (hot/cold tiering)
+
+ทุก transaction อยู่ใน collection "transactions" ตลอดไป แต่ query ที่ใช้บ่อย
+(ยืม, คืน, อนุมัติ, คิวอนุมัติ, สถิติ) สนใจแค่ Pending, Borrowed และ PendingReturn
+เมื่อประวัติมีหลายปี รายการที่คืนแล้วทำให้ collection และ index ใหญ่เกินหน่วยความจำ
+
+archive_returned ย้าย transactions ที่ Returned และคืนมานานกว่า ARCHIVE_AFTER_DAYS วัน
+ไปไว้ใน archive ทีละ batch (TransactionRepository.archive_batch):
+- MongoDB: collection "transactions_archive" เก็บเป็น bucket หนึ่งเอกสารต่อ (ผู้ใช้, เดือนที่คืน)
+  เขียนด้วย bulk_write ครั้งเดียวต่อ batch
+- เขียน bucket ก่อนแล้วจึงลบจาก collection หลัก ถ้าหยุดกลางทางให้รันใหม่ได้
+  ($addToSet ไม่เพิ่มรายการที่อยู่ใน bucket แล้วซ้ำ)
+
+ประวัติของผู้ใช้ export, GET /admin/transactions และสถิติอ่านทั้งสองที่ผ่าน
+TransactionRepository.documents / count / find (เรียงตาม borrow_date รวมกันทั้งสองที่)
+ส่วนคิวอนุมัติเห็นเฉพาะ collection หลัก (archive มีแต่รายการ Returned)
+
+สั่งย้ายได้ 2 แบบ:
+- API: POST /admin/jobs/archive-transactions (งานเบื้องหลัง)
+- CLI: python archive_transactions.py (ใช้กับ cron)
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from app.repositories import repositories
+
+## ARCHIVE_AFTER_DAYS - ย้าย transactions ที่คืนมานานกว่ากี่วัน
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+## ARCHIVE_BATCH_SIZE - จำนวน transactions ที่ย้ายต่อ batch
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+## bucket_month - เดือนของ bucket ที่ transaction ถูกเก็บ (ตามวันที่คืน)
+def bucket_month(doc: dict) -> str:
+    return (doc.get("return_date") or doc["borrow_date"]).strftime("%Y-%m")
+
+## archive_returned - ย้าย transactions ที่คืนก่อน cutoff ไปยัง archive ทีละ batch
+## on_batch: เรียกหลังแต่ละ batch ด้วย (จำนวนที่ย้ายแล้ว, จำนวนทั้งหมด) - ใช้รายงานความคืบหน้า
+async def archive_returned(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    on_batch: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> dict:
+    """Move old Returned transactions into monthly per-user archive buckets"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    transactions = repositories().transactions
+    total = await transactions.count_archivable(cutoff)
+    moved = buckets = 0
+    while True:
+        count, written = await transactions.archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        buckets += written
+        if on_batch is not None:
+            await on_batch(moved, max(total, moved))
+    return {"archived": moved, "buckets_written": buckets, "cutoff": cutoff}
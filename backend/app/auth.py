@@ -2,19 +2,27 @@
 ## Authentication & Authorization - ระบบยืนยันตัวตนและควบคุมสิทธิ์
 
 ไฟล์นี้จัดการ:
-1. การ hash และ verify password
+1. การ hash และ verify password (รันบน thread pool แยก ไม่บล็อก event loop)
 2. การสร้างและ verify JWT tokens
 3. การตรวจสอบสิทธิ์ผู้ใช้ (Authentication)
 4. การตรวจสอบบทบาทผู้ใช้ (Authorization - Admin vs User)
 """
 
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from types import MappingProxyType
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.models import User
+from pydantic import BaseModel
+from app.cache import principal_cache, principal_generation, store_principal
+from app.repositories import repositories
 
 ## ============================================
 ## JWT Configuration - ตั้งค่าสำหรับ JWT Token
@@ -40,6 +48,10 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 ## Password Functions - ฟังก์ชันจัดการรหัสผ่าน
 ## ============================================
 
+## BCRYPT_ROUNDS - จำนวนรอบของ bcrypt (cost factor) ค่าเริ่มต้น 12
+## tests ใช้ค่าต่ำ (4) เพื่อให้รันเร็ว - ไม่ควรลดค่านี้ใน production
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 ## verify_password - ตรวจสอบว่ารหัสผ่านที่ผู้ใช้ใส่ถูกต้องหรือไม่
 ## เปรียบเทียบ plain password กับ hashed password ที่เก็บในฐานข้อมูล
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -52,10 +64,105 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     # Generate salt และ hash password
     # bcrypt จะสร้าง salt อัตโนมัติและผสมกับ password
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
+## ============================================
+## Password Hashing Pool - รัน bcrypt บน thread pool แยก
+## ============================================
+
+## bcrypt ตั้งใจให้ช้า (หลายสิบถึงหลายร้อยมิลลิวินาที) ถ้าเรียกตรงๆ ใน async handler
+## จะบล็อก event loop ทั้ง worker ระหว่าง hash ทำให้ request อื่นทั้งหมดค้างไปด้วย
+## จึงส่งงาน hash ไปรันบน thread pool ที่จำกัดจำนวน thread และความยาวคิว
+
+## PASSWORD_HASH_WORKERS - จำนวน thread ที่ใช้ hash พร้อมกัน
+## PASSWORD_HASH_MAX_QUEUE - จำนวนงานที่รอคิวได้สูงสุด (เกินนี้จะตอบ 503 ให้ลองใหม่)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+## PasswordHashPool - thread pool สำหรับ bcrypt พร้อมสถิติคิวและเวลารอ
+class PasswordHashPool:
+    """Bounded executor for password hashing with queue and wait-time stats"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.queued = 0  # งานที่รอคิวอยู่ (ยังไม่เริ่ม hash)
+        self.running = 0  # งานที่กำลัง hash อยู่
+        self.completed = 0  # งานที่เสร็จแล้วทั้งหมด
+        self.rejected = 0  # งานที่ถูกปฏิเสธเพราะคิวเต็ม
+        self.total_wait = 0.0  # เวลารอคิวรวม (วินาที)
+        self.max_wait = 0.0  # เวลารอคิวนานที่สุด (วินาที)
+
+    ## _call - รันใน worker thread: บันทึกเวลารอคิวแล้วเรียกฟังก์ชันจริง
+    def _call(self, submitted_at: float, fn, *args):
+        waited = time.perf_counter() - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    ## run - ส่งงานเข้าคิวแล้วรอผลแบบ async (ไม่บล็อก event loop)
+    ## ถ้าคิวเต็มจะ throw HTTPException 503 พร้อม Retry-After
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many authentication requests. Please retry.",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+        future = self._executor.submit(self._call, time.perf_counter(), fn, *args)
+        future.add_done_callback(self._discard_cancelled)
+        # ถ้า request ถูกยกเลิกระหว่างรอ wrap_future จะยกเลิกงานที่ยังไม่เริ่มด้วย
+        return await asyncio.wrap_future(future)
+
+    ## _discard_cancelled - งานที่ถูกยกเลิกก่อนเริ่ม (เช่น client ตัดการเชื่อมต่อ) ไม่เคยเข้า _call
+    ## จึงต้องออกจากคิวที่นี่ ไม่อย่างนั้น queued จะค้างจนทุก request ได้ 503
+    def _discard_cancelled(self, future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    ## stats - สถิติของ pool สำหรับใช้ปรับขนาด workers/คิว
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / started * 1000, 3) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+## verify_password_async / get_password_hash_async - เวอร์ชัน async สำหรับใช้ใน routers
+## (ฟังก์ชันแบบ sync ด้านบนยังใช้ได้ใน scripts เช่น create_admin.py)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await password_hash_pool.run(get_password_hash, password)
+
 ## ============================================
 ## JWT Token Functions - ฟังก์ชันจัดการ JWT Token
 ## ============================================
@@ -77,10 +184,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 ## Authentication Dependencies - ฟังก์ชันตรวจสอบสิทธิ์
 ## ============================================
 
+## Principal - ผู้ใช้ที่ login อยู่ (ข้อมูลจากเอกสารผู้ใช้ ไม่รวมรหัสผ่าน)
+class Principal(BaseModel):
+    id: str
+    username: str
+    email: str
+    role: str
+    created_at: datetime
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "Principal":
+        return cls(
+            id=str(doc["_id"]),
+            username=doc["username"],
+            email=doc["email"],
+            role=doc.get("role", "user"),
+            created_at=doc["created_at"],
+        )
+
 ## get_current_user - ตรวจสอบและดึงข้อมูลผู้ใช้จาก JWT token
 ## ใช้เป็น dependency ใน endpoints ที่ต้องการ authentication
 ## ถ้า token ไม่ถูกต้องหรือหมดอายุจะ throw HTTPException
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -97,23 +222,34 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         # ถ้า token ไม่ถูกต้องหรือ decode ไม่ได้
         raise credentials_exception
     
+    # ใช้ผู้ใช้จากแคชถ้ามี (ไม่ต้อง query ฐานข้อมูลทุก request)
+    # แคชเก็บ snapshot ที่แก้ไขไม่ได้ แต่ละ request ได้ Principal object ของตัวเอง
+    # (handler ที่แก้ไข current_user จะไม่กระทบ request อื่นหรือข้อมูลในแคช)
+    snapshot = principal_cache.get(username)
+    if snapshot is not None:
+        return Principal(**snapshot)
+    
     # ค้นหาผู้ใช้จาก username ในฐานข้อมูล
-    user = await User.find_one(User.username == username)
+    # อ่าน generation ก่อน query: ถ้ามีการ invalidate ระหว่างรอ ผลนี้ใช้ได้กับ request นี้แต่ไม่เก็บลงแคช
+    generation = principal_generation()
+    user = await repositories().users.by_username(username)
     if user is None:
         # ถ้าไม่พบผู้ใช้
         raise credentials_exception
-    return user
+    principal = Principal.from_document(user)
+    store_principal(username, MappingProxyType(principal.model_dump()), generation)
+    return principal
 
 ## get_current_active_user - ตรวจสอบว่าผู้ใช้ active อยู่หรือไม่
 ## ใช้เป็น dependency สำหรับ endpoints ที่ต้องการแค่ authentication
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Get current active user"""
     return current_user  # คืนค่า user ที่ authenticated แล้ว
 
 ## get_current_admin - ตรวจสอบว่าผู้ใช้เป็น Admin หรือไม่
 ## ใช้เป็น dependency สำหรับ endpoints ที่ต้องการสิทธิ์ Admin เท่านั้น
 ## ถ้าไม่ใช่ Admin จะ throw HTTPException 403 Forbidden
-async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Get current admin user - requires admin role"""
     if current_user.role != "admin":
         raise HTTPException(
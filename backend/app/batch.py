@@ -0,0 +1,53 @@
+"""
+## Batch Fetch - ดึงเอกสารหลายรายการตาม ID ด้วย query เดียว
+
+หน้าจอที่ต้องแสดงหนังสือหรือผู้ใช้หลายรายการที่ถูกอ้างถึง (เช่น รายการยืม)
+ไม่ต้องเรียก GET /books/{id} ทีละรายการ แต่ส่ง ID ทั้งหมดมาใน ?ids=a,b,c ครั้งเดียว
+
+ไฟล์นี้ดึงเอกสารทั้งหมดด้วย $in query เดียว แล้วเรียงผลลัพธ์ตามลำดับ ID ที่ส่งมา
+ID ที่ไม่พบหรือรูปแบบไม่ถูกต้องจะถูกรายงานใน "missing" แทนที่จะทำให้ทั้ง request ล้มเหลว
+"""
+
+from typing import Callable, List, Optional, Type
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from app.serialization import project, projection_for
+
+## MAX_BATCH_IDS - จำนวน ID สูงสุดต่อ request
+MAX_BATCH_IDS = 500
+
+## parse_ids - แยก ?ids=a,b,c เป็น list (ตัด ID ซ้ำออกโดยคงลำดับเดิม)
+## ถ้าไม่มี ID หรือเกิน MAX_BATCH_IDS จะ throw HTTPException 400
+def parse_ids(ids: str) -> List[str]:
+    """Split a comma-separated ID list, keeping first-seen order"""
+    parsed = list(dict.fromkeys(part.strip() for part in ids.split(",") if part.strip()))
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No IDs given")
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} IDs per request",
+        )
+    return parsed
+
+## fetch_batch - ดึงเอกสารจาก repository ตาม ID ทั้งหมดด้วย get_many ครั้งเดียว ($in query เดียวใน MongoDB)
+## (caller เลือก repository เอง เช่น books ของ repos.catalog() เพื่ออ่านจาก secondary)
+## คืนค่า {"items": [...], "missing": [...]} โดย items มีโครงสร้างตาม schema
+async def fetch_batch(repository, ids: List[str], schema: Type[BaseModel]) -> dict:
+    """Resolve IDs in one get_many call, preserving request order"""
+    # ID ที่ส่งมา -> ObjectId (ข้าม ID ที่รูปแบบไม่ถูกต้อง ซึ่งจะถูกรายงานว่า missing)
+    oids = {i: ObjectId(i) for i in ids if ObjectId.is_valid(i)}
+    docs = await repository.get_many(list(oids.values()), projection_for(schema))
+    by_id = {doc["_id"]: doc for doc in docs}
+    return batch_result(ids, lambda i: by_id.get(oids.get(i)), schema)
+
+## batch_result - สร้างผลลัพธ์ตามลำดับ ID ที่ส่งมา จากฟังก์ชัน lookup (ID -> เอกสาร หรือ None)
+## ใช้ร่วมกันระหว่าง fetch_batch และการอ่านจากแคชของ catalog
+def batch_result(ids: List[str], lookup: Callable[[str], Optional[dict]], schema: Type[BaseModel]) -> dict:
+    """Shape looked-up documents into {"items", "missing"} in request order"""
+    docs = {i: lookup(i) for i in ids}
+    return {
+        "items": [project(doc, schema) for doc in docs.values() if doc is not None],
+        "missing": [i for i, doc in docs.items() if doc is None],
+    }
@@ -0,0 +1,119 @@
+"""
+## Cache - แคชในหน่วยความจำ (In-process TTL Cache)
+
+ไฟล์นี้มี TTLCache สำหรับเก็บผลลัพธ์ที่คำนวณแพงไว้ชั่วคราวในหน่วยความจำ
+- แต่ละรายการมีอายุ (TTL) เมื่อหมดอายุจะถูกคำนวณใหม่
+- จำกัดจำนวนรายการสูงสุด (maxsize) โดยลบรายการที่ใช้ล่าสุดน้อยที่สุดออก (LRU)
+
+หมายเหตุ: แคชนี้อยู่ในแต่ละ worker process ไม่ได้แชร์ข้ามเครื่อง/ข้าม process
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+## TTLCache - แคชแบบมีอายุและจำกัดขนาด (LRU)
+class TTLCache:
+    """Bounded in-memory cache with per-entry time-to-live"""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        self.maxsize = maxsize  # จำนวนรายการสูงสุด
+        self.ttl = ttl  # อายุของแต่ละรายการ (วินาที)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    ## get - ดึงค่าจากแคช (คืน None ถ้าไม่มีหรือหมดอายุแล้ว)
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            # หมดอายุแล้ว ลบออกจากแคช
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)  # ใช้ล่าสุด ย้ายไปท้ายคิว LRU
+        return value
+
+    ## set - เก็บค่าลงแคช (ถ้าเต็มจะลบรายการที่เก่าที่สุดออก)
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    ## invalidate - ลบรายการเดียวออกจากแคช
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    ## clear - ล้างแคชทั้งหมด
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+## ============================================
+## Shared Caches - แคชที่ใช้ร่วมกันระหว่าง routers
+## ============================================
+
+## stats_cache - แคชผลลัพธ์ของ GET /admin/stats
+## อายุสั้น (ค่าเริ่มต้น 5 วินาที) และถูกล้างทันทีเมื่อมีการยืม/คืน/แก้ไขผู้ใช้/หนังสือ
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "5"))
+stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+
+## _stats_generation - เพิ่มขึ้นทุกครั้งที่ invalidate_stats ถูกเรียก
+## การคำนวณที่เริ่มก่อนข้อมูลเปลี่ยนอาจอ่านข้อมูลเก่า จึงเก็บผลได้เฉพาะเมื่อ generation ยังไม่เปลี่ยน
+_stats_generation = 0
+
+## stats_generation - generation ปัจจุบัน (อ่านก่อนเริ่มคำนวณสถิติ)
+def stats_generation() -> int:
+    return _stats_generation
+
+## invalidate_stats - เรียกหลังจากข้อมูลที่มีผลต่อสถิติเปลี่ยนแปลง
+def invalidate_stats() -> None:
+    """Drop the cached admin statistics"""
+    global _stats_generation
+    _stats_generation += 1
+    stats_cache.clear()
+
+## store_stats - เก็บสถิติที่คำนวณเสร็จลงแคช ถ้าไม่มีการ invalidate ระหว่างคำนวณ
+## generation คือค่าที่อ่านจาก stats_generation() ก่อนเริ่มคำนวณ (คืน False ถ้าผลเก่าไปแล้ว)
+def store_stats(stats: dict, generation: int) -> bool:
+    """Cache computed statistics unless they were invalidated meanwhile"""
+    if generation != _stats_generation:
+        return False
+    stats_cache.set("stats", stats)
+    return True
+
+## principal_cache - แคชผู้ใช้ที่ยืนยันตัวตนแล้ว (key = username จาก JWT "sub")
+## ลดการ query User ทุกครั้งที่มี request ที่ต้อง login
+## อายุสั้น (ค่าเริ่มต้น 30 วินาที) เพื่อจำกัดเวลาที่ worker อื่นอาจเห็นข้อมูลเก่า
+## และถูกลบทันทีใน worker นี้เมื่อเปลี่ยน role หรือลบผู้ใช้
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+## _principal_generation - เพิ่มขึ้นทุกครั้งที่ invalidate_principal ถูกเรียก (เหมือน _stats_generation)
+## การโหลดผู้ใช้ที่เริ่มก่อนเปลี่ยน role/ลบผู้ใช้อาจได้ข้อมูลเก่า จึงห้ามเก็บผลนั้นลงแคช
+_principal_generation = 0
+
+## principal_generation - generation ปัจจุบัน (อ่านก่อน query ผู้ใช้)
+def principal_generation() -> int:
+    return _principal_generation
+
+## invalidate_principal - เรียกเมื่อสิทธิ์หรือข้อมูลของผู้ใช้เปลี่ยน
+def invalidate_principal(username: str) -> None:
+    """Evict a cached principal so the next request reloads it"""
+    global _principal_generation
+    _principal_generation += 1
+    principal_cache.invalidate(username)
+
+## store_principal - เก็บผู้ใช้ที่โหลดเสร็จลงแคช ถ้าไม่มีการ invalidate ระหว่างโหลด
+## generation คือค่าที่อ่านจาก principal_generation() ก่อน query (คืน False ถ้าผลเก่าไปแล้ว)
+def store_principal(username: str, snapshot: Any, generation: int) -> bool:
+    """Cache a loaded principal unless one was invalidated meanwhile"""
+    if generation != _principal_generation:
+        return False
+    principal_cache.set(username, snapshot)
+    return True
@@ -0,0 +1,55 @@
+"""
+## Catalog Version - เวอร์ชันของข้อมูลหนังสือสำหรับ Conditional GET (ETag)
+
+เลขเวอร์ชันของ catalog อ่านและเพิ่มผ่าน BookRepository.version / bump_version
+(MongoDB เก็บไว้ใน collection "catalog_meta" เอกสารเดียว)
+เลขเวอร์ชันจะเพิ่มขึ้นทุกครั้งที่หนังสือถูกเพิ่ม/แก้ไข/ลบ หรือจำนวนคงเหลือเปลี่ยน
+
+GET /books/ และ GET /books/{id} ใช้เวอร์ชันนี้สร้าง ETag
+ถ้า Frontend ส่ง If-None-Match ที่ตรงกับ ETag ปัจจุบัน จะตอบ 304 Not Modified
+โดยไม่ต้อง query หรือแปลงข้อมูลหนังสือเลย (อ่านแค่เอกสารเวอร์ชันเดียว)
+
+เก็บเวอร์ชันในฐานข้อมูล (ไม่ใช่ในหน่วยความจำ) เพื่อให้ทุก worker เห็นเวอร์ชันเดียวกัน
+"""
+
+import hashlib
+import os
+from typing import Optional
+from fastapi import Request, Response, status
+
+## ชื่อ collection และ _id ของเอกสารที่เก็บเวอร์ชัน
+CATALOG_META_COLLECTION = "catalog_meta"
+CATALOG_META_ID = "catalog"
+
+## CATALOG_MAX_AGE - จำนวนวินาทีที่ client ใช้ข้อมูลเดิมได้โดยไม่ต้องถามใหม่
+## ค่าเริ่มต้น 0 = ต้องถามทุกครั้ง แต่ถ้าไม่มีอะไรเปลี่ยนจะได้ 304 ที่ไม่มี body
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "0"))
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, must-revalidate"
+
+## catalog_etag - สร้าง weak ETag จากเวอร์ชันของ catalog และ "ตัวระบุ" ของ response
+## (เช่น query string ของหน้ารายการ หรือ ID ของหนังสือ)
+def catalog_etag(version: int, variant: str = "") -> str:
+    digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+## not_modified - ถ้า If-None-Match ตรงกับ ETag จะคืน Response 304, ถ้าไม่ตรงคืน None
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response when the client already has this version"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [tag.strip() for tag in header.split(",")]
+    if "*" in tags or etag in tags or etag.removeprefix("W/") in tags:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=catalog_headers(etag),
+        )
+    return None
+
+## catalog_headers - ETag และ Cache-Control สำหรับ response ปกติ (200)
+def catalog_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+
+## set_catalog_headers - ใส่ catalog_headers ให้ response ที่ FastAPI สร้างให้
+def set_catalog_headers(response: Response, etag: str) -> None:
+    response.headers.update(catalog_headers(etag))
@@ -0,0 +1,304 @@
+"""
+## Catalog Cache - แคชหนังสือทั้ง catalog ในหน่วยความจำ อัปเดตด้วย MongoDB change stream
+
+การอ่าน catalog (GET /books/, /books/{id}, /books/batch) เป็น traffic ส่วนใหญ่ของระบบ
+ไฟล์นี้เก็บหนังสือทุกเล่ม (เฉพาะ field ของ BookResponse) และเวอร์ชันของ catalog ไว้ในแต่ละ worker:
+
+- Warm start: ตอน startup โหลดหนังสือทั้งหมดก่อนรับ request แรก
+- Change stream: ติดตามการเปลี่ยนแปลงของ collection books และ catalog_meta
+  (เพิ่ม/แก้ไข/ลบ/จำนวนคงเหลือเปลี่ยน) แล้วแก้ไขแคชทันที
+  stream เริ่มจากเวลาก่อนโหลดข้อมูล จึงไม่มีการเปลี่ยนแปลงที่หลุดระหว่างโหลด
+  (event ที่ซ้ำกับข้อมูลที่โหลดแล้วไม่มีผล เพราะใช้เอกสารฉบับเต็มแทนที่ทั้งเล่ม)
+- Fallback: ถ้าไม่ได้รับข่าวจาก stream นานเกิน CATALOG_CACHE_MAX_LAG_SECONDS
+  (stream หลุด, server ไม่ตอบ) หรือ MongoDB ไม่ใช่ replica set (ไม่มี change stream)
+  router จะ query MongoDB ตรงเหมือนเดิม - ข้อมูลจากแคชจึงช้ากว่าฐานข้อมูลไม่เกินค่านี้
+
+ตั้งค่า:
+- CATALOG_CACHE_ENABLED: เปิด/ปิด (ค่าเริ่มต้นเปิด)
+- CATALOG_CACHE_MAX_LAG_SECONDS: ความล่าช้าสูงสุดที่ยอมรับได้ (ค่าเริ่มต้น 5 วินาที)
+
+ดูสถานะได้ที่ GET /admin/system/catalog-cache
+หมายเหตุ: การค้นหา (GET /books/search) ยังอ่านจาก BookRepository.search เพราะต้องใช้คะแนนของ text index
+ที่เก็บข้อมูลแบบ "memory" ไม่ใช้แคชนี้ (ข้อมูลอยู่ในหน่วยความจำอยู่แล้ว) แต่ใช้ BookIndex ตัวเดียวกัน
+"""
+
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo.errors import OperationFailure, PyMongoError
+from app.catalog import CATALOG_META_COLLECTION, CATALOG_META_ID
+from app.pagination import decode_cursor
+from app.schemas import BookResponse
+from app.serialization import projection_for
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CATALOG_CACHE_MAX_LAG = float(os.getenv("CATALOG_CACHE_MAX_LAG_SECONDS", "5"))
+
+## event ที่ทำให้ stream ปิด (collection ถูกลบ/เปลี่ยนชื่อ) - ต้องโหลดข้อมูลใหม่ทั้งหมด
+_RELOAD_EVENTS = frozenset({"drop", "rename", "dropDatabase", "invalidate"})
+
+## error code ของ MongoDB เมื่อ resume token เก่าเกินไป (oplog ถูกเขียนทับแล้ว)
+_CHANGE_STREAM_HISTORY_LOST = 286
+
+## field ของหนังสือที่เก็บในแคช (เหมือนที่ router ดึงจาก MongoDB)
+_FIELDS = tuple(projection_for(BookResponse))
+
+## เวลาที่เว้นก่อนเชื่อมต่อ stream ใหม่เมื่อเกิดข้อผิดพลาด (เพิ่มเป็นสองเท่าจนถึงค่าสูงสุด)
+_RETRY_DELAY = 1.0
+_MAX_RETRY_DELAY = 30.0
+
+## BookIndex - หนังสือในหน่วยความจำ พร้อม index สำหรับแบ่งหน้าและค้นหา ISBN
+## ใช้ทั้งใน CatalogCache และที่เก็บหนังสือของ MemoryRepositories (app/repositories/memory.py)
+## ทำงานใน event loop เดียว จึงไม่ต้องใช้ lock
+class BookIndex:
+    """Books keyed by _id with ISBN, _id and (title, _id) indexes"""
+
+    def __init__(self):
+        self._books: Dict[ObjectId, dict] = {}
+        self._isbn: Dict[str, ObjectId] = {}
+        self._id_order: List[ObjectId] = []  # เรียงตาม _id
+        self._title_order: List[Tuple[str, ObjectId]] = []  # เรียงตาม (title, _id)
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    ## ============================================
+    ## อ่านข้อมูล
+    ## ============================================
+
+    ## get - ดึงหนังสือตาม ID (string) หรือ None ถ้าไม่พบ/ID ไม่ถูกต้อง
+    def get(self, book_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(book_id):
+            return None
+        return self._books.get(ObjectId(book_id))
+
+    ## by_isbn - ดึงหนังสือตาม ISBN
+    def by_isbn(self, isbn: str) -> Optional[dict]:
+        oid = self._isbn.get(isbn)
+        return self._books.get(oid) if oid is not None else None
+
+    ## all - หนังสือทุกเล่มเรียงตาม _id
+    def all(self) -> List[dict]:
+        return [self._books[oid] for oid in self._id_order]
+
+    ## page - หนังสือหนึ่งหน้าต่อจาก cursor (ลำดับเดียวกับ keyset_filter/keyset_sort)
+    def page(self, after: Optional[str], sort_field: Optional[str], limit: int) -> List[dict]:
+        """Return up to limit books after the cursor, like the keyset query"""
+        if sort_field is None:
+            order, start = self._id_order, 0
+            if after:
+                start = bisect_right(order, decode_cursor(after)[0])
+            return [self._books[oid] for oid in order[start:start + limit]]
+        order, start = self._title_order, 0
+        if after:
+            last_id, last_value = decode_cursor(after)
+            if not isinstance(last_value, str):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            start = bisect_right(order, (last_value, last_id))
+        return [self._books[oid] for _, oid in order[start:start + limit]]
+
+    ## ============================================
+    ## แก้ไขข้อมูล
+    ## ============================================
+
+    ## _store - เก็บหนังสือใน dict หลักและ index ของ ISBN (คืนเอกสารที่เก็บ)
+    def _store(self, doc: dict) -> dict:
+        oid = doc["_id"]
+        book = {"_id": oid, **{name: doc.get(name) for name in _FIELDS}}
+        self._books[oid] = book
+        self._isbn[book["isbn"]] = oid
+        return book
+
+    ## put - เพิ่มหรือแทนที่หนังสือหนึ่งเล่ม (แก้ index ทุกตัว) แล้วคืนเอกสารที่เก็บ
+    def put(self, doc: dict) -> dict:
+        oid = doc["_id"]
+        self.remove(oid)
+        book = self._store(doc)
+        insort(self._id_order, oid)
+        insort(self._title_order, (book["title"], oid))
+        return book
+
+    ## remove - ลบหนังสือหนึ่งเล่ม (คืน False ถ้าไม่มีเล่มนี้)
+    def remove(self, oid: ObjectId) -> bool:
+        book = self._books.pop(oid, None)
+        if book is None:
+            return False
+        if self._isbn.get(book["isbn"]) == oid:
+            del self._isbn[book["isbn"]]
+        del self._id_order[bisect_right(self._id_order, oid) - 1]
+        del self._title_order[bisect_right(self._title_order, (book["title"], oid)) - 1]
+        return True
+
+    ## replace - แทนที่ข้อมูลทั้งหมดด้วยหนังสือชุดใหม่
+    def replace(self, books: List[dict]) -> None:
+        self._books.clear()
+        self._isbn.clear()
+        for doc in books:
+            self._store(doc)
+        # เรียงครั้งเดียวหลังโหลดครบ (เร็วกว่า insort ทีละเล่ม)
+        self._id_order = sorted(self._books)
+        self._title_order = sorted((book["title"], oid) for oid, book in self._books.items())
+
+## CatalogCache - หนังสือทั้ง catalog ของ worker นี้ (BookIndex) และเวอร์ชันของ catalog
+class CatalogCache(BookIndex):
+    """In-process copy of the book catalog kept current by a change stream"""
+
+    def __init__(self, max_lag: float = CATALOG_CACHE_MAX_LAG):
+        super().__init__()
+        self.max_lag = max_lag
+        self.version = 0  # เวอร์ชันของ catalog (สำหรับ ETag)
+        self.reloads = 0  # จำนวนครั้งที่โหลดข้อมูลทั้งหมด
+        self.events = 0  # จำนวน change event ที่นำมาใช้แล้ว
+        self._loaded = False
+        self._heartbeat: Optional[float] = None  # เวลาล่าสุดที่ stream ตอบ (time.monotonic)
+        self._collection = None
+        self._task: Optional[asyncio.Task] = None
+
+    ## ready - ใช้แคชได้หรือไม่ (โหลดแล้ว และ stream ยังตอบภายใน max_lag)
+    @property
+    def ready(self) -> bool:
+        return (
+            self._loaded
+            and self._heartbeat is not None
+            and time.monotonic() - self._heartbeat <= self.max_lag
+        )
+
+    ## stats - สถานะของแคช (สำหรับ GET /admin/system/catalog-cache)
+    def stats(self) -> dict:
+        lag = None if self._heartbeat is None else round(time.monotonic() - self._heartbeat, 3)
+        return {
+            "enabled": CATALOG_CACHE_ENABLED,
+            "ready": self.ready,
+            "books": len(self._books),
+            "version": self.version,
+            "seconds_since_heartbeat": lag,
+            "max_lag_seconds": self.max_lag,
+            "reloads": self.reloads,
+            "events": self.events,
+        }
+
+    ## load - แทนที่แคชด้วยข้อมูลทั้งหมดจาก MongoDB
+    def load(self, books: List[dict], version: int) -> None:
+        """Replace the cache contents with a full snapshot"""
+        self.replace(books)
+        self.version = version
+        self.reloads += 1
+        self._loaded = True
+        self._heartbeat = time.monotonic()  # ข้อมูลที่เพิ่งโหลดเป็นข้อมูลปัจจุบัน
+
+    ## apply - นำ change event หนึ่งรายการมาใช้ (คืน False ถ้าต้องโหลดข้อมูลใหม่ทั้งหมด)
+    ## event ของ books ใช้ fullDocument (full_document="updateLookup") แทนที่ทั้งเล่ม
+    def apply(self, change: dict) -> bool:
+        """Apply one change stream event to the cache"""
+        operation = change["operationType"]
+        if operation in _RELOAD_EVENTS:
+            self._loaded = False
+            return False
+        self.events += 1
+        document = change.get("fullDocument")
+        if change["ns"]["coll"] == CATALOG_META_COLLECTION:
+            if document is not None and document.get("_id") == CATALOG_META_ID:
+                self.version = document.get("version", 0)
+            return True
+        if operation == "delete" or document is None:
+            # document เป็น None เมื่อหนังสือถูกลบไปแล้วก่อนที่ stream จะ lookup
+            self.remove(change["documentKey"]["_id"])
+        else:
+            self.put(document)
+        return True
+
+    ## ============================================
+    ## Change Stream
+    ## ============================================
+
+    ## start - โหลดข้อมูลเริ่มต้นและเริ่ม task ที่ติดตาม change stream
+    ## ถ้า MongoDB ไม่ใช่ replica set จะไม่เปิดแคช (เรียกผ่าน Repositories.start_catalog_cache)
+    async def start(self, collection) -> None:
+        """Warm the cache and follow the change stream in the background"""
+        self._collection = collection
+        try:
+            start_at = await self._operation_time()
+        except PyMongoError as exc:
+            logger.warning("Catalog cache disabled, could not reach MongoDB: %s", exc)
+            return
+        if start_at is None:
+            logger.info("Catalog cache disabled: MongoDB is not a replica set (no change streams)")
+            return
+        try:
+            await self._load()
+        except PyMongoError as exc:
+            logger.warning("Catalog cache warm start failed, will retry: %s", exc)
+        self._task = asyncio.create_task(self._follow(start_at))
+
+    ## stop - หยุด task ของ change stream (ตอน shutdown)
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loaded = False
+
+    ## _operation_time - เวลาล่าสุดของ cluster (None ถ้าไม่ใช่ replica set)
+    async def _operation_time(self):
+        reply = await self._collection.database.command("ping")
+        return reply.get("operationTime")
+
+    ## _load - อ่านหนังสือทั้งหมดและเวอร์ชันของ catalog จาก primary
+    async def _load(self) -> None:
+        database = self._collection.database
+        books, meta = await asyncio.gather(
+            self._collection.find({}, projection_for(BookResponse)).to_list(length=None),
+            database[CATALOG_META_COLLECTION].find_one({"_id": CATALOG_META_ID}),
+        )
+        self.load(books, meta["version"] if meta else 0)
+        logger.info("Catalog cache loaded %d books (version %d)", len(books), self.version)
+
+    ## _follow - ติดตาม change stream ไปเรื่อยๆ และเชื่อมต่อใหม่เมื่อเกิดข้อผิดพลาด
+    ## - เริ่มจาก start_at (เวลาก่อนโหลดข้อมูลครั้งแรก) แล้ว resume ต่อจาก resume token
+    ## - ถ้า resume ไม่ได้หรือ collection ถูกลบ จะโหลดข้อมูลทั้งหมดใหม่
+    ## try_next รอไม่เกิน max_await_time แม้ไม่มีการเปลี่ยนแปลง ทำให้ heartbeat อัปเดตสม่ำเสมอ
+    async def _follow(self, start_at) -> None:
+        database = self._collection.database
+        pipeline = [{"$match": {"ns.coll": {"$in": [self._collection.name, CATALOG_META_COLLECTION]}}}]
+        await_ms = max(int(self.max_lag * 1000 / 5), 100)
+        resume_token = None
+        delay = _RETRY_DELAY
+        while True:
+            try:
+                if not self._loaded:
+                    start_at = await self._operation_time()
+                    await self._load()
+                    resume_token = None
+                options = {"resume_after": resume_token} if resume_token else {"start_at_operation_time": start_at}
+                async with database.watch(
+                    pipeline, full_document="updateLookup", max_await_time_ms=await_ms, **options
+                ) as stream:
+                    while stream.alive:
+                        change = await stream.try_next()
+                        self._heartbeat = time.monotonic()
+                        delay = _RETRY_DELAY
+                        if change is not None and not self.apply(change):
+                            break
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as exc:
+                logger.warning("Catalog change stream failed, retrying in %.0fs: %s", delay, exc)
+                # ถ้า resume ไม่ได้ (oplog ถูกเขียนทับไปแล้ว) ให้โหลดข้อมูลใหม่ทั้งหมด
+                if isinstance(exc, OperationFailure) and exc.code == _CHANGE_STREAM_HISTORY_LOST:
+                    self._loaded = False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _MAX_RETRY_DELAY)
+
+## catalog_cache - แคชที่ใช้ร่วมกันทั้ง worker
+catalog_cache = CatalogCache()
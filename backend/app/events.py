@@ -0,0 +1,162 @@
+"""
+## Events - ส่งการเปลี่ยนสถานะของ transactions ให้ Admin แบบ real-time (Server-Sent Events)
+
+แทนที่ TransactionsScreen จะ poll GET /admin/transactions (ทั้ง collection) ซ้ำๆ
+Admin เปิด GET /admin/events ค้างไว้ แล้ว server จะส่ง event ทุกครั้งที่:
+- ผู้ใช้ยืมหนังสือ (สร้าง transaction สถานะ Pending)
+- ผู้ใช้ขอคืนหนังสือ (Borrowed -> PendingReturn)
+- Admin อนุมัติการยืม/การคืน (ทีละรายการหรือแบบ bulk)
+
+ออกแบบให้รองรับการเชื่อมต่อที่ไม่ค่อยมี event หลายพันตัวต่อ worker:
+- แต่ละการเชื่อมต่อมีแค่ coroutine หนึ่งตัวและคิวขนาดจำกัด (EVENTS_QUEUE_SIZE) ไม่มี query ต่อการเชื่อมต่อ
+- publish ไม่รอผู้รับ (put_nowait) - client ที่อ่านช้าจนคิวเต็มจะถูกล้างคิว
+  และได้ event "resync" แทน (ให้โหลดรายการใหม่) จึงไม่ทำให้ผู้ส่งหรือหน่วยความจำโตตาม client ที่ช้า
+- heartbeat (comment ": ping") ทุก EVENTS_HEARTBEAT_SECONDS เพื่อให้ proxy ไม่ตัดการเชื่อมต่อ
+  และตรวจพบ client ที่หลุดไปแล้ว
+- event ล่าสุด EVENTS_REPLAY_SIZE รายการถูกเก็บไว้ ถ้า client เชื่อมต่อใหม่พร้อม Last-Event-ID
+  จะได้รับ event ที่พลาดไป (ถ้าเก่าเกินไปจะได้ "resync")
+
+หมายเหตุ: event อยู่ในแต่ละ worker process - Admin จะเห็นเฉพาะการเปลี่ยนแปลงที่เกิดใน worker เดียวกัน
+(Dockerfile รัน worker เดียว) ถ้ารันหลาย worker ควรใช้ "resync" ร่วมกับการโหลดรายการเป็นระยะ
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator, Optional, Set
+from app.serialization import dumps
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "64"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "256"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+
+## เวลาที่ EventSource รอก่อนเชื่อมต่อใหม่ (มิลลิวินาที)
+EVENTS_RETRY_MS = 3000
+
+## Subscriber - การเชื่อมต่อหนึ่งตัว (คิวของ event ที่ยังไม่ได้ส่ง)
+class Subscriber:
+    """One connected client and its bounded event queue"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+## EventBroker - กระจาย event ไปยังทุกการเชื่อมต่อ (ทำงานใน event loop เดียว ไม่ต้องใช้ lock)
+class EventBroker:
+    """Fan out events to connected clients without waiting on slow readers"""
+
+    def __init__(
+        self,
+        queue_size: int = EVENTS_QUEUE_SIZE,
+        replay_size: int = EVENTS_REPLAY_SIZE,
+        max_subscribers: int = EVENTS_MAX_SUBSCRIBERS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0  # จำนวน event ที่ส่งออกไปแล้ว
+        self.overflows = 0  # จำนวนครั้งที่คิวของ client เต็ม (ถูกแทนด้วย resync)
+        self._subscribers: Set[Subscriber] = set()
+        self._recent: deque = deque(maxlen=replay_size)
+        self._last_id = 0
+
+    ## publish - ส่ง event ให้ทุกการเชื่อมต่อ (ไม่ block)
+    def publish(self, event_type: str, data: dict) -> dict:
+        """Queue an event for every subscriber"""
+        self._last_id += 1
+        event = {"id": self._last_id, "event": event_type, "data": data}
+        self._recent.append(event)
+        self.published += 1
+        for subscriber in self._subscribers:
+            self._deliver(subscriber, event)
+        return event
+
+    ## _deliver - ใส่ event ในคิวของ client ถ้าคิวเต็มให้ล้างคิวแล้วส่ง resync แทน
+    def _deliver(self, subscriber: Subscriber, event: dict) -> None:
+        try:
+            subscriber.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            self._resync(subscriber)
+
+    def _resync(self, subscriber: Subscriber) -> None:
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait({"id": self._last_id, "event": "resync", "data": {}})
+
+    ## full - จำนวนการเชื่อมต่อถึง max_subscribers แล้ว (endpoint ตอบ 503)
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    ## subscribe - ลงทะเบียนการเชื่อมต่อใหม่
+    ## last_event_id: ID ของ event สุดท้ายที่ client ได้รับ (จาก header Last-Event-ID)
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a client, replaying events it missed since last_event_id"""
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id is not None and last_event_id < self._last_id:
+            missed = [event for event in self._recent if event["id"] > last_event_id]
+            oldest = self._recent[0]["id"] if self._recent else self._last_id + 1
+            if oldest > last_event_id + 1 or len(missed) > self.queue_size:
+                # event ที่พลาดไปไม่อยู่ใน buffer แล้ว (หรือมากเกินคิว) ให้ client โหลดใหม่
+                self._resync(subscriber)
+            else:
+                for event in missed:
+                    subscriber.queue.put_nowait(event)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    ## unsubscribe - ยกเลิกการเชื่อมต่อ (เรียกเมื่อ client ปิดการเชื่อมต่อ)
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    ## stats - จำนวนการเชื่อมต่อและ event (สำหรับ GET /admin/system/events)
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "published": self.published,
+            "last_event_id": self._last_id,
+            "overflows": self.overflows,
+            "queue_size": self.queue_size,
+        }
+
+## event_broker - broker ที่ใช้ร่วมกันทั้ง worker
+event_broker = EventBroker()
+
+## publish_transaction - ส่ง event การเปลี่ยนสถานะของ transaction ให้ Admin
+## previous_status เป็น None เมื่อเป็น transaction ใหม่
+def publish_transaction(transaction_id, user_id: str, book_id: str, status: str, previous_status: Optional[str] = None) -> None:
+    """Announce a transaction status change to connected admins"""
+    event_broker.publish("transaction", {
+        "transaction_id": str(transaction_id),
+        "user_id": user_id,
+        "book_id": book_id,
+        "status": status,
+        "previous_status": previous_status,
+    })
+
+## format_sse - แปลง event เป็นรูปแบบ text/event-stream
+def format_sse(event: dict) -> bytes:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: ".encode("utf-8") + dumps(event["data"]) + b"\n\n"
+
+## sse_stream - body ของ StreamingResponse สำหรับการเชื่อมต่อหนึ่งตัว
+## ลงทะเบียนเมื่อเริ่มส่ง response (ไม่ค้างใน broker ถ้า response ไม่เคยเริ่ม)
+## ส่ง heartbeat เมื่อไม่มี event ภายใน heartbeat วินาที และยกเลิกการลงทะเบียนเมื่อ client หลุด
+async def sse_stream(
+    broker: EventBroker,
+    last_event_id: Optional[int] = None,
+    heartbeat: float = EVENTS_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """Yield queued events as SSE frames, with comment heartbeats"""
+    subscriber = broker.subscribe(last_event_id)
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n".encode("utf-8")
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscriber)
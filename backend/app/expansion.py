@@ -0,0 +1,44 @@
+"""
+## Expansion - เติมรายละเอียดหนังสือและผู้ใช้ให้ transactions
+
+Transaction เก็บแค่ user_id และ book_id ถ้าให้ Frontend ไปดึงชื่อหนังสือ/ชื่อผู้ใช้เอง
+จะต้องเรียก API ทีละรายการ (N+1 requests)
+
+ไฟล์นี้ดึงหนังสือและผู้ใช้ทั้งหมดที่ถูกอ้างถึงในหนึ่งหน้า ด้วย get_many ครั้งเดียวต่อ repository
+($in query เดียวต่อ collection, รันพร้อมกัน) แล้วเติม book_title, book_author และ username ลงในแต่ละ transaction
+
+endpoint ของ Admin ส่ง repos.reporting เพื่อให้ lookup อ่านจาก replica เดียวกับรายการ
+"""
+
+import asyncio
+from typing import List
+from bson import ObjectId
+from app.repositories import Repositories
+
+## _object_ids - แปลง ID (string) เป็น ObjectId โดยข้าม ID ที่ไม่ถูกต้อง
+def _object_ids(ids) -> list:
+    return [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+
+## _by_id - ดึงเอกสารตาม ID ทั้งหมดด้วย get_many ครั้งเดียว (เฉพาะ field ที่ต้องใช้)
+async def _by_id(repository, ids, fields: dict) -> dict:
+    oids = _object_ids(ids)
+    if not oids:
+        return {}
+    docs = await repository.get_many(oids, fields)
+    return {str(doc["_id"]): doc for doc in docs}
+
+## expand_transactions - เติมรายละเอียดหนังสือและผู้ใช้ให้ transactions (แก้ไขใน list เดิม)
+## รับเอกสารดิบ (dict) และคืน list เดิมที่มี field เพิ่มแล้ว
+## repos: repositories ที่ใช้อ่าน (เช่น repos.reporting)
+async def expand_transactions(transactions: List[dict], repos: Repositories) -> List[dict]:
+    """Attach book_title, book_author and username with one lookup per repository"""
+    books, users = await asyncio.gather(
+        _by_id(repos.books, {t["book_id"] for t in transactions}, {"title": 1, "author": 1}),
+        _by_id(repos.users, {t["user_id"] for t in transactions}, {"username": 1}),
+    )
+    for t in transactions:
+        book = books.get(t["book_id"], {})
+        t["book_title"] = book.get("title")
+        t["book_author"] = book.get("author")
+        t["username"] = users.get(t["user_id"], {}).get("username")
+    return transactions
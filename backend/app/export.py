@@ -0,0 +1,100 @@
+"""
+## Export - ส่งออกข้อมูลทั้ง collection แบบ stream (NDJSON หรือ CSV)
+
+GET /admin/transactions ดึงทุกรายการเข้าหน่วยความจำด้วย to_list() ก่อนตอบกลับ
+ซึ่งใช้หน่วยความจำมากและช้าเมื่อประวัติการยืม-คืนมีหลายปี
+
+ไฟล์นี้อ่านเอกสารจาก repository (เช่น BookRepository.stream) ทีละ batch แล้วส่งออกไปทีละ chunk ผ่าน StreamingResponse
+หน่วยความจำที่ใช้จึงคงที่ไม่ว่า collection จะใหญ่แค่ไหน
+field ที่ส่งออกถูกกำหนดโดย Response schema เหมือนกับ list endpoints
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, Type
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.serialization import dumps, project
+
+## EXPORT_BATCH_SIZE - จำนวนเอกสารที่อ่านจากที่เก็บข้อมูลต่อ batch (และต่อ chunk ที่ส่งออก)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+## EXPORT_MEDIA_TYPES - Content-Type ของแต่ละรูปแบบ
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+## _csv_value - แปลงค่าเป็นข้อความสำหรับ CSV (None = ช่องว่าง)
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+## _batches - อ่านเอกสารทีละ batch (list ของเอกสารไม่เกิน batch_size รายการ)
+async def _batches(cursor, batch_size: int) -> AsyncIterator[list]:
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+## _ndjson_chunks - หนึ่ง JSON object ต่อบรรทัด
+async def _ndjson_chunks(cursor, schema: Type[BaseModel], batch_size: int) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield b"".join(dumps(project(doc, schema)) + b"\n" for doc in batch)
+
+## _csv_chunks - บรรทัดแรกเป็น header (ชื่อ field ของ schema) ตามด้วยข้อมูล
+async def _csv_chunks(cursor, schema: Type[BaseModel], batch_size: int) -> AsyncIterator[bytes]:
+    fields = list(schema.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for batch in _batches(cursor, batch_size):
+        for doc in batch:
+            row = project(doc, schema)
+            writer.writerow([_csv_value(row[name]) for name in fields])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # collection ว่าง: ส่งแค่ header
+        yield buffer.getvalue().encode("utf-8")
+
+## serialize_chunks - แปลงเอกสาร (async iterator ใดๆ เช่นจาก repository) เป็น chunk ของ NDJSON หรือ CSV
+## หนึ่ง chunk ต่อ batch_size เอกสาร
+def serialize_chunks(
+    docs,
+    schema: Type[BaseModel],
+    fmt: str,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """Serialize documents as NDJSON or CSV, one chunk per batch"""
+    chunks = _ndjson_chunks if fmt == "ndjson" else _csv_chunks
+    return chunks(docs, schema, batch_size)
+
+## export_response - StreamingResponse สำหรับดาวน์โหลด chunk ที่ได้จาก serialize_chunks
+def export_response(chunks: AsyncIterator[bytes], fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+## stream_export - สร้าง StreamingResponse สำหรับส่งออกเอกสาร (เช่น BookRepository.stream)
+## (งาน export เบื้องหลังใน app/job_tasks.py เขียนลงไฟล์ด้วย serialize_chunks ตรง)
+def stream_export(
+    docs: AsyncIterator[dict],
+    schema: Type[BaseModel],
+    fmt: str,
+    filename: str,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> StreamingResponse:
+    """Stream documents as NDJSON or CSV, one batch at a time"""
+    return export_response(serialize_chunks(docs, schema, fmt, batch_size), fmt, filename)
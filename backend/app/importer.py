@@ -0,0 +1,179 @@
+"""
+## Book Import - นำเข้าหนังสือจำนวนมากจากไฟล์ CSV หรือ NDJSON
+
+การเพิ่มหนังสือทีละเล่มผ่าน POST /books/ ต้องเช็ค ISBN และ insert ทีละรายการ
+ถ้ามีหนังสือหลายหมื่นเล่มจะใช้เวลานานมาก
+
+ไฟล์นี้อ่านข้อมูลแบบ stream (ทีละ chunk ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ)
+ตรวจสอบแต่ละแถวด้วย BookCreate แล้วเขียนลงฐานข้อมูลเป็นชุดๆ ด้วย BookRepository.write_batch
+(MongoDB: bulk_write ครั้งเดียวต่อชุด และให้ unique index ของ isbn ตรวจ ISBN ซ้ำแทนการ find_one ทีละแถว)
+
+ใช้งานได้ 2 แบบ:
+- API: POST /books/import (Admin only)
+- CLI: python import_books.py books.csv
+"""
+
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Optional
+from pydantic import ValidationError
+from app.schemas import BookCreate, BookImportError, BookImportSummary
+from app.cache import invalidate_stats
+from app.repositories import repositories
+
+## IMPORT_BATCH_SIZE - จำนวนแถวที่เขียนลงฐานข้อมูลต่อหนึ่ง write_batch
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+## MAX_REPORTED_ERRORS - จำนวนแถวที่ถูกปฏิเสธสูงสุดที่รายงานรายละเอียดกลับไป
+## (นับจำนวน rejected ทั้งหมดเสมอ แต่เก็บรายละเอียดแค่ส่วนแรก เพื่อไม่ให้หน่วยความจำโตตามไฟล์)
+MAX_REPORTED_ERRORS = 100
+
+## MAX_LINE_BYTES - ความยาวสูงสุดของหนึ่งบรรทัด (ป้องกันไฟล์ที่ไม่มีการขึ้นบรรทัดใหม่)
+MAX_LINE_BYTES = 1024 * 1024
+
+## ImportFormatError - ไฟล์มีรูปแบบผิดจนอ่านต่อไม่ได้ (เช่น ไม่มี header ที่ต้องใช้)
+class ImportFormatError(ValueError):
+    pass
+
+## _lines - แยก stream ของ bytes เป็นทีละบรรทัด (รวม "\n" ท้ายบรรทัด)
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if first:
+                line = line.removeprefix(b"\xef\xbb\xbf")  # ตัด BOM ของ UTF-8 (ไฟล์จาก Excel)
+                first = False
+            yield line + b"\n"
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ImportFormatError("Line too long")
+    if buffer:
+        yield buffer.removeprefix(b"\xef\xbb\xbf") if first else buffer
+
+## _csv_rows - อ่านแถวจาก CSV (บรรทัดแรกเป็น header)
+## yield (เลขบรรทัด, dict ของแถว, ข้อความ error หรือ None)
+async def _csv_rows(lines: AsyncIterator[bytes]):
+    header = None
+    record, start, line_no = "", 0, 0
+    async for raw in lines:
+        line_no += 1
+        if not record:
+            start = line_no
+        try:
+            record += raw.decode("utf-8")
+        except UnicodeDecodeError:
+            record = ""
+            yield start, None, "Invalid UTF-8"
+            continue
+        # จำนวนเครื่องหมายคำพูดเป็นเลขคี่ = ค่าใน "..." ยังมีการขึ้นบรรทัดใหม่ อ่านบรรทัดถัดไปต่อ
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader(io.StringIO(text)))
+        if header is None:
+            header = [value.strip().lower() for value in values]
+            missing = [name for name in ("title", "author", "isbn", "quantity") if name not in header]
+            if missing:
+                raise ImportFormatError(f"CSV header is missing columns: {', '.join(missing)}")
+            continue
+        if len(values) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # ช่องว่างถือว่าไม่ได้ระบุค่า (เช่น image_url)
+        yield start, {name: value for name, value in zip(header, values) if value != ""}, None
+    if record.strip():
+        yield start, None, "Unterminated quoted field"
+
+## _ndjson_rows - อ่านแถวจาก NDJSON (หนึ่ง JSON object ต่อบรรทัด)
+async def _ndjson_rows(lines: AsyncIterator[bytes]):
+    line_no = 0
+    async for raw in lines:
+        line_no += 1
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            yield line_no, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, row, None
+
+## IMPORT_FORMATS - รูปแบบไฟล์ที่รองรับ
+IMPORT_FORMATS = {"csv": _csv_rows, "ndjson": _ndjson_rows}
+
+## format_from_content_type - เลือกรูปแบบไฟล์จาก Content-Type ของ request
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+## _describe - สรุป ValidationError ของ Pydantic เป็นข้อความสั้นๆ
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+## _reject - นับแถวที่ถูกปฏิเสธ และเก็บรายละเอียดไว้ถ้ายังไม่เกิน MAX_REPORTED_ERRORS
+def _reject(summary: BookImportSummary, line: int, detail: str) -> None:
+    summary.rejected += 1
+    if len(summary.errors) < MAX_REPORTED_ERRORS:
+        summary.errors.append(BookImportError(line=line, detail=detail))
+
+## _write_batch - เขียนหนึ่งชุดด้วย write_batch (แถวที่ผิดไม่หยุดแถวอื่น)
+## - insert: ISBN ที่มีอยู่แล้วจะถูกปฏิเสธ
+## - upsert: ISBN ที่มีอยู่แล้วจะถูกแก้ไขข้อมูลแทน
+async def _write_batch(batch: list, upsert: bool, summary: BookImportSummary) -> None:
+    result = await repositories().books.write_batch([doc for _, doc in batch], upsert)
+    summary.inserted += result.inserted
+    summary.updated += result.updated
+    for error in result.errors:
+        line = batch[error.index][0]
+        _reject(summary, line, "Book with this ISBN already exists" if error.duplicate else error.message)
+
+## import_books - นำเข้าหนังสือจาก stream ของ bytes (ไฟล์ CSV หรือ NDJSON)
+## upsert=True: แก้ไขหนังสือที่มี ISBN ซ้ำแทนการปฏิเสธ
+## ถ้าไฟล์มีรูปแบบผิดจนอ่านต่อไม่ได้จะ throw ImportFormatError
+## (ชุดที่เขียนไปแล้วก่อนเกิด error จะยังอยู่ในฐานข้อมูล)
+async def import_books(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    upsert: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> BookImportSummary:
+    """Stream-parse, validate and bulk-write books, returning a summary"""
+    summary = BookImportSummary(inserted=0, updated=0, rejected=0, errors=[])
+    batch = []
+    try:
+        async for line, row, error in IMPORT_FORMATS[fmt](_lines(chunks)):
+            if error is None:
+                try:
+                    doc = BookCreate.model_validate(row).model_dump()
+                except ValidationError as exc:
+                    error = _describe(exc)
+            if error is not None:
+                _reject(summary, line, error)
+                continue
+            batch.append((line, doc))
+            if len(batch) >= batch_size:
+                await _write_batch(batch, upsert, summary)
+                batch = []
+        if batch:
+            await _write_batch(batch, upsert, summary)
+    finally:
+        if summary.inserted or summary.updated:
+            await repositories().books.bump_version()
+            invalidate_stats()
+    return summary
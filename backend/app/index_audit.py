@@ -0,0 +1,75 @@
+"""
+## Index Audit - ตรวจสอบว่า query ที่ใช้บ่อยมี index รองรับหรือไม่
+
+ไฟล์นี้รัน explain() กับ query หลักๆ ของระบบ (hot queries) แล้วตรวจ query plan
+ถ้า plan มี stage "COLLSCAN" แสดงว่า MongoDB ต้องอ่านทั้ง collection (ไม่มี index รองรับ)
+และถ้ามี stage "SORT" แสดงว่าต้องเรียงผลในหน่วยความจำ (index ไม่ครอบคลุมการเรียงของ query)
+
+ใช้งานได้ 2 แบบ:
+- ตอน startup: ตั้งค่า INDEX_AUDIT_ON_STARTUP=1 (จะ log warning ถ้ามี query ที่ไม่มี index)
+- ผ่าน CLI: python check_indexes.py
+
+เรียกผ่าน Repositories.audit_indexes() - ที่เก็บข้อมูลแบบ "memory" ไม่มี index จึงไม่มีผลลัพธ์
+"""
+
+import logging
+from typing import List
+from app.models import Book, User, Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+## HOT_QUERIES - รายการ query ที่ใช้บ่อยและต้องมี index รองรับ
+## (ชื่อ, Model, filter, sort) ค่าใน filter เป็นแค่ตัวอย่างสำหรับ explain()
+HOT_QUERIES = [
+    ("borrow/return lookup", Transaction,
+     {"book_id": "0", "user_id": "0", "status": "Borrowed"}, None),
+    ("user history", Transaction, {"user_id": "0"}, [("borrow_date", 1), ("_id", 1)]),
+    ("archived user history", TransactionArchive, {"user_id": "0"}, [("user_id", 1), ("month", 1)]),
+    ("approval queue", Transaction, {"status": "Pending"}, None),
+    ("login by username", User, {"username": "admin"}, None),
+    ("book by isbn", Book, {"isbn": "0"}, None),
+    ("catalog page by title", Book, {}, [("title", 1), ("_id", 1)]),
+]
+
+## _plan_stages - ดึงชื่อ stage ทั้งหมดจาก query plan (เดินทุก inputStage)
+def _plan_stages(plan: dict) -> List[str]:
+    stages = []
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    if "queryPlan" in plan:  # รูปแบบ plan ของ SBE engine (MongoDB 7+)
+        stages.extend(_plan_stages(plan["queryPlan"]))
+    if "inputStage" in plan:
+        stages.extend(_plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+## audit_indexes - รัน explain() กับ HOT_QUERIES ทั้งหมดบน database (Motor)
+## คืนค่า list ของผลลัพธ์ พร้อม index_backed = False ถ้าพบ COLLSCAN หรือ SORT
+async def audit_indexes(database) -> List[dict]:
+    """Explain each hot query and report whether it is index-backed"""
+    results = []
+    for name, model, query, sort in HOT_QUERIES:
+        cursor = database[model.Settings.name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        results.append({
+            "name": name,
+            "collection": model.Settings.name,
+            "filter": query,
+            "stages": stages,
+            "index_backed": "COLLSCAN" not in stages and "SORT" not in stages,
+        })
+    return results
+
+## log_index_audit - รัน audit ของ repos แล้ว log warning สำหรับ query ที่ไม่มี index รองรับ
+async def log_index_audit(repos) -> None:
+    """Run the index audit and log any collection scans"""
+    for result in await repos.audit_indexes():
+        if not result["index_backed"]:
+            logger.warning(
+                "Hot query '%s' on %s is not index-backed (plan: %s)",
+                result["name"], result["collection"], " <- ".join(result["stages"]),
+            )
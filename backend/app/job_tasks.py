@@ -0,0 +1,222 @@
+"""
+## Job Tasks - งานเบื้องหลังแต่ละประเภทที่ Admin สั่งผ่าน /admin/jobs
+
+- export: ส่งออก transactions/books/users เป็นไฟล์ NDJSON หรือ CSV (ดาวน์โหลดที่ GET /admin/jobs/{id}/download)
+- import_books: นำเข้าหนังสือจากไฟล์ที่อัปโหลดไว้ใน JOBS_DIR (เหมือน POST /books/import)
+- recount_inventory: นับจำนวนหนังสือในคลังและที่ถูกยืมอยู่ เพื่อตรวจหาสต็อกที่ผิดปกติ
+- delete_user: ลบผู้ใช้พร้อมยกเลิกคำขอยืมที่ยังรออนุมัติ (เก็บประวัติการยืม-คืนไว้)
+- archive_transactions: ย้าย transactions ที่คืนแล้วและเก่าไปยัง archive (ดู app/archive.py)
+
+ทุกฟังก์ชันลงทะเบียนด้วย @job_handler และรายงานความคืบหน้าผ่าน JobProgress
+"""
+
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator
+from bson import ObjectId
+from app.schemas import BookResponse, TransactionResponse, UserResponse
+from app.archive import archive_returned
+from app.cache import invalidate_principal, invalidate_stats
+from app.events import publish_transaction
+from app.export import EXPORT_BATCH_SIZE, serialize_chunks
+from app.importer import ImportFormatError, import_books
+from app.jobs import JobError, JobProgress, job_handler, job_path
+from app.repositories import repositories
+from app.serialization import projection_for
+
+## ============================================
+## Export
+## ============================================
+
+## EXPORTS - collection ที่ส่งออกได้: Response schema ของแต่ละ collection
+## (ช่วงวันที่: transactions ใช้ borrow_date, books ใช้เวลาที่เพิ่ม, users ใช้ created_at)
+EXPORTS = {
+    "transactions": TransactionResponse,
+    "books": BookResponse,
+    "users": UserResponse,
+}
+
+## export_filename - ชื่อไฟล์ผลลัพธ์ของงาน export ใน JOBS_DIR
+def export_filename(job: dict) -> str:
+    return f"{job['_id']}.{job['params']['format']}"
+
+## run_export - เขียนผล export ลงไฟล์ทีละ chunk (เขียนเป็น .part แล้วเปลี่ยนชื่อเมื่อเสร็จ)
+## params: collection, format, start, end, status (เฉพาะ transactions)
+@job_handler("export")
+async def run_export(job: dict, progress: JobProgress) -> dict:
+    params = job["params"]
+    collection = params["collection"]
+    schema = EXPORTS[collection]
+    fmt = params["format"]
+    start, end = params.get("start"), params.get("end")
+    reads = repositories().reporting
+    if collection == "transactions":
+        # transactions รวมรายการใน archive เหมือน GET /admin/export/transactions
+        status = params.get("status")
+        total = await reads.transactions.count(status=status, start=start, end=end)
+        docs = reads.transactions.documents(status=status, start=start, end=end, projection=projection_for(schema))
+    else:
+        repository = getattr(reads, collection)
+        total = await repository.count(start, end)
+        docs = repository.stream(start, end, projection_for(schema))
+    chunks = serialize_chunks(docs, schema, fmt)
+    await progress.update(0, total)
+    path = job_path(export_filename(job))
+    size = rows = 0
+    try:
+        with open(path + ".part", "wb") as out:
+            async for chunk in chunks:
+                await asyncio.to_thread(out.write, chunk)
+                size += len(chunk)
+                # หนึ่ง chunk ต่อ batch (ไม่เกิน EXPORT_BATCH_SIZE แถว)
+                rows = min(total, rows + EXPORT_BATCH_SIZE)
+                await progress.update(rows)
+        os.replace(path + ".part", path)
+    except BaseException:
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        raise
+    await progress.update(total)
+    return {"rows": total, "bytes": size, "filename": f"{collection}.{fmt}"}
+
+## ============================================
+## Book Import
+## ============================================
+
+## JOB_READ_CHUNK_BYTES - ขนาดที่อ่านจากไฟล์ที่อัปโหลดต่อครั้ง
+JOB_READ_CHUNK_BYTES = 64 * 1024
+
+## _read_file - อ่านไฟล์ทีละ chunk บน thread (ไม่บล็อก event loop) และรายงานจำนวน bytes ที่อ่านแล้ว
+async def _read_file(path: str, progress: JobProgress) -> AsyncIterator[bytes]:
+    done = 0
+    with open(path, "rb") as source:
+        while True:
+            chunk = await asyncio.to_thread(source.read, JOB_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            done += len(chunk)
+            await progress.update(done)
+            yield chunk
+
+## run_import_books - นำเข้าหนังสือจากไฟล์ที่ POST /admin/jobs/import-books บันทึกไว้
+## params: upload (ชื่อไฟล์ใน JOBS_DIR), format, mode - ความคืบหน้านับเป็น bytes ของไฟล์
+## ผลลัพธ์เหมือน BookImportSummary ของ POST /books/import และลบไฟล์เมื่อเสร็จ
+@job_handler("import_books")
+async def run_import_books(job: dict, progress: JobProgress) -> dict:
+    params = job["params"]
+    path = job_path(params["upload"])
+    try:
+        await progress.update(0, os.path.getsize(path))
+        summary = await import_books(
+            _read_file(path, progress), params["format"], upsert=params["mode"] == "upsert"
+        )
+    except ImportFormatError as exc:
+        raise JobError(str(exc))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return summary.model_dump()
+
+## ============================================
+## Inventory Recount
+## ============================================
+
+## MAX_REPORTED_BOOKS - จำนวน ID ของหนังสือที่ผิดปกติสูงสุดที่รายงานกลับไป
+MAX_REPORTED_BOOKS = 100
+
+## run_recount_inventory - นับสต็อกใหม่จากข้อมูลจริง
+## - copies_available: ผลรวม quantity (เล่มที่อยู่บนชั้น)
+## - copies_on_loan: transactions ที่ Borrowed/PendingReturn (ยังไม่คืนเข้าคลัง)
+## - negative_stock: หนังสือที่ quantity ติดลบ (ไม่ควรเกิดขึ้น - ต้องตรวจสอบ)
+## - orphaned_loans: การยืมที่หนังสือถูกลบไปแล้ว
+@job_handler("recount_inventory")
+async def run_recount_inventory(job: dict, progress: JobProgress) -> dict:
+    reads = repositories().reporting
+    total = await reads.books.count()
+    await progress.update(0, total)
+    loans = await reads.transactions.loans_by_book()
+    report = {"books": 0, "copies_available": 0, "copies_on_loan": 0, "out_of_stock": 0, "negative_stock": []}
+    negative = 0
+    async for book in reads.books.stream(projection={"quantity": 1}):
+        book_id = str(book["_id"])
+        quantity = book.get("quantity", 0)
+        report["books"] += 1
+        report["copies_available"] += max(quantity, 0)
+        report["copies_on_loan"] += loans.pop(book_id, 0)
+        if quantity <= 0:
+            report["out_of_stock"] += 1
+        if quantity < 0:
+            negative += 1
+            if len(report["negative_stock"]) < MAX_REPORTED_BOOKS:
+                report["negative_stock"].append(book_id)
+        await progress.update(report["books"])
+    report["negative_stock_count"] = negative
+    report["orphaned_loans"] = sum(loans.values())  # loans ที่เหลือไม่ตรงกับหนังสือเล่มใด
+    return report
+
+## ============================================
+## User Deletion
+## ============================================
+
+## _cancel_pending - claim คำขอยืมที่รออนุมัติของผู้ใช้เป็น "Cancelled" แบบมีเงื่อนไข แล้วส่ง event ให้ Admin
+## Admin อนุมัติรายการที่ถูก claim แล้วไม่ได้ (approve_borrow claim จาก Pending เท่านั้น)
+## คืนเฉพาะรายการที่ถูก claim ในรอบนี้ (ไม่รวม seen ที่ claim ไปก่อนหน้าด้วย token เดียวกัน)
+async def _cancel_pending(user_id: str, token: str, seen: frozenset = frozenset()) -> list:
+    claimed = await repositories().transactions.cancel_pending(user_id, token)
+    claimed = [doc for doc in claimed if doc["_id"] not in seen]
+    for doc in claimed:
+        publish_transaction(doc["_id"], doc["user_id"], doc["book_id"], "Cancelled", "Pending")
+    return claimed
+
+## _restore_pending - คืนสถานะ Pending ให้รายการที่ _cancel_pending claim ไว้ (เมื่อลบผู้ใช้ไม่ได้)
+async def _restore_pending(docs: list, token: str) -> None:
+    await repositories().transactions.restore_pending([doc["_id"] for doc in docs], token)
+    for doc in docs:
+        publish_transaction(doc["_id"], doc["user_id"], doc["book_id"], "Pending", "Cancelled")
+
+## run_delete_user - ลบผู้ใช้พร้อม cleanup
+## ปฏิเสธถ้าผู้ใช้ยังมีหนังสือที่ยืมอยู่ (ต้องอนุมัติการคืนก่อน) - ไม่อย่างนั้นสต็อกจะไม่กลับเข้าคลัง
+## 1. claim คำขอยืมที่รออนุมัติก่อน (Admin อนุมัติเพิ่มไม่ได้อีก) แล้วจึงตรวจการยืม
+##    ถ้ามีคำขอที่ถูกอนุมัติไปก่อน claim จะคืนสถานะ Pending ให้รายการที่ claim แล้วล้มเหลว
+## 2. ลบผู้ใช้ (token ใช้ไม่ได้ทันที) แล้ว claim คำขอที่ส่งเข้ามาระหว่างนั้นอีกรอบ
+## 3. ลบคำขอที่ยกเลิก ประวัติที่คืนแล้ว (รวมใน archive) เก็บไว้สำหรับรายงาน
+## params: user_id
+@job_handler("delete_user")
+async def run_delete_user(job: dict, progress: JobProgress) -> dict:
+    repos = repositories()
+    user_id = job["params"]["user_id"]
+    user = None
+    if ObjectId.is_valid(user_id):
+        user = await repos.users.get(ObjectId(user_id), {"username": 1})
+    if not user:
+        raise JobError("User not found")
+    await progress.update(0, 3)
+    token = uuid.uuid4().hex
+    cancelled = await _cancel_pending(user_id, token)
+    on_loan = await repos.transactions.count_on_loan(user_id)
+    if on_loan:
+        await _restore_pending(cancelled, token)
+        raise JobError(f"User still has {on_loan} book(s) on loan")
+    await progress.update(1)
+    await repos.users.delete(user["_id"])
+    invalidate_principal(user["username"])
+    # คำขอที่ผู้ใช้ส่งเข้ามาหลังการ claim ครั้งแรก (ก่อนผู้ใช้ถูกลบ)
+    cancelled += await _cancel_pending(user_id, token, frozenset(doc["_id"] for doc in cancelled))
+    await progress.update(2)
+    await repos.transactions.delete_cancelled(user_id, token)
+    history = await repos.transactions.count(user_id=user_id)
+    invalidate_stats()
+    await progress.update(3)
+    return {"username": user["username"], "pending_cancelled": len(cancelled), "history_kept": history}
+
+## ============================================
+## Transaction Archive
+## ============================================
+
+## run_archive_transactions - ย้าย transactions ที่คืนมานานกว่า older_than_days วันไปยัง archive
+## params: older_than_days - ความคืบหน้านับเป็นจำนวน transactions ที่ย้ายแล้ว
+@job_handler("archive_transactions")
+async def run_archive_transactions(job: dict, progress: JobProgress) -> dict:
+    result = await archive_returned(job["params"]["older_than_days"], on_batch=progress.update)
+    return {**result, "cutoff": result["cutoff"].isoformat()}
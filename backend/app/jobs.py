@@ -0,0 +1,205 @@
+"""
+## Jobs - คิวงานเบื้องหลังของ Admin (export, import, นับสต็อก, ลบผู้ใช้)
+
+งานที่ใช้เวลานาน เช่น export ทั้ง collection หรือ import หนังสือหลายหมื่นเล่ม
+ถ้าทำใน request เดียว client ต้องเปิดการเชื่อมต่อค้างไว้จนเสร็จ และ timeout ของ proxy/แอปตัดกลางทาง
+
+ไฟล์นี้ให้ endpoint สร้างงาน (บันทึกผ่าน JobRepository - collection "jobs") แล้วตอบ 202 ทันทีพร้อม ID ของงาน
+งานรันเป็น asyncio task ใน worker เดียวกัน:
+- รันพร้อมกันได้ไม่เกิน JOBS_CONCURRENCY งาน (งานอื่นรอคิวในสถานะ "queued")
+- รับงานที่ยังไม่เสร็จได้ไม่เกิน JOBS_MAX_QUEUED งาน (เกินนี้ตอบ 503 ให้ลองใหม่)
+- ความคืบหน้า (done/total) ถูกเขียนลงฐานข้อมูลอย่างมากทุก JOBS_PROGRESS_INTERVAL วินาที
+- ไฟล์ของงาน (ผล export และไฟล์ที่อัปโหลดมา import) อยู่ใน JOBS_DIR
+  และถูกลบเมื่อเก่ากว่า JOBS_FILE_RETENTION_HOURS
+
+หมายเหตุ: คิวอยู่ในหน่วยความจำของ worker - ถ้า server restart ระหว่างทำงาน
+งานที่ค้างอยู่จะถูกบันทึกเป็น "failed" ตอน startup (recover_jobs) ให้ Admin สั่งใหม่
+(Dockerfile รัน worker เดียว ถ้ารันหลาย worker ต้องปิด recover ด้วย JOBS_RECOVER_ON_STARTUP=0)
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.repositories import job_document, repositories
+
+logger = logging.getLogger("app.jobs")
+
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "2"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+JOBS_PROGRESS_INTERVAL = float(os.getenv("JOBS_PROGRESS_INTERVAL", "1"))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "library-jobs"))
+JOBS_FILE_RETENTION_HOURS = float(os.getenv("JOBS_FILE_RETENTION_HOURS", "24"))
+JOBS_RECOVER_ON_STARTUP = os.getenv("JOBS_RECOVER_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+## JobError - งานล้มเหลวด้วยเหตุผลที่แจ้ง Admin ได้ตรงๆ (เช่น "User has books on loan")
+## exception อื่นจะถูก log พร้อม traceback ด้วย
+class JobError(Exception):
+    pass
+
+## job_path - path ของไฟล์ของงานใน JOBS_DIR (สร้าง directory ถ้ายังไม่มี)
+def job_path(filename: str) -> str:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.path.join(JOBS_DIR, os.path.basename(filename))
+
+## _update - แก้ไข field ของงานทั้งในฐานข้อมูลและในเอกสารที่ถืออยู่
+async def _update(job: dict, **fields) -> None:
+    job.update(fields)
+    await repositories().jobs.update(job["_id"], fields)
+
+## JobProgress - รายงานความคืบหน้าของงาน (เขียนลงฐานข้อมูลไม่บ่อยกว่า interval)
+class JobProgress:
+    """Throttled done/total reporter for a running job"""
+
+    def __init__(self, job: dict, interval: float = JOBS_PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.done = job["done"]
+        self.total = job["total"]
+        self._written_at = 0.0
+
+    ## update - บันทึกความคืบหน้าล่าสุด (total=None คือใช้ค่าเดิม)
+    async def update(self, done: int, total: Optional[int] = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+        if time.monotonic() - self._written_at >= self.interval:
+            await self.flush()
+
+    ## flush - เขียนความคืบหน้าลงฐานข้อมูลทันที
+    async def flush(self) -> None:
+        self._written_at = time.monotonic()
+        await _update(self.job, done=self.done, total=self.total)
+
+## JobHandler - ฟังก์ชันที่ทำงานจริง รับเอกสารของงาน (dict) และ JobProgress แล้วคืน result (dict)
+JobHandler = Callable[[dict, JobProgress], Awaitable[Optional[dict]]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+## job_handler - decorator สำหรับลงทะเบียนฟังก์ชันของงานแต่ละประเภท (ดู app/job_tasks.py)
+def job_handler(kind: str):
+    def register(fn: JobHandler) -> JobHandler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+## JobRunner - รันงานเป็น asyncio task โดยจำกัดจำนวนที่รันพร้อมกันด้วย semaphore
+## ทำงานใน event loop เดียว จึงไม่ต้องใช้ lock
+class JobRunner:
+    """Bounded-concurrency in-process runner for persisted jobs"""
+
+    def __init__(self, concurrency: int = JOBS_CONCURRENCY, max_queued: int = JOBS_MAX_QUEUED):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.succeeded = 0  # จำนวนงานที่สำเร็จ
+        self.failed = 0  # จำนวนงานที่ล้มเหลว
+        self.rejected = 0  # จำนวนงานที่ถูกปฏิเสธเพราะคิวเต็ม
+        self._running = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    ## enqueue - บันทึกงานใหม่ (status "queued") แล้วเริ่ม task ที่รอคิวของ semaphore
+    ## ถ้างานที่ยังไม่เสร็จเต็ม max_queued จะ throw HTTPException 503 พร้อม Retry-After
+    async def enqueue(self, kind: str, params: dict, created_by: str) -> dict:
+        """Persist a queued job and schedule it"""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        if len(self._tasks) >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many background jobs. Please retry.",
+                headers={"Retry-After": "10"},
+            )
+        job = await repositories().jobs.insert(job_document(kind, params, created_by))
+        job_id = str(job["_id"])
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(job_id, None))
+        return job
+
+    ## _run - รอคิว รัน handler แล้วบันทึกผล (สำเร็จ/ล้มเหลว) ลงฐานข้อมูล
+    async def _run(self, job: dict) -> None:
+        try:
+            async with self._semaphore:
+                self._running += 1
+                try:
+                    await _update(job, status="running", started_at=datetime.utcnow())
+                    progress = JobProgress(job)
+                    result = await _handlers[job["kind"]](job, progress)
+                    await progress.flush()
+                finally:
+                    self._running -= 1
+        except asyncio.CancelledError:
+            # server กำลังปิด (stop) - บันทึกไว้ให้ Admin รู้ว่าต้องสั่งใหม่
+            await self._fail(job, "Interrupted by shutdown")
+            raise
+        except JobError as exc:
+            await self._fail(job, str(exc))
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job["_id"], job["kind"])
+            await self._fail(job, str(exc) or type(exc).__name__)
+        else:
+            self.succeeded += 1
+            await _update(job, status="succeeded", result=result or {}, finished_at=datetime.utcnow())
+        finally:
+            await asyncio.to_thread(prune_job_files)
+
+    async def _fail(self, job: dict, error: str) -> None:
+        self.failed += 1
+        await _update(job, status="failed", error=error, finished_at=datetime.utcnow())
+
+    ## join - รอจนงานที่สั่งไว้ทั้งหมดเสร็จ (ใช้ใน tests และ CLI)
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    ## stop - ยกเลิกงานที่ยังไม่เสร็จ (เรียกตอน shutdown ก่อนปิดการเชื่อมต่อฐานข้อมูล)
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    ## stats - จำนวนงานในคิวและผลลัพธ์ (สำหรับ GET /admin/system/jobs)
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queued": self.max_queued,
+            "running": self._running,
+            "queued": len(self._tasks) - self._running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+## job_runner - runner ที่ใช้ร่วมกันทั้ง worker
+job_runner = JobRunner()
+
+## prune_job_files - ลบไฟล์ใน JOBS_DIR ที่เก่ากว่า JOBS_FILE_RETENTION_HOURS
+def prune_job_files(retention_hours: float = JOBS_FILE_RETENTION_HOURS) -> int:
+    """Delete job files older than the retention period"""
+    if not os.path.isdir(JOBS_DIR):
+        return 0
+    cutoff = time.time() - retention_hours * 3600
+    removed = 0
+    with os.scandir(JOBS_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # ถูกลบไปแล้วโดยงานอื่น
+    return removed
+
+## recover_jobs - บันทึกงานที่ค้าง "queued"/"running" จาก process ก่อนหน้าว่าล้มเหลว (เรียกตอน startup)
+async def recover_jobs() -> int:
+    """Mark jobs left unfinished by a previous process as failed"""
+    failed = await repositories().jobs.fail_unfinished("Interrupted by restart", datetime.utcnow())
+    await asyncio.to_thread(prune_job_files)
+    return failed
@@ -5,14 +5,42 @@
 รวมถึงการเชื่อมต่อฐานข้อมูล, CORS, และการรวม routers ทั้งหมด
 """
 
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import init_db
+from app.catalog_cache import CATALOG_CACHE_ENABLED, catalog_cache
+from app.database import close_db, init_db
+from app.index_audit import log_index_audit
+from app.jobs import JOBS_RECOVER_ON_STARTUP, job_runner, recover_jobs
+from app.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, metrics
+from app.profiler import DBProfilerMiddleware, install_profiler
+from app.singleflight import render_singleflight_metrics
 from app.routers import books, users, transactions, auth
 
+## Lifespan - ฟังก์ชันที่รันเมื่อแอปพลิเคชันเริ่มทำงานและก่อนปิด
+## startup: เชื่อมต่อที่เก็บข้อมูล (STORAGE_BACKEND) ก่อนที่ API จะพร้อมใช้งาน
+## แล้วโหลดแคชของ catalog และเริ่มติดตาม change stream (ถ้า MongoDB เป็น replica set)
+## และบันทึกงานเบื้องหลังที่ค้างจาก process ก่อนหน้าว่าล้มเหลว
+## shutdown: ยกเลิกงานเบื้องหลังที่ยังไม่เสร็จ หยุด change stream และปิด client เพื่อคืน connections ให้ server
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    repos = await init_db()  # เรียกฟังก์ชันเชื่อมต่อฐานข้อมูล
+    # ตรวจสอบว่า query หลักมี index รองรับ (เปิดด้วย INDEX_AUDIT_ON_STARTUP=1)
+    if os.getenv("INDEX_AUDIT_ON_STARTUP", "0").lower() in ("1", "true", "yes"):
+        await log_index_audit(repos)
+    if CATALOG_CACHE_ENABLED:
+        await repos.start_catalog_cache(catalog_cache)
+    if JOBS_RECOVER_ON_STARTUP:
+        await recover_jobs()
+    yield
+    await job_runner.stop()
+    await catalog_cache.stop()
+    close_db()
+
 ## สร้าง FastAPI Application Instance
 ## app คือ object หลักที่ใช้จัดการ API endpoints ทั้งหมด
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 ## CORS Configuration - ตั้งค่าการอนุญาตให้ Frontend เชื่อมต่อ
 ## CORS (Cross-Origin Resource Sharing) จำเป็นสำหรับให้ Frontend (React Native) 
@@ -23,13 +51,21 @@ app.add_middleware(
     allow_credentials=True,  # อนุญาตให้ส่ง credentials (cookies, headers)
     allow_methods=["*"],  # อนุญาตทุก HTTP methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # อนุญาตทุก headers
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "X-DB-Time", "X-DB-Calls"],  # ให้ Frontend อ่าน cursor ของหน้าถัดไป, ETag และเวลาของฐานข้อมูลได้
 )
 
-## Startup Event - ฟังก์ชันที่รันเมื่อแอปพลิเคชันเริ่มทำงาน
-## ใช้สำหรับเชื่อมต่อฐานข้อมูล MongoDB ก่อนที่ API จะพร้อมใช้งาน
-@app.on_event("startup")
-async def start_db():
-    await init_db()  # เรียกฟังก์ชันเชื่อมต่อฐานข้อมูล
+## Metrics Middleware - วัดจำนวน request, status และ latency ของแต่ละ route
+## ดูค่าได้ที่ GET /metrics (Prometheus text format) ปิดได้ด้วย METRICS_ENABLED=0
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+## DB Profiler - นับจำนวนและเวลาของ query ในแต่ละ request
+## ใส่ header Server-Timing / X-DB-Time / X-DB-Calls และ log query ที่ช้ากว่า SLOW_QUERY_MS
+## ต้องลงทะเบียนก่อน startup (ก่อนสร้าง MongoDB client) ปิดได้ด้วย DB_PROFILER_ENABLED=0
+if os.getenv("DB_PROFILER_ENABLED", "1").lower() in ("1", "true", "yes"):
+    install_profiler()
+    app.add_middleware(DBProfilerMiddleware)
 
 ## รวม Routers - เพิ่ม API endpoints จากไฟล์ routers ต่างๆ
 ## แต่ละ router จะมี endpoints ของตัวเอง เช่น /auth/login, /books/, etc.
@@ -39,7 +75,7 @@ async def start_db():
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 
 ## Books Router - จัดการข้อมูลหนังสือ
-## Endpoints: /books/ (GET, POST), /books/{id} (GET, PUT, DELETE)
+## Endpoints: /books/ (GET แบบแบ่งหน้า, POST), /books/{id} (GET, PUT, DELETE)
 app.include_router(books.router, prefix="/books", tags=["Books"])
 
 ## Users Router - จัดการข้อมูลผู้ใช้
@@ -55,8 +91,19 @@ app.include_router(transactions.router, prefix="/transactions", tags=["Transacti
 from app.routers import admin
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
+## Jobs Router - งานเบื้องหลังของ Admin (export, import, นับสต็อก, ลบผู้ใช้)
+## Endpoints: /admin/jobs/ (GET), /admin/jobs/{id} (GET), /admin/jobs/export/{collection} (POST), etc.
+from app.routers import jobs
+app.include_router(jobs.router, prefix="/admin/jobs", tags=["Jobs"])
+
 ## Root Endpoint - ตรวจสอบว่า API ทำงานอยู่หรือไม่
 ## ใช้สำหรับ health check หรือทดสอบการเชื่อมต่อ
 @app.get("/")
 async def root():
     return {"message": "Library System API is running"}
+
+## Metrics Endpoint - ส่งค่า metrics ให้ Prometheus (scrape)
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        return Response(content=metrics.render() + render_singleflight_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,147 @@
+"""
+## Metrics - วัดจำนวน request, status code และ latency ของแต่ละ route
+
+ไฟล์นี้มี ASGI middleware ที่บันทึกข้อมูลของทุก request ตาม "route template"
+(เช่น /books/{id} ไม่ใช่ /books/65a...) เพื่อไม่ให้จำนวน series เพิ่มตาม ID
+และส่งออกในรูปแบบ Prometheus text format ที่ GET /metrics
+
+ข้อมูลที่เก็บ:
+- http_requests_total: จำนวน request แยกตาม method, route และ status
+- http_request_duration_seconds: histogram ของ latency แยกตาม method และ route
+- http_requests_in_flight: จำนวน request ที่กำลังทำงานอยู่
+
+เขียนเป็น ASGI middleware ตรงๆ (ไม่ใช้ BaseHTTPMiddleware) และเก็บค่าใน dict ธรรมดา
+overhead ต่อ request จึงต่ำพอที่จะเปิดไว้ใน production
+หมายเหตุ: ค่าเป็นของแต่ละ worker process (Prometheus รวมค่าจากทุก worker เอง)
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+## LATENCY_BUCKETS - ขอบบนของแต่ละช่องใน histogram (วินาที)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+## label ของ request ที่ไม่ตรงกับ route ใดเลย (เช่น 404) รวมเป็น series เดียว
+UNMATCHED_ROUTE = "<unmatched>"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+## route_template - แปลง path ของ request เป็น route template เช่น /books/65a... -> /books/{id}
+## แทนที่ segment ที่ตรงกับค่าใน path_params ด้วยชื่อ parameter (ไล่จากท้าย path)
+## ใช้ scope["route"] แค่ตรวจว่าจับคู่ route ได้หรือไม่ เพราะ route.path ของ router ที่ include
+## อาจไม่มี prefix (เช่น "/{id}" แทน "/books/{id}") ขึ้นกับเวอร์ชันของ FastAPI
+def route_template(scope) -> str:
+    """Collapse path parameter values back into the route template"""
+    if scope.get("route") is None:
+        return UNMATCHED_ROUTE
+    segments = scope["path"].split("/")
+    for name, value in (scope.get("path_params") or {}).items():
+        value = str(value)
+        for i in range(len(segments) - 1, -1, -1):
+            if segments[i] == value:
+                segments[i] = "{" + name + "}"
+                break
+    return "/".join(segments)
+
+## Metrics - เก็บค่าของทุก route ในหน่วยความจำ
+## (ทำงานใน event loop เดียว จึงไม่ต้องใช้ lock)
+class Metrics:
+    """In-process request counters, latency histograms and in-flight gauge"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        # (method, route) -> [จำนวนในแต่ละช่อง..., ช่อง +Inf], ผลรวมเวลา
+        self.latency: Dict[Tuple[str, str], List] = {}
+
+    ## observe - บันทึกผลของหนึ่ง request
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        series = self.latency.get((method, route))
+        if series is None:
+            series = self.latency[(method, route)] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    ## reset - ล้างค่าทั้งหมด (ใช้ใน tests)
+    def reset(self) -> None:
+        self.requests.clear()
+        self.latency.clear()
+
+    ## render - แปลงค่าทั้งหมดเป็น Prometheus text format
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total Total HTTP requests by route template and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds HTTP request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), (counts, total) in sorted(self.latency.items()):
+            labels = _labels(method=method, route=route)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+        lines += [
+            "# HELP http_requests_in_flight HTTP requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        return "\n".join(lines) + "\n"
+
+## metrics - ตัวเก็บค่าที่ใช้ร่วมกันทั้ง application
+metrics = Metrics()
+
+## MetricsMiddleware - ASGI middleware ที่จับเวลาและ status ของทุก HTTP request
+## route template คำนวณหลังจาก Starlette จับคู่ route แล้ว (scope["route"], scope["path_params"])
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request metrics"""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # ถ้า handler throw exception ก่อนส่ง response
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_flight -= 1
+            self.registry.observe(
+                scope["method"],
+                route_template(scope),
+                status_code,
+                time.perf_counter() - start,
+            )
@@ -5,10 +5,11 @@
 แต่ละ Model จะถูกแปลงเป็น Collection ใน MongoDB
 """
 
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from beanie import Document, Indexed
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 
 ## Book Model - โครงสร้างข้อมูลหนังสือ
 ## ใช้เก็บข้อมูลหนังสือทั้งหมดในระบบ
@@ -21,6 +22,18 @@ class Book(Document):
 
     class Settings:
         name = "books"  # ชื่อ Collection ใน MongoDB
+        indexes = [
+            # index สำหรับแบ่งหน้าแบบ keyset เมื่อเรียงตามชื่อหนังสือ (GET /books/?sort=title)
+            IndexModel([("title", ASCENDING), ("_id", ASCENDING)], name="title_id"),
+            # text index สำหรับค้นหาหนังสือจากชื่อและผู้แต่ง (GET /books/search)
+            # default_language="none" ปิด stemming/stop words เพราะชื่อหนังสือมีหลายภาษา
+            IndexModel(
+                [("title", TEXT), ("author", TEXT)],
+                name="title_author_text",
+                weights={"title": 3, "author": 1},
+                default_language="none",
+            ),
+        ]
 
 ## User Model - โครงสร้างข้อมูลผู้ใช้
 ## ใช้เก็บข้อมูลผู้ใช้และ Admin ทั้งหมด
@@ -42,6 +55,65 @@ class Transaction(Document):
     borrow_date: datetime = Field(default_factory=datetime.utcnow)  # วันที่ยืม (อัตโนมัติ)
     return_date: Optional[datetime] = None  # วันที่คืน (เป็น NULL ถ้ายังไม่คืน)
     status: str = "Pending"  # สถานะ: "Pending" (รออนุมัติ), "Borrowed" (กำลังยืม), "PendingReturn" (รออนุมัติคืน), "Returned" (คืนแล้ว)
+    approved_at: Optional[datetime] = None  # เวลาที่ Admin อนุมัติครั้งล่าสุด (ยืมหรือคืน)
+    claim_token: Optional[str] = None  # uuid ของ request อนุมัติหลายรายการที่เปลี่ยนสถานะครั้งล่าสุด
 
     class Settings:
         name = "transactions"  # ชื่อ Collection ใน MongoDB
+        indexes = [
+            # borrow_book / return_book ค้นหาด้วย (user_id, book_id, status)
+            IndexModel(
+                [("user_id", ASCENDING), ("book_id", ASCENDING), ("status", ASCENDING)],
+                name="user_book_status",
+            ),
+            # get_user_history ค้นหาด้วย user_id และเรียงตาม (borrow_date, _id) โดยไม่ต้อง sort ในหน่วยความจำ
+            IndexModel(
+                [("user_id", ASCENDING), ("borrow_date", ASCENDING), ("_id", ASCENDING)],
+                name="user_borrow_date_id",
+            ),
+            # สถิติและคิวอนุมัติของ Admin ค้นหาด้วย status
+            IndexModel([("status", ASCENDING)], name="status"),
+            # transaction_documents (ประวัติ, export, GET /admin/transactions) เรียงตาม borrow_date
+            IndexModel([("borrow_date", ASCENDING), ("_id", ASCENDING)], name="borrow_date_id"),
+        ]
+
+## TransactionArchive Model - transactions ที่คืนแล้วและเก่ากว่า ARCHIVE_AFTER_DAYS (ดู app/archive.py)
+## เก็บแบบ bucket: หนึ่งเอกสารต่อผู้ใช้ต่อเดือนที่คืน รวม transactions ของเดือนนั้นไว้ใน array
+## ทำให้ collection "transactions" (ที่ยืม/คืน/อนุมัติใช้) และ index ของมันเล็กอยู่เสมอ
+class TransactionArchive(Document):
+    user_id: str  # ID ของผู้ใช้
+    month: str  # เดือนที่คืน ("YYYY-MM")
+    transactions: List[dict] = Field(default_factory=list)  # เอกสาร transaction เดิมทั้งหมด (รวม _id)
+    first_borrow_date: Optional[datetime] = None  # borrow_date ที่เก่าที่สุดใน bucket (ใช้ตัด bucket ตอนกรองช่วงวันที่)
+    last_borrow_date: Optional[datetime] = None  # borrow_date ที่ใหม่ที่สุดใน bucket
+
+    class Settings:
+        name = "transactions_archive"  # ชื่อ Collection ใน MongoDB
+        indexes = [
+            # หนึ่ง bucket ต่อ (ผู้ใช้, เดือน) และใช้ค้นหาประวัติของผู้ใช้
+            IndexModel([("user_id", ASCENDING), ("month", ASCENDING)], name="user_month", unique=True),
+            # GET /admin/transactions/{id} หารายการที่ถูกย้ายมาแล้วตาม _id เดิม (ดู find_transaction)
+            IndexModel([("transactions._id", ASCENDING)], name="transaction_id"),
+        ]
+
+## Job Model - งานเบื้องหลังของ Admin (export, import, นับสต็อก, ลบผู้ใช้)
+## เก็บสถานะและความคืบหน้าไว้ในฐานข้อมูล เพื่อให้ Admin ติดตามได้จาก GET /admin/jobs/{id}
+class Job(Document):
+    kind: str  # ประเภทงาน: "export", "import_books", "recount_inventory", "delete_user"
+    status: str = "queued"  # สถานะ: "queued" (รอคิว), "running" (กำลังทำ), "succeeded" (สำเร็จ), "failed" (ล้มเหลว)
+    params: dict = Field(default_factory=dict)  # พารามิเตอร์ของงาน (เช่น collection และ format ของ export)
+    done: int = 0  # ความคืบหน้า: จำนวนที่ทำเสร็จแล้ว
+    total: Optional[int] = None  # ความคืบหน้า: จำนวนทั้งหมด (None ถ้ายังไม่ทราบ)
+    result: Optional[dict] = None  # ผลลัพธ์เมื่อสำเร็จ
+    error: Optional[str] = None  # ข้อความ error เมื่อล้มเหลว
+    created_by: str  # ชื่อผู้ใช้ของ Admin ที่สั่งงาน
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # เวลาที่สั่งงาน
+    started_at: Optional[datetime] = None  # เวลาที่เริ่มทำงาน
+    finished_at: Optional[datetime] = None  # เวลาที่ทำงานเสร็จ (สำเร็จหรือล้มเหลว)
+
+    class Settings:
+        name = "jobs"  # ชื่อ Collection ใน MongoDB
+        indexes = [
+            # GET /admin/jobs เรียงงานล่าสุดก่อน
+            IndexModel([("created_at", DESCENDING)], name="created_at"),
+        ]
@@ -0,0 +1,120 @@
+"""
+## Pagination - ตัวช่วยสำหรับการแบ่งหน้าแบบ Keyset (Cursor)
+
+ไฟล์นี้จัดการการแบ่งหน้าแบบ keyset ซึ่ง "seek" ต่อจากรายการสุดท้ายของหน้าก่อนหน้า
+แทนการใช้ skip/offset ทำให้ MongoDB ใช้ index ได้ตรงๆ และไม่ต้องโหลดทั้ง collection
+
+Cursor ที่ส่งให้ Frontend เป็น token แบบ opaque (base64 ของ JSON)
+Frontend แค่ส่ง token กลับมาใน parameter `after` เพื่อขอหน้าถัดไป
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from bson import ObjectId
+
+## ค่าเริ่มต้นและค่าสูงสุดของจำนวนรายการต่อหน้า
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+## ชื่อ header ที่ใช้ส่ง cursor ของหน้าถัดไปกลับไปยัง Frontend
+## (ถ้าไม่มี header นี้แสดงว่าเป็นหน้าสุดท้ายแล้ว)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+## _encode / _decode - แปลง payload (dict) <-> token แบบ base64 ที่ใช้ใน URL ได้
+def _encode(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload must be an object")
+        return payload
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+## encode_cursor - สร้าง cursor token จากรายการสุดท้ายของหน้า
+## sort_value คือค่าของ field ที่ใช้เรียง (ถ้าเรียงตาม _id ไม่ต้องส่งมา)
+def encode_cursor(doc_id: Any, sort_value: Any = None) -> str:
+    """Encode the last item of a page into an opaque cursor token"""
+    payload = {"id": str(doc_id)}
+    if sort_value is not None:
+        payload["v"] = sort_value
+    return _encode(payload)
+
+## decode_cursor - แปลง cursor token กลับเป็น (ObjectId, ค่า sort key)
+## ถ้า token ไม่ถูกต้องจะ throw HTTPException 400
+def decode_cursor(token: str) -> Tuple[ObjectId, Any]:
+    """Decode a cursor token produced by encode_cursor"""
+    payload = _decode(token)
+    try:
+        return ObjectId(payload["id"]), payload.get("v")
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+## decode_score_cursor - แปลง cursor ของผลลัพธ์ที่เรียงตามคะแนนเป็น (ObjectId, คะแนน)
+## ถ้าคะแนนใน token ไม่ใช่ตัวเลขจะ throw HTTPException 400
+def decode_score_cursor(token: str) -> Tuple[ObjectId, float]:
+    """Decode a cursor whose sort value is a numeric score"""
+    last_id, last_score = decode_cursor(token)
+    if isinstance(last_score, bool) or not isinstance(last_score, (int, float)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return last_id, last_score
+
+## score_filter - filter สำหรับ "seek" ต่อจาก cursor ของผลลัพธ์ที่เรียงตามคะแนน (เช่น textScore)
+## เรียงคะแนนจากมากไปน้อย แล้วตาม _id: (score < v) หรือ (score == v และ _id > last_id)
+## ใช้หลังจากคำนวณคะแนนเป็น field แล้ว (เช่น $addFields ใน aggregation)
+def score_filter(after: Optional[str], score_field: str = "score") -> dict:
+    """Build the filter that seeks past a (score desc, _id asc) cursor"""
+    if not after:
+        return {}
+    last_id, last_score = decode_score_cursor(after)
+    return {
+        "$or": [
+            {score_field: {"$lt": last_score}},
+            {score_field: last_score, "_id": {"$gt": last_id}},
+        ]
+    }
+
+## keyset_filter - สร้าง filter สำหรับ "seek" ไปยังรายการถัดจาก cursor
+## - เรียงตาม _id: {_id: {$gt: last_id}}
+## - เรียงตาม field อื่น: (field > v) หรือ (field == v และ _id > last_id)
+##   ต้องมี _id เป็นตัวตัดสินเมื่อค่า field ซ้ำกัน เพื่อไม่ให้ข้ามหรือซ้ำรายการ
+def keyset_filter(after: Optional[str], sort_field: Optional[str] = None) -> dict:
+    """Build the MongoDB filter that seeks past the cursor"""
+    if not after:
+        return {}
+    last_id, last_value = decode_cursor(after)
+    if sort_field is None:
+        return {"_id": {"$gt": last_id}}
+    return {
+        "$or": [
+            {sort_field: {"$gt": last_value}},
+            {sort_field: last_value, "_id": {"$gt": last_id}},
+        ]
+    }
+
+## keyset_sort - ลำดับการเรียงที่ตรงกับ keyset_filter (ต้องมี index รองรับ)
+def keyset_sort(sort_field: Optional[str] = None) -> List[Tuple[str, int]]:
+    """Sort specification matching keyset_filter"""
+    if sort_field is None:
+        return [("_id", 1)]
+    return [(sort_field, 1), ("_id", 1)]
+
+## next_cursor - สร้าง cursor ของหน้าถัดไป (หรือ None ถ้าเป็นหน้าสุดท้าย)
+## docs ต้องถูกดึงมา limit + 1 รายการ เพื่อใช้ตรวจว่ามีหน้าถัดไปหรือไม่
+## รองรับทั้ง object ที่มี .id และเอกสารดิบจาก repositories (dict)
+def next_cursor(docs: list, limit: int, sort_field: Optional[str] = None) -> Optional[str]:
+    """Return the cursor for the next page, trimming the look-ahead item"""
+    if len(docs) <= limit:
+        return None
+    del docs[limit:]
+    last = docs[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last["_id"], last.get(sort_field) if sort_field else None)
+    sort_value = getattr(last, sort_field) if sort_field else None
+    return encode_cursor(last.id, sort_value)
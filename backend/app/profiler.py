@@ -0,0 +1,164 @@
+"""
+## DB Profiler - วัดเวลาที่แต่ละ request ใช้กับฐานข้อมูล
+
+handler หลายตัวเรียก repository ต่อกันหลายครั้ง (เช่น borrow_book เรียก users.get, books.get,
+transactions.find_open แล้วจึง transactions.insert) ไฟล์นี้ช่วยให้เห็นว่าเวลาของ request
+เป็นเวลาของฐานข้อมูลเท่าไร
+
+- CommandListener ของ pymongo รับ event ของทุก command ที่ส่งไป MongoDB
+- contextvar เก็บ RequestProfile ของ request ปัจจุบัน (Motor คัดลอก context ไปยัง thread
+  ที่รัน pymongo ให้อยู่แล้ว) ทำให้รู้ว่า command ไหนเป็นของ request ไหน
+- DBProfilerMiddleware ใส่ header Server-Timing, X-DB-Time (ms) และ X-DB-Calls ให้ทุก response
+- command ที่ใช้เวลาเกิน SLOW_QUERY_MS จะถูก log พร้อมรูปร่างของ filter และ route ที่เรียก
+  (รูปร่าง = field และ operator โดยแทนค่าด้วย "?" เพื่อไม่ให้ข้อมูลผู้ใช้ไปอยู่ใน log)
+
+หมายเหตุ: StreamingResponse ส่ง header ก่อน query ทั้งหมดจะเสร็จ ค่าใน header จึงนับแค่ส่วนแรก
+"""
+
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+from pymongo import monitoring
+from app.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+## SLOW_QUERY_MS - command ที่ใช้เวลาเกินค่านี้ (มิลลิวินาที) จะถูก log (0 = ปิด)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+## command ภายในของ driver (handshake, heartbeat) ไม่นับเป็นเวลาของ request
+_IGNORED_COMMANDS = frozenset({"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"})
+
+## RequestProfile - จำนวนและเวลารวมของ command ใน request เดียว
+class RequestProfile:
+    """Database call count and total time for one request"""
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope  # ASGI scope ของ request (ใช้หา route ตอน log slow query)
+        self.calls = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()  # command ของ request เดียวอาจจบพร้อมกันหลาย thread
+
+    def add(self, duration_ms: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_ms += duration_ms
+
+## current_profile - RequestProfile ของ request ที่กำลังทำงาน (None ถ้าอยู่นอก request)
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+## filter_shape - แทนค่าทั้งหมดใน filter ด้วย "?" แต่คงชื่อ field และ operator ไว้
+def filter_shape(value):
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [filter_shape(item) for item in value]
+    return "?"
+
+## _command_filter - ดึงส่วนที่เป็น filter ของแต่ละประเภท command
+def _command_filter(name: str, command: dict):
+    if name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if name == "findAndModify":
+        return command.get("query")
+    if name == "update":
+        return [u.get("q") for u in command.get("updates", [])[:1]]
+    if name == "delete":
+        return [d.get("q") for d in command.get("deletes", [])[:1]]
+    if name == "aggregate":
+        return command.get("pipeline")
+    return None
+
+## _is_await_data - getMore ของ cursor แบบ tailable/awaitData (เช่น change stream ของ catalog cache)
+## server รอข้อมูลใหม่ได้นานถึง maxTimeMS ก่อนตอบ เวลาที่รอตอนไม่มีการเปลี่ยนแปลงจึงไม่ใช่ query ที่ช้า
+## (pymongo ใส่ maxTimeMS ใน getMore เฉพาะ cursor ที่ตั้ง max_await_time_ms)
+def _is_await_data(event) -> bool:
+    return event.command_name == "getMore" and "maxTimeMS" in event.command
+
+## CommandProfiler - CommandListener ที่บันทึกเวลาของทุก command
+class CommandProfiler(monitoring.CommandListener):
+    """Attribute MongoDB command time to the current request"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        # command ที่ยังไม่จบ: (connection, request_id) -> (ชื่อ collection, filter)
+        self._pending = {}
+
+    def started(self, event):
+        if self.slow_query_ms and event.command_name not in _IGNORED_COMMANDS and not _is_await_data(event):
+            # เก็บแค่ reference ไว้ก่อน คำนวณรูปร่างของ filter เฉพาะเมื่อช้าจริง
+            # getMore มี cursor id เป็นค่าของชื่อ command ส่วนชื่อ collection อยู่ใน "collection"
+            collection_key = "collection" if event.command_name == "getMore" else event.command_name
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command.get(collection_key),
+                _command_filter(event.command_name, event.command),
+            )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        duration_ms = event.duration_micros / 1000
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add(duration_ms)
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None and duration_ms >= self.slow_query_ms:
+            collection, query = pending
+            route = "-"
+            if profile is not None and profile.scope is not None:
+                route = f"{profile.scope['method']} {route_template(profile.scope)}"
+            logger.warning(
+                "Slow query: %s on %s took %.1fms filter=%s route=%s",
+                event.command_name, collection, duration_ms, filter_shape(query), route,
+            )
+
+## command_profiler - listener ที่ใช้ร่วมกันทั้ง application
+command_profiler = CommandProfiler()
+
+## install_profiler - ลงทะเบียน listener กับ pymongo
+## ต้องเรียกก่อนสร้าง AsyncIOMotorClient (มีผลกับ client ที่สร้างหลังจากนี้ทั้งหมด)
+def install_profiler() -> None:
+    """Register the command profiler for all clients created afterwards"""
+    monitoring.register(command_profiler)
+
+## server_timing_headers - header ที่บอกเวลาของฐานข้อมูลใน request นี้
+def server_timing_headers(profile: RequestProfile) -> list:
+    total = f"{profile.total_ms:.2f}"
+    return [
+        (b"server-timing", f'db;dur={total};desc="{profile.calls} calls"'.encode("latin-1")),
+        (b"x-db-time", total.encode("latin-1")),
+        (b"x-db-calls", str(profile.calls).encode("latin-1")),
+    ]
+
+## DBProfilerMiddleware - สร้าง RequestProfile ให้ทุก request และใส่ header ตอนเริ่มส่ง response
+class DBProfilerMiddleware:
+    """Pure ASGI middleware exposing per-request database time"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + server_timing_headers(profile)
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
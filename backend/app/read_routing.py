@@ -0,0 +1,79 @@
+"""
+## Read Routing - เลือกว่า endpoint ไหนอ่านข้อมูลจาก replica ตัวไหน
+
+ใน replica set ทุก query ไปที่ primary โดยค่าเริ่มต้น ทำให้การอ่าน catalog และรายงาน
+แย่งทรัพยากรกับการเขียน (ยืม/อนุมัติ/คืน) ไฟล์นี้ให้ endpoint ที่อ่านอย่างเดียว
+ส่ง query ไปที่ secondary ได้ โดยจำกัดความล่าช้าของข้อมูล (max staleness)
+
+- CATALOG_READ_PREFERENCE: GET /books/, /books/search, /books/batch, /books/{id}
+- REPORTING_READ_PREFERENCE: รายการของ Admin, สถิติ, export และรายละเอียดของ expand=true
+- READ_MAX_STALENESS_SECONDS: secondary ที่ช้ากว่า primary เกินค่านี้จะไม่ถูกเลือก
+  (MongoDB กำหนดขั้นต่ำ 90 วินาที, -1 = ไม่จำกัด)
+
+ค่าที่ใช้ได้: primary (ค่าเริ่มต้น), primaryPreferred, secondary, secondaryPreferred, nearest
+การยืม/คืน/อนุมัติ และการอ่านเพื่อตรวจสอบก่อนเขียน ใช้ primary เสมอ (ไม่ผ่านไฟล์นี้)
+
+MongoRepositories (app/repositories/mongo.py) ใช้ฟังก์ชันเหล่านี้กับ reporting และ catalog()
+ที่เก็บข้อมูลแบบ "memory" ไม่มี replica จึงไม่ผ่านไฟล์นี้
+"""
+
+import os
+from contextlib import asynccontextmanager
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+_MODES = {
+    "primary": Primary,
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", "90"))
+
+## read_preference - แปลงชื่อ mode เป็น read preference ของ pymongo (None = primary)
+def read_preference(mode: str, max_staleness: int = READ_MAX_STALENESS_SECONDS):
+    """Build a pymongo read preference from its mode name"""
+    cls = _MODES.get(mode.replace("_", "").lower())
+    if cls is None:
+        raise ValueError(f"Unknown read preference {mode!r} (choose from {', '.join(_MODES)})")
+    if cls is Primary:
+        return None
+    return cls(max_staleness=max_staleness)
+
+CATALOG_READ_PREFERENCE = read_preference(os.getenv("CATALOG_READ_PREFERENCE", "primary"))
+REPORTING_READ_PREFERENCE = read_preference(os.getenv("REPORTING_READ_PREFERENCE", "primary"))
+
+def _route(collection, preference):
+    if preference is None:
+        return collection
+    return collection.with_options(read_preference=preference)
+
+## catalog_reads - collection สำหรับอ่าน catalog (ตาม CATALOG_READ_PREFERENCE)
+def catalog_reads(collection):
+    """Route a collection's reads per CATALOG_READ_PREFERENCE"""
+    return _route(collection, CATALOG_READ_PREFERENCE)
+
+## reporting_reads - collection สำหรับรายการ/สถิติ/export ของ Admin (ตาม REPORTING_READ_PREFERENCE)
+def reporting_reads(collection):
+    """Route a collection's reads per REPORTING_READ_PREFERENCE"""
+    return _route(collection, REPORTING_READ_PREFERENCE)
+
+## causal_session - session แบบ causally consistent สำหรับ request ที่อ่านจาก secondary หลายครั้ง
+## ทำให้ query ถัดไปใน request เดียวกันเห็นข้อมูลใหม่อย่างน้อยเท่ากับ query ก่อนหน้าเสมอ
+## (เช่น อ่านเวอร์ชันของ catalog สำหรับ ETag แล้วจึงอ่านหนังสือ - ข้อมูลจะไม่เก่ากว่า ETag)
+## ถ้า collection อ่านจาก primary อยู่แล้วจะ yield None (ไม่ต้องใช้ session)
+@asynccontextmanager
+async def causal_session(collection):
+    """Causally consistent session when reads are routed off the primary"""
+    if isinstance(collection.read_preference, Primary):
+        yield None
+        return
+    async with await collection.database.client.start_session(causal_consistency=True) as session:
+        yield session
@@ -0,0 +1,41 @@
+"""
+## Repositories - ชั้นเข้าถึงข้อมูลระหว่าง routers กับที่เก็บข้อมูล
+
+routers, งานเบื้องหลัง และ scripts ใช้ repositories() แทนการเรียก Beanie/Motor ตรง
+init_db (app/database.py) สร้างที่เก็บข้อมูลตาม STORAGE_BACKEND แล้วส่งให้ use_repositories:
+
+- "mongo": MongoRepositories (app/repositories/mongo.py)
+- "memory": MemoryRepositories (app/repositories/memory.py) - สำหรับ tests และ benchmarks
+
+interface ของแต่ละ repository อยู่ใน app/repositories/base.py
+"""
+
+from typing import Optional
+from app.repositories.base import (
+    BatchWrite,
+    BookRepository,
+    DuplicateError,
+    JobRepository,
+    Repositories,
+    TransactionRepository,
+    UserRepository,
+    WriteError,
+    job_document,
+    transaction_document,
+    user_document,
+)
+
+## ที่เก็บข้อมูลที่ใช้อยู่ (None ก่อน init_db และหลัง close_db)
+_repositories: Optional[Repositories] = None
+
+## use_repositories - ตั้งที่เก็บข้อมูลที่ทั้งแอปใช้ (None = ยกเลิก)
+def use_repositories(repos: Optional[Repositories]) -> None:
+    global _repositories
+    _repositories = repos
+
+## repositories - ที่เก็บข้อมูลที่ใช้อยู่ (RuntimeError ถ้ายังไม่ได้เรียก init_db)
+def repositories() -> Repositories:
+    """The storage backend selected at startup"""
+    if _repositories is None:
+        raise RuntimeError("Storage is not initialised - call init_db() first")
+    return _repositories
@@ -0,0 +1,376 @@
+"""
+## Repository Interfaces - สิ่งที่ที่เก็บข้อมูลทุกแบบต้องทำได้
+
+routers, งานเบื้องหลัง และ scripts อ่าน/เขียนข้อมูลผ่าน interface ในไฟล์นี้เท่านั้น
+(ไม่เรียก Beanie หรือ Motor ตรง) จึงสลับที่เก็บข้อมูลได้โดยไม่ต้องแก้ router:
+
+- MongoRepositories (app/repositories/mongo.py): MongoDB ผ่าน Motor - read routing, causal session,
+  multi-document transactions, archive แบบ bucket และ text index
+- MemoryRepositories (app/repositories/memory.py): dict ในหน่วยความจำของ process ไม่ต้องมี MongoDB
+  สำหรับ tests และ benchmarks (แต่ละ instance แยกข้อมูลกัน จึงรันหลายชุดพร้อมกันได้)
+
+ข้อตกลงของทุก implementation:
+- เอกสารเป็น dict แบบเดียวกับที่เก็บใน MongoDB (_id เป็น ObjectId, user_id/book_id เป็น string)
+  และเป็นของ caller - แก้ไขได้โดยไม่กระทบข้อมูลที่เก็บไว้
+- projection เป็น dict {field: 1} (เช่นจาก projection_for) และได้ _id มาเสมอ
+- ช่วงวันที่เป็นแบบ start <= ค่า < end (None = ไม่จำกัด)
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import (
+    AsyncIterator, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar,
+)
+from bson import ObjectId
+
+T = TypeVar("T")
+
+## DuplicateError - เขียนเอกสารที่ค่าซ้ำกับ field ที่ต้องไม่ซ้ำ (isbn, username, email)
+class DuplicateError(Exception):
+    """A unique field already has this value"""
+
+## WriteError - แถวที่เขียนไม่สำเร็จใน BookRepository.write_batch
+class WriteError(NamedTuple):
+    index: int  # ลำดับของเอกสารในชุดที่ส่งมา
+    duplicate: bool  # ISBN ซ้ำกับหนังสือที่มีอยู่แล้ว
+    message: str
+
+## BatchWrite - ผลของ BookRepository.write_batch
+class BatchWrite(NamedTuple):
+    inserted: int
+    updated: int
+    errors: List[WriteError]
+
+## ============================================
+## เอกสารใหม่ - ค่าเริ่มต้นตรงกับ Models ใน app/models.py
+## ============================================
+
+## user_document - เอกสารผู้ใช้ใหม่ (password ต้อง hash แล้ว)
+def user_document(username: str, email: str, password: str, role: str = "user") -> dict:
+    return {
+        "username": username,
+        "email": email,
+        "password": password,
+        "role": role,
+        "created_at": datetime.utcnow(),
+    }
+
+## transaction_document - เอกสาร transaction ใหม่ (ค่าเริ่มต้นคือคำขอยืมที่รออนุมัติ)
+def transaction_document(user_id: str, book_id: str, status: str = "Pending", **fields) -> dict:
+    return {
+        "user_id": user_id,
+        "book_id": book_id,
+        "borrow_date": datetime.utcnow(),
+        "return_date": None,
+        "status": status,
+        "approved_at": None,
+        "claim_token": None,
+        **fields,
+    }
+
+## job_document - เอกสารงานเบื้องหลังใหม่ (สถานะ queued)
+def job_document(kind: str, params: dict, created_by: str) -> dict:
+    return {
+        "kind": kind,
+        "status": "queued",
+        "params": params,
+        "done": 0,
+        "total": None,
+        "result": None,
+        "error": None,
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+## ============================================
+## Repositories ของแต่ละ collection
+## ============================================
+
+## BookRepository - หนังสือ เวอร์ชันของ catalog และจำนวนคงเหลือ
+class BookRepository(ABC):
+    """Books, the catalog version and stock counts"""
+
+    ## version / bump_version - เวอร์ชันของ catalog สำหรับ ETag (เพิ่มหลังหนังสือหรือสต็อกเปลี่ยน)
+    @abstractmethod
+    async def version(self) -> int: ...
+
+    @abstractmethod
+    async def bump_version(self) -> None: ...
+
+    ## page - หนังสือหนึ่งหน้าต่อจาก cursor (ลำดับของ keyset_sort)
+    @abstractmethod
+    async def page(
+        self, after: Optional[str], sort_field: Optional[str], limit: int, projection: Optional[dict] = None
+    ) -> List[dict]: ...
+
+    ## search - ค้นหาจากชื่อ (น้ำหนัก 3) และผู้แต่ง (น้ำหนัก 1) ต่อจาก cursor
+    ## เอกสารมี field "score" และเรียงตาม (score มากไปน้อย, _id)
+    @abstractmethod
+    async def search(
+        self, term: str, after: Optional[str], limit: int, projection: Optional[dict] = None
+    ) -> List[dict]: ...
+
+    @abstractmethod
+    async def get(self, book_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def by_isbn(self, isbn: str, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    ## get_many - หนังสือตาม ID หลายเล่ม (ไม่รับประกันลำดับ, ข้าม ID ที่ไม่พบ)
+    @abstractmethod
+    async def get_many(self, book_ids: List[ObjectId], projection: Optional[dict] = None) -> List[dict]: ...
+
+    ## insert - เพิ่มหนังสือ (DuplicateError ถ้า ISBN ซ้ำ) แล้วคืนเอกสารที่มี _id
+    @abstractmethod
+    async def insert(self, doc: dict) -> dict: ...
+
+    ## update - แก้ไข field ที่ส่งมาแล้วคืนเอกสารหลังแก้ (None ถ้าไม่พบ)
+    @abstractmethod
+    async def update(self, book_id: ObjectId, fields: dict) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def delete(self, book_id: ObjectId) -> bool: ...
+
+    ## write_batch - เพิ่มหนังสือหลายเล่ม (upsert: แก้ไขเล่มที่ ISBN ซ้ำ) ทุกแถวที่เขียนได้ถูกเขียน
+    ## ตอน upsert field ที่เป็น None (เช่นแถวที่ไม่มี image_url) ไม่ทับค่าเดิม ใช้เฉพาะตอนสร้างเล่มใหม่
+    @abstractmethod
+    async def write_batch(self, docs: List[dict], upsert: bool) -> BatchWrite: ...
+
+    ## take - หักจำนวนคงเหลือถ้ามีพอ (คืน False ถ้าไม่พบหรือไม่พอ)
+    @abstractmethod
+    async def take(self, book_id: ObjectId, count: int = 1) -> bool: ...
+
+    ## take_many - หักจำนวนของหลายเล่มพร้อมกัน {book_id: จำนวน} (ผู้เรียกตรวจว่ามีพอแล้ว)
+    @abstractmethod
+    async def take_many(self, counts: Dict[ObjectId, int]) -> None: ...
+
+    ## restock - เพิ่มจำนวนคงเหลือ {book_id: จำนวน}
+    @abstractmethod
+    async def restock(self, counts: Dict[ObjectId, int]) -> None: ...
+
+    ## quantities - จำนวนคงเหลือของหนังสือตาม ID {book_id: quantity} (ไม่มี key ถ้าไม่พบ)
+    @abstractmethod
+    async def quantities(self, book_ids: Iterable[ObjectId]) -> Dict[ObjectId, int]: ...
+
+    ## count / stream - หนังสือที่ถูกเพิ่มในช่วงวันที่ (เวลาใน _id) สำหรับ export เรียงตาม _id
+    @abstractmethod
+    async def count(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int: ...
+
+    @abstractmethod
+    def stream(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None, projection: Optional[dict] = None
+    ) -> AsyncIterator[dict]: ...
+
+## UserRepository - ผู้ใช้และ Admin
+class UserRepository(ABC):
+    """User accounts"""
+
+    @abstractmethod
+    async def get(self, user_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def by_username(self, username: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def by_email(self, email: str) -> Optional[dict]: ...
+
+    ## insert - เพิ่มผู้ใช้ (DuplicateError ถ้า username หรือ email ซ้ำ) แล้วคืนเอกสารที่มี _id
+    @abstractmethod
+    async def insert(self, doc: dict) -> dict: ...
+
+    ## set_role - เปลี่ยนบทบาทแล้วคืนเอกสารหลังแก้ (None ถ้าไม่พบ)
+    @abstractmethod
+    async def set_role(self, user_id: ObjectId, role: str, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def delete(self, user_id: ObjectId) -> bool: ...
+
+    ## list - ผู้ใช้ทุกคนเรียงตาม _id
+    @abstractmethod
+    async def list(self, projection: Optional[dict] = None) -> List[dict]: ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: List[ObjectId], projection: Optional[dict] = None) -> List[dict]: ...
+
+    ## count_by_role - {role: จำนวนผู้ใช้}
+    @abstractmethod
+    async def count_by_role(self) -> Dict[str, int]: ...
+
+    ## count / stream - ผู้ใช้ที่สร้างในช่วงวันที่ (created_at) สำหรับ export เรียงตาม _id
+    @abstractmethod
+    async def count(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int: ...
+
+    @abstractmethod
+    def stream(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None, projection: Optional[dict] = None
+    ) -> AsyncIterator[dict]: ...
+
+## TransactionRepository - การยืม-คืน ทั้งรายการปัจจุบัน (hot) และ archive (ดู app/archive.py)
+class TransactionRepository(ABC):
+    """Borrow/return transactions across the hot collection and the archive"""
+
+    ## insert - เพิ่ม transaction (ใช้ _id ที่ส่งมาถ้ามี) แล้วคืนเอกสารที่มี _id
+    @abstractmethod
+    async def insert(self, doc: dict) -> dict: ...
+
+    ## get - รายการปัจจุบันตาม ID (ไม่ค้นใน archive)
+    @abstractmethod
+    async def get(self, transaction_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    ## find - หาตาม ID จากรายการปัจจุบันก่อน แล้วจึงค้นใน archive
+    @abstractmethod
+    async def find(self, transaction_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    ## find_open - รายการปัจจุบันของผู้ใช้สำหรับหนังสือเล่มหนึ่งที่มีสถานะใน statuses (None ถ้าไม่มี)
+    @abstractmethod
+    async def find_open(self, user_id: str, book_id: str, statuses: List[str]) -> Optional[dict]: ...
+
+    ## transition - เปลี่ยนสถานะแบบมีเงื่อนไข: ตั้ง fields เฉพาะเมื่อสถานะปัจจุบันคือ from_status
+    ## คืนเอกสารหลังแก้ หรือ None ถ้าไม่พบหรือสถานะไม่ตรง (อีก request เปลี่ยนไปก่อน)
+    @abstractmethod
+    async def transition(
+        self, transaction_id: ObjectId, from_status: str, fields: dict, projection: Optional[dict] = None
+    ) -> Optional[dict]: ...
+
+    ## claim_many - transition หลายรายการพร้อมกัน คืนชุด ID ที่ request นี้เปลี่ยนได้จริง
+    @abstractmethod
+    async def claim_many(self, transaction_ids: List[ObjectId], from_status: str, fields: dict) -> Set[ObjectId]: ...
+
+    ## by_ids - รายการปัจจุบันตาม ID เรียงตาม borrow_date
+    @abstractmethod
+    async def by_ids(self, transaction_ids: List[ObjectId], projection: Optional[dict] = None) -> List[dict]: ...
+
+    ## by_book - รายการปัจจุบันของหนังสือเล่มหนึ่งที่มีสถานะ status (เรียงตาม borrow_date, ไม่เกิน limit)
+    @abstractmethod
+    async def by_book(
+        self, book_id: str, status: str, limit: int, projection: Optional[dict] = None
+    ) -> List[dict]: ...
+
+    ## documents - รายการจากทั้ง archive และรายการปัจจุบัน เรียงตาม (borrow_date, _id) รวมกัน
+    ## start/end กรอง borrow_date
+    @abstractmethod
+    def documents(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        projection: Optional[dict] = None,
+    ) -> AsyncIterator[dict]: ...
+
+    ## count - จำนวนรายการที่ตรงเงื่อนไขจากทั้งสองที่ (เงื่อนไขเดียวกับ documents)
+    @abstractmethod
+    async def count(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> int: ...
+
+    ## count_by_status - {status: จำนวน} ของรายการปัจจุบัน (ไม่รวม archive)
+    @abstractmethod
+    async def count_by_status(self) -> Dict[str, int]: ...
+
+    ## count_on_loan - จำนวนรายการที่ผู้ใช้ยังถือหนังสืออยู่ (Borrowed หรือ PendingReturn)
+    @abstractmethod
+    async def count_on_loan(self, user_id: str) -> int: ...
+
+    ## loans_by_book - {book_id: จำนวนเล่มที่ถูกยืมอยู่ (Borrowed หรือ PendingReturn)}
+    @abstractmethod
+    async def loans_by_book(self) -> Dict[str, int]: ...
+
+    ## cancel_pending - ยกเลิกคำขอยืมที่รออนุมัติทุกรายการของผู้ใช้ (ติด token ไว้)
+    ## คืนรายการที่ยกเลิกด้วย token นี้ (รวมที่ยกเลิกไว้แล้วจากครั้งก่อนที่ใช้ token เดียวกัน)
+    @abstractmethod
+    async def cancel_pending(self, user_id: str, token: str) -> List[dict]: ...
+
+    ## restore_pending - คืนสถานะ Pending ให้รายการที่ถูกยกเลิกด้วย token นี้
+    @abstractmethod
+    async def restore_pending(self, transaction_ids: List[ObjectId], token: str) -> None: ...
+
+    ## delete_cancelled - ลบรายการที่ถูกยกเลิกด้วย token นี้ คืนจำนวนที่ลบ
+    @abstractmethod
+    async def delete_cancelled(self, user_id: str, token: str) -> int: ...
+
+    ## count_archivable - จำนวนรายการ Returned ที่คืนก่อน cutoff (รอย้ายไป archive)
+    @abstractmethod
+    async def count_archivable(self, cutoff: datetime) -> int: ...
+
+    ## archive_batch - ย้ายรายการที่คืนก่อน cutoff ไม่เกิน batch_size รายการไปยัง archive
+    ## คืน (จำนวนที่ย้าย, จำนวน bucket ที่เขียน) - (0, 0) เมื่อไม่เหลือรายการให้ย้าย
+    @abstractmethod
+    async def archive_batch(self, cutoff: datetime, batch_size: int) -> Tuple[int, int]: ...
+
+    ## count_archived - จำนวนรายการทั้งหมดใน archive (ทุกรายการมีสถานะ Returned)
+    @abstractmethod
+    async def count_archived(self) -> int: ...
+
+## JobRepository - งานเบื้องหลังของ Admin (ดู app/jobs.py)
+class JobRepository(ABC):
+    """Background jobs and their progress"""
+
+    ## insert - เพิ่มงาน แล้วคืนเอกสารที่มี _id
+    @abstractmethod
+    async def insert(self, doc: dict) -> dict: ...
+
+    @abstractmethod
+    async def update(self, job_id: ObjectId, fields: dict) -> None: ...
+
+    @abstractmethod
+    async def get(self, job_id: ObjectId) -> Optional[dict]: ...
+
+    ## list - งานล่าสุดก่อน (กรองด้วย kind/status ได้)
+    @abstractmethod
+    async def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[dict]: ...
+
+    ## fail_unfinished - ตั้งงานที่ยัง queued/running เป็น failed (หลัง restart) คืนจำนวนงาน
+    @abstractmethod
+    async def fail_unfinished(self, error: str, finished_at: datetime) -> int: ...
+
+## ============================================
+## Repositories - ที่เก็บข้อมูลหนึ่งชุด
+## ============================================
+
+## Repositories - repositories ของทุก collection บนที่เก็บข้อมูลเดียวกัน
+## ค่าเริ่มต้นของ reporting/catalog/transactions คือที่เก็บข้อมูลที่ไม่มี replica
+## (อ่านจากที่เดียว, ไม่มี multi-document transactions) - MongoRepositories แทนที่ทั้งหมด
+class Repositories(ABC):
+    """One storage backend: a repository per collection plus read views"""
+
+    backend: str  # ชื่อ backend ("mongo" หรือ "memory")
+    books: BookRepository
+    users: UserRepository
+    transactions: TransactionRepository
+    jobs: JobRepository
+
+    ## reporting - repositories สำหรับรายการ สถิติ และ export ของ Admin (อ่านตาม REPORTING_READ_PREFERENCE)
+    @property
+    def reporting(self) -> "Repositories":
+        return self
+
+    ## catalog - repositories สำหรับอ่าน catalog (ตาม CATALOG_READ_PREFERENCE) ภายในบล็อก async with
+    ## การอ่านทั้งหมดในบล็อกเดียวกันเห็นข้อมูลที่ต่อเนื่องกัน (causal consistency)
+    @asynccontextmanager
+    async def catalog(self) -> AsyncIterator["Repositories"]:
+        yield self
+
+    ## supports_transactions - รองรับ multi-document transactions หรือไม่
+    async def supports_transactions(self) -> bool:
+        return False
+
+    ## with_transaction - รัน fn(repos) ใน transaction เดียว (commit เมื่อ fn สำเร็จ, ยกเลิกเมื่อ raise)
+    ## เรียกได้เฉพาะเมื่อ supports_transactions() เป็น True
+    async def with_transaction(self, fn: Callable[["Repositories"], Awaitable[T]]) -> T:
+        raise NotImplementedError(f"The {self.backend} backend has no multi-document transactions")
+
+    ## start_catalog_cache - โหลดและติดตาม catalog ใน CatalogCache (ไม่มีผลถ้า backend ไม่รองรับ)
+    async def start_catalog_cache(self, cache) -> None:
+        return None
+
+    ## audit_indexes - ตรวจว่า hot queries ใช้ index (ดู app/index_audit.py) - ว่างถ้าไม่มี index
+    async def audit_indexes(self) -> List[dict]:
+        return []
@@ -0,0 +1,436 @@
+"""
+## Memory Repositories - ที่เก็บข้อมูลในหน่วยความจำของ process (ไม่ต้องมี MongoDB)
+
+ใช้กับ tests และ benchmarks (STORAGE_BACKEND=memory): เริ่มได้ทันที แต่ละ instance แยกข้อมูลกัน
+จึงรัน test หลายชุดพร้อมกันได้ และวัดเวลาของโค้ดใน application โดยไม่รวมเวลาของฐานข้อมูล
+
+ทำงานใน event loop เดียวและไม่มี await ระหว่างอ่านกับเขียน ทุกการเรียกจึง atomic
+เหมือน update แบบมีเงื่อนไขของ MongoDB (ไม่ต้องใช้ lock หรือ transactions)
+
+ต่างจาก MongoDB:
+- ไม่มี replica: reporting และ catalog() อ่านจากที่เดียวกัน, ไม่มี change stream ให้ CatalogCache
+- search ให้คะแนนจากจำนวนคำที่ตรง (ชื่อ x3, ผู้แต่ง x1) แทน textScore - ลำดับใกล้เคียงแต่ไม่เท่ากันทุกกรณี
+- archive เก็บรายการเดิมแยกตาม (ผู้ใช้, เดือนที่คืน) เหมือน bucket แต่ไม่มี collection แยก
+"""
+
+import copy
+import re
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from bson import ObjectId
+from app.archive import bucket_month
+from app.catalog_cache import BookIndex
+from app.pagination import decode_score_cursor
+from app.repositories.base import (
+    BatchWrite,
+    BookRepository,
+    DuplicateError,
+    JobRepository,
+    Repositories,
+    TransactionRepository,
+    UserRepository,
+    WriteError,
+)
+
+## สถานะที่ผู้ใช้ยังถือหนังสืออยู่
+_ON_LOAN = ("Borrowed", "PendingReturn")
+
+## _project - สำเนาของเอกสาร (เฉพาะ field ใน projection ถ้าระบุ)
+def _project(doc: dict, projection: Optional[dict] = None) -> dict:
+    if not projection:
+        return dict(doc)
+    return {"_id": doc["_id"], **{name: doc[name] for name in projection if name in doc}}
+
+## _in_range - start <= value < end (None = ไม่จำกัด)
+def _in_range(value, start, end) -> bool:
+    return (start is None or value >= start) and (end is None or value < end)
+
+## _stream - ส่งเอกสารออกทีละรายการ (ให้ caller ใช้ async for เหมือน MongoDB cursor)
+async def _stream(docs: List[dict]) -> AsyncIterator[dict]:
+    for doc in docs:
+        yield doc
+
+## ============================================
+## Books
+## ============================================
+
+## _WORD - คำสำหรับค้นหา (ตัวอักษร/ตัวเลขติดกัน ไม่สนตัวพิมพ์ใหญ่เล็ก)
+_WORD = re.compile(r"\w+")
+
+def _words(text: Optional[str]) -> Set[str]:
+    return {word.lower() for word in _WORD.findall(text or "")}
+
+## น้ำหนักของแต่ละ field เหมือน text index ใน app/models.py
+_SEARCH_WEIGHTS = (("title", 3), ("author", 1))
+
+class MemoryBookRepository(BookRepository):
+    """Books in a BookIndex (the same indexes as the catalog cache)"""
+
+    def __init__(self):
+        self._index = BookIndex()
+        self._version = 0
+
+    async def version(self) -> int:
+        return self._version
+
+    async def bump_version(self) -> None:
+        self._version += 1
+
+    async def page(self, after, sort_field, limit, projection=None) -> List[dict]:
+        return [_project(book, projection) for book in self._index.page(after, sort_field, limit)]
+
+    async def search(self, term, after, limit, projection=None) -> List[dict]:
+        terms = _words(term)
+        seek = decode_score_cursor(after) if after else None
+        found = []
+        for book in self._index.all():
+            score = sum(weight * len(terms & _words(book.get(field))) for field, weight in _SEARCH_WEIGHTS)
+            if not score:
+                continue
+            if seek is not None and (-score, book["_id"]) <= (-seek[1], seek[0]):
+                continue  # อยู่ในหน้าก่อนหน้าแล้ว
+            found.append({**_project(book, projection), "score": score})
+        found.sort(key=lambda doc: (-doc["score"], doc["_id"]))
+        return found[:limit]
+
+    async def get(self, book_id, projection=None) -> Optional[dict]:
+        book = self._index.get(str(book_id))
+        return _project(book, projection) if book else None
+
+    async def by_isbn(self, isbn, projection=None) -> Optional[dict]:
+        book = self._index.by_isbn(isbn)
+        return _project(book, projection) if book else None
+
+    async def get_many(self, book_ids, projection=None) -> List[dict]:
+        books = (self._index.get(str(book_id)) for book_id in book_ids)
+        return [_project(book, projection) for book in books if book]
+
+    async def insert(self, doc: dict) -> dict:
+        if self._index.by_isbn(doc["isbn"]):
+            raise DuplicateError(f"Duplicate isbn: {doc['isbn']}")
+        doc.setdefault("_id", ObjectId())
+        return dict(self._index.put(doc))
+
+    async def update(self, book_id, fields) -> Optional[dict]:
+        book = self._index.get(str(book_id))
+        if book is None:
+            return None
+        return dict(self._index.put({**book, **fields}))
+
+    async def delete(self, book_id) -> bool:
+        return self._index.remove(book_id)
+
+    async def write_batch(self, docs, upsert) -> BatchWrite:
+        inserted = updated = 0
+        errors = []
+        for index, doc in enumerate(docs):
+            existing = self._index.by_isbn(doc["isbn"])
+            if existing is None:
+                self._index.put({"_id": ObjectId(), **doc})
+                inserted += 1
+            elif upsert:
+                self._index.put({**existing, **{key: value for key, value in doc.items() if value is not None}})
+                updated += 1
+            else:
+                errors.append(WriteError(index, True, f"Duplicate isbn: {doc['isbn']}"))
+        return BatchWrite(inserted, updated, errors)
+
+    async def take(self, book_id, count=1) -> bool:
+        book = self._index.get(str(book_id))
+        if book is None or book["quantity"] < count:
+            return False
+        book["quantity"] -= count
+        return True
+
+    async def take_many(self, counts) -> None:
+        for book_id, count in counts.items():
+            await self.take(book_id, count)
+
+    async def restock(self, counts) -> None:
+        for book_id, count in counts.items():
+            book = self._index.get(str(book_id))
+            if book is not None:
+                book["quantity"] += count
+
+    async def quantities(self, book_ids) -> Dict[ObjectId, int]:
+        books = (self._index.get(str(book_id)) for book_id in book_ids)
+        return {book["_id"]: book["quantity"] for book in books if book}
+
+    ## _created - หนังสือที่เพิ่มในช่วงวันที่ (เวลาใน _id เหมือน date_filter ของ MongoDB)
+    def _created(self, start, end) -> List[dict]:
+        start = ObjectId.from_datetime(start) if start else None
+        end = ObjectId.from_datetime(end) if end else None
+        return [book for book in self._index.all() if _in_range(book["_id"], start, end)]
+
+    async def count(self, start=None, end=None) -> int:
+        return len(self._created(start, end))
+
+    def stream(self, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        return _stream([_project(book, projection) for book in self._created(start, end)])
+
+## ============================================
+## Users
+## ============================================
+
+class MemoryUserRepository(UserRepository):
+    """Users in a dict with username and email indexes"""
+
+    def __init__(self):
+        self._users: Dict[ObjectId, dict] = {}
+        self._usernames: Dict[str, ObjectId] = {}
+        self._emails: Dict[str, ObjectId] = {}
+
+    async def get(self, user_id, projection=None) -> Optional[dict]:
+        user = self._users.get(user_id)
+        return _project(user, projection) if user else None
+
+    async def by_username(self, username) -> Optional[dict]:
+        user_id = self._usernames.get(username)
+        return dict(self._users[user_id]) if user_id else None
+
+    async def by_email(self, email) -> Optional[dict]:
+        user_id = self._emails.get(email)
+        return dict(self._users[user_id]) if user_id else None
+
+    async def insert(self, doc: dict) -> dict:
+        if doc["username"] in self._usernames or doc["email"] in self._emails:
+            raise DuplicateError(f"Duplicate username or email: {doc['username']}")
+        doc.setdefault("_id", ObjectId())
+        self._users[doc["_id"]] = dict(doc)
+        self._usernames[doc["username"]] = doc["_id"]
+        self._emails[doc["email"]] = doc["_id"]
+        return doc
+
+    async def set_role(self, user_id, role, projection=None) -> Optional[dict]:
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+        user["role"] = role
+        return _project(user, projection)
+
+    async def delete(self, user_id) -> bool:
+        user = self._users.pop(user_id, None)
+        if user is None:
+            return False
+        del self._usernames[user["username"]]
+        del self._emails[user["email"]]
+        return True
+
+    async def list(self, projection=None) -> List[dict]:
+        return [_project(self._users[user_id], projection) for user_id in sorted(self._users)]
+
+    async def get_many(self, user_ids, projection=None) -> List[dict]:
+        return [_project(self._users[user_id], projection) for user_id in user_ids if user_id in self._users]
+
+    async def count_by_role(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for user in self._users.values():
+            counts[user["role"]] = counts.get(user["role"], 0) + 1
+        return counts
+
+    def _created(self, start, end) -> List[dict]:
+        return [
+            self._users[user_id] for user_id in sorted(self._users)
+            if _in_range(self._users[user_id]["created_at"], start, end)
+        ]
+
+    async def count(self, start=None, end=None) -> int:
+        return len(self._created(start, end))
+
+    def stream(self, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        return _stream([_project(user, projection) for user in self._created(start, end)])
+
+## ============================================
+## Transactions
+## ============================================
+
+## _chronological - ลำดับเดียวกับ CHRONOLOGICAL ของ MongoRepositories (borrow_date แล้ว _id)
+def _chronological(doc: dict) -> tuple:
+    return doc["borrow_date"], doc["_id"]
+
+class MemoryTransactionRepository(TransactionRepository):
+    """Hot transactions in a dict, archived ones grouped by (user, month)"""
+
+    def __init__(self):
+        self._hot: Dict[ObjectId, dict] = {}
+        self._archive: Dict[Tuple[str, str], Dict[ObjectId, dict]] = {}
+
+    def _archived(self) -> Iterable[dict]:
+        for bucket in self._archive.values():
+            yield from bucket.values()
+
+    ## _matching - รายการจากทั้งสองที่ที่ตรงเงื่อนไข (archive มีแต่รายการ Returned)
+    def _matching(self, user_id, status, start, end) -> List[dict]:
+        docs = list(self._hot.values())
+        if status is None or status == "Returned":
+            docs.extend(self._archived())
+        return [
+            doc for doc in docs
+            if (user_id is None or doc["user_id"] == user_id)
+            and (status is None or doc["status"] == status)
+            and _in_range(doc["borrow_date"], start, end)
+        ]
+
+    async def insert(self, doc: dict) -> dict:
+        doc.setdefault("_id", ObjectId())
+        self._hot[doc["_id"]] = dict(doc)
+        return doc
+
+    async def get(self, transaction_id, projection=None) -> Optional[dict]:
+        doc = self._hot.get(transaction_id)
+        return _project(doc, projection) if doc else None
+
+    async def find(self, transaction_id, projection=None) -> Optional[dict]:
+        doc = self._hot.get(transaction_id)
+        if doc is None:
+            doc = next((doc for doc in self._archived() if doc["_id"] == transaction_id), None)
+        return _project(doc, projection) if doc else None
+
+    async def find_open(self, user_id, book_id, statuses) -> Optional[dict]:
+        for doc in self._hot.values():
+            if doc["user_id"] == user_id and doc["book_id"] == book_id and doc["status"] in statuses:
+                return dict(doc)
+        return None
+
+    async def transition(self, transaction_id, from_status, fields, projection=None) -> Optional[dict]:
+        doc = self._hot.get(transaction_id)
+        if doc is None or doc["status"] != from_status:
+            return None
+        doc.update(fields)
+        return _project(doc, projection)
+
+    async def claim_many(self, transaction_ids, from_status, fields) -> Set[ObjectId]:
+        claimed = set()
+        for transaction_id in transaction_ids:
+            if await self.transition(transaction_id, from_status, fields) is not None:
+                claimed.add(transaction_id)
+        return claimed
+
+    async def by_ids(self, transaction_ids, projection=None) -> List[dict]:
+        docs = [self._hot[oid] for oid in set(transaction_ids) if oid in self._hot]
+        return [_project(doc, projection) for doc in sorted(docs, key=_chronological)]
+
+    async def by_book(self, book_id, status, limit, projection=None) -> List[dict]:
+        docs = [doc for doc in self._hot.values() if doc["book_id"] == book_id and doc["status"] == status]
+        return [_project(doc, projection) for doc in sorted(docs, key=_chronological)[:limit]]
+
+    def documents(self, user_id=None, status=None, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        docs = sorted(self._matching(user_id, status, start, end), key=_chronological)
+        return _stream([_project(doc, projection) for doc in docs])
+
+    async def count(self, user_id=None, status=None, start=None, end=None) -> int:
+        return len(self._matching(user_id, status, start, end))
+
+    async def count_by_status(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for doc in self._hot.values():
+            counts[doc["status"]] = counts.get(doc["status"], 0) + 1
+        return counts
+
+    async def count_on_loan(self, user_id) -> int:
+        return sum(1 for doc in self._hot.values() if doc["user_id"] == user_id and doc["status"] in _ON_LOAN)
+
+    async def loans_by_book(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for doc in self._hot.values():
+            if doc["status"] in _ON_LOAN:
+                counts[doc["book_id"]] = counts.get(doc["book_id"], 0) + 1
+        return counts
+
+    def _cancelled(self, user_id, token) -> List[dict]:
+        return [
+            doc for doc in self._hot.values()
+            if doc["user_id"] == user_id and doc.get("claim_token") == token and doc["status"] == "Cancelled"
+        ]
+
+    async def cancel_pending(self, user_id, token) -> List[dict]:
+        for doc in self._hot.values():
+            if doc["user_id"] == user_id and doc["status"] == "Pending":
+                doc.update(status="Cancelled", claim_token=token)
+        return [_project(doc, {"user_id": 1, "book_id": 1}) for doc in self._cancelled(user_id, token)]
+
+    async def restore_pending(self, transaction_ids, token) -> None:
+        for transaction_id in transaction_ids:
+            doc = self._hot.get(transaction_id)
+            if doc is not None and doc.get("claim_token") == token and doc["status"] == "Cancelled":
+                doc["status"] = "Pending"
+                doc.pop("claim_token")
+
+    async def delete_cancelled(self, user_id, token) -> int:
+        docs = self._cancelled(user_id, token)
+        for doc in docs:
+            del self._hot[doc["_id"]]
+        return len(docs)
+
+    def _archivable(self, cutoff) -> List[dict]:
+        return [
+            doc for doc in self._hot.values()
+            if doc["status"] == "Returned" and doc["return_date"] is not None and doc["return_date"] < cutoff
+        ]
+
+    async def count_archivable(self, cutoff) -> int:
+        return len(self._archivable(cutoff))
+
+    async def archive_batch(self, cutoff, batch_size) -> Tuple[int, int]:
+        docs = sorted(self._archivable(cutoff), key=lambda doc: doc["_id"])[:batch_size]
+        buckets = set()
+        for doc in docs:
+            bucket = (doc["user_id"], bucket_month(doc))
+            self._archive.setdefault(bucket, {})[doc["_id"]] = self._hot.pop(doc["_id"])
+            buckets.add(bucket)
+        return len(docs), len(buckets)
+
+    async def count_archived(self) -> int:
+        return sum(len(bucket) for bucket in self._archive.values())
+
+## ============================================
+## Jobs
+## ============================================
+
+class MemoryJobRepository(JobRepository):
+    """Background jobs in a dict (deep copies - params and results are nested)"""
+
+    def __init__(self):
+        self._jobs: Dict[ObjectId, dict] = {}
+
+    async def insert(self, doc: dict) -> dict:
+        doc.setdefault("_id", ObjectId())
+        self._jobs[doc["_id"]] = copy.deepcopy(doc)
+        return doc
+
+    async def update(self, job_id, fields) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(copy.deepcopy(fields))
+
+    async def get(self, job_id) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return copy.deepcopy(job) if job else None
+
+    async def list(self, kind=None, status=None, limit=50) -> List[dict]:
+        jobs = [
+            job for job in self._jobs.values()
+            if (not kind or job["kind"] == kind) and (not status or job["status"] == status)
+        ]
+        jobs.sort(key=lambda job: (job["created_at"], job["_id"]), reverse=True)
+        return copy.deepcopy(jobs[:limit])
+
+    async def fail_unfinished(self, error, finished_at) -> int:
+        jobs = [job for job in self._jobs.values() if job["status"] in ("queued", "running")]
+        for job in jobs:
+            job.update(status="failed", error=error, finished_at=finished_at)
+        return len(jobs)
+
+## ============================================
+## MemoryRepositories
+## ============================================
+
+## MemoryRepositories - ที่เก็บข้อมูลชุดใหม่ที่ว่างเปล่า (ข้อมูลหายเมื่อ process จบ)
+class MemoryRepositories(Repositories):
+    """Repositories kept in process memory"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self.books = MemoryBookRepository()
+        self.users = MemoryUserRepository()
+        self.transactions = MemoryTransactionRepository()
+        self.jobs = MemoryJobRepository()
@@ -0,0 +1,604 @@
+"""
+## Mongo Repositories - ที่เก็บข้อมูลบน MongoDB ผ่าน Motor
+
+- read routing: repos.reporting และ repos.catalog() อ่านตาม REPORTING_/CATALOG_READ_PREFERENCE
+  (catalog() ใช้ causal session เมื่ออ่านจาก secondary - ดู app/read_routing.py)
+- multi-document transactions: with_transaction เมื่อเป็น replica set
+- archive แบบ bucket ของ transactions ที่คืนแล้ว (ดู app/archive.py)
+- indexes ประกาศไว้ใน app/models.py และสร้างโดย init_beanie ใน MongoRepositories.open
+"""
+
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from beanie import init_beanie
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.archive import bucket_month
+from app.catalog import CATALOG_META_COLLECTION, CATALOG_META_ID
+from app.export import EXPORT_BATCH_SIZE
+from app.index_audit import audit_indexes
+from app.models import Book, User, Transaction, TransactionArchive, Job
+from app.pagination import keyset_filter, keyset_sort, score_filter
+from app.read_routing import catalog_reads, causal_session, reporting_reads
+from app.repositories.base import (
+    BatchWrite,
+    BookRepository,
+    DuplicateError,
+    JobRepository,
+    Repositories,
+    TransactionRepository,
+    UserRepository,
+    WriteError,
+)
+
+## DUPLICATE_KEY_ERROR - error code ของ MongoDB เมื่อค่าซ้ำกับ unique index
+DUPLICATE_KEY_ERROR = 11000
+
+## CHRONOLOGICAL - ลำดับของ transactions (ใช้ _id ตัดสินเมื่อ borrow_date เท่ากัน)
+CHRONOLOGICAL = [("borrow_date", 1), ("_id", 1)]
+
+## date_filter - สร้าง filter ช่วงวันที่ (start <= field < end)
+## field "_id" ใช้เวลาที่สร้างเอกสารซึ่งอยู่ใน ObjectId (สำหรับ collection ที่ไม่มี field วันที่)
+def date_filter(field: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Build a half-open date range filter on the given field"""
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = ObjectId.from_datetime(start) if field == "_id" else start
+    if end is not None:
+        bounds["$lt"] = ObjectId.from_datetime(end) if field == "_id" else end
+    return {field: bounds} if bounds else {}
+
+## _primary - read routing ค่าเริ่มต้น (อ่านจาก primary)
+def _primary(collection):
+    return collection
+
+## _upsert_update - $set เฉพาะ field ที่มีค่า ส่วน field ที่เป็น None ใส่เฉพาะตอนสร้างเอกสารใหม่
+def _upsert_update(doc: dict) -> dict:
+    update = {"$set": {key: value for key, value in doc.items() if value is not None}}
+    missing = {key: None for key, value in doc.items() if value is None}
+    if missing:
+        update["$setOnInsert"] = missing
+    return update
+
+## _MongoRepository - ส่วนที่ทุก repository ใช้ร่วมกัน (collection, read routing และ session ของ view)
+class _MongoRepository:
+    def __init__(self, repos: "MongoRepositories", name: str):
+        self._repos = repos
+        self._collection = repos.database[name]
+
+    ## _reads - collection สำหรับอ่านตาม read preference ของ view
+    @property
+    def _reads(self):
+        return self._repos.route(self._collection)
+
+    @property
+    def _session(self):
+        return self._repos.session
+
+    ## _stream - อ่านเอกสารที่ตรงกับ query ทีละ batch เรียงตาม _id
+    async def _stream(self, query: dict, projection: Optional[dict]) -> AsyncIterator[dict]:
+        cursor = self._reads.find(query, projection, session=self._session).sort("_id", 1)
+        async for doc in cursor.batch_size(EXPORT_BATCH_SIZE):
+            yield doc
+
+## ============================================
+## Books
+## ============================================
+
+class MongoBookRepository(_MongoRepository, BookRepository):
+    """Books in the "books" collection, the version in "catalog_meta\""""
+
+    def __init__(self, repos: "MongoRepositories"):
+        super().__init__(repos, Book.Settings.name)
+        self._meta = repos.database[CATALOG_META_COLLECTION]
+
+    ## version - อ่านตาม read preference ของ view เหมือนข้อมูลหนังสือ
+    ## (ใน repos.catalog() อยู่ใน causal session เดียวกัน หนังสือที่อ่านต่อจึงไม่เก่ากว่าเวอร์ชัน)
+    async def version(self) -> int:
+        doc = await self._repos.route(self._meta).find_one({"_id": CATALOG_META_ID}, session=self._session)
+        return doc["version"] if doc else 0
+
+    async def bump_version(self) -> None:
+        await self._meta.update_one(
+            {"_id": CATALOG_META_ID}, {"$inc": {"version": 1}}, upsert=True, session=self._session
+        )
+
+    async def page(self, after, sort_field, limit, projection=None) -> List[dict]:
+        cursor = self._reads.find(keyset_filter(after, sort_field), projection, session=self._session)
+        return await cursor.sort(keyset_sort(sort_field)).limit(limit).to_list(length=limit)
+
+    ## search - ใช้ text index (title_author_text) และคะแนน textScore
+    ## หน้าถัดไป seek ต่อจาก (คะแนน, _id) ของรายการสุดท้ายด้วย score_filter แทนการ skip
+    async def search(self, term, after, limit, projection=None) -> List[dict]:
+        score = {"score": {"$meta": "textScore"}}
+        pipeline = [
+            {"$match": {"$text": {"$search": term}}},
+            {"$project": {**projection, **score}} if projection else {"$addFields": score},
+            {"$match": score_filter(after)},
+            {"$sort": {"score": -1, "_id": 1}},
+            {"$limit": limit},
+        ]
+        return await self._reads.aggregate(pipeline, session=self._session).to_list(length=limit)
+
+    async def get(self, book_id, projection=None) -> Optional[dict]:
+        return await self._reads.find_one({"_id": book_id}, projection, session=self._session)
+
+    async def by_isbn(self, isbn, projection=None) -> Optional[dict]:
+        return await self._reads.find_one({"isbn": isbn}, projection, session=self._session)
+
+    async def get_many(self, book_ids, projection=None) -> List[dict]:
+        cursor = self._reads.find({"_id": {"$in": list(book_ids)}}, projection, session=self._session)
+        return await cursor.to_list(length=None)
+
+    async def insert(self, doc: dict) -> dict:
+        try:
+            await self._collection.insert_one(doc, session=self._session)
+        except DuplicateKeyError as exc:
+            raise DuplicateError(str(exc)) from exc
+        return doc
+
+    async def update(self, book_id, fields) -> Optional[dict]:
+        if not fields:
+            return await self._collection.find_one({"_id": book_id}, session=self._session)
+        return await self._collection.find_one_and_update(
+            {"_id": book_id}, {"$set": fields}, return_document=ReturnDocument.AFTER, session=self._session
+        )
+
+    async def delete(self, book_id) -> bool:
+        result = await self._collection.delete_one({"_id": book_id}, session=self._session)
+        return result.deleted_count == 1
+
+    ## write_batch - bulk_write แบบ unordered ครั้งเดียว (upsert ใช้ ISBN เป็น key)
+    ## แถวที่เขียนไม่ได้ (เช่น ISBN ซ้ำ) ไม่ทำให้แถวอื่นใน batch ล้มเหลว
+    async def write_batch(self, docs, upsert) -> BatchWrite:
+        if upsert:
+            ops = [UpdateOne({"isbn": doc["isbn"]}, _upsert_update(doc), upsert=True) for doc in docs]
+        else:
+            ops = [InsertOne(doc) for doc in docs]
+        try:
+            result = await self._collection.bulk_write(ops, ordered=False, session=self._session)
+            details = result.bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+        errors = [
+            WriteError(error["index"], error.get("code") == DUPLICATE_KEY_ERROR, error.get("errmsg", "Write failed"))
+            for error in details.get("writeErrors", [])
+        ]
+        return BatchWrite(details.get("nInserted", 0) + details.get("nUpserted", 0), details.get("nMatched", 0), errors)
+
+    ## take - $inc แบบมีเงื่อนไข quantity >= count จึงไม่มีทางติดลบแม้อนุมัติพร้อมกัน
+    async def take(self, book_id, count=1) -> bool:
+        result = await self._collection.update_one(
+            {"_id": book_id, "quantity": {"$gte": count}}, {"$inc": {"quantity": -count}}, session=self._session
+        )
+        return result.modified_count == 1
+
+    async def take_many(self, counts) -> None:
+        ops = [
+            UpdateOne({"_id": book_id, "quantity": {"$gte": count}}, {"$inc": {"quantity": -count}})
+            for book_id, count in counts.items() if count
+        ]
+        if ops:
+            await self._collection.bulk_write(ops, ordered=False, session=self._session)
+
+    async def restock(self, counts) -> None:
+        ops = [UpdateOne({"_id": book_id}, {"$inc": {"quantity": count}}) for book_id, count in counts.items() if count]
+        if ops:
+            await self._collection.bulk_write(ops, ordered=False, session=self._session)
+
+    async def quantities(self, book_ids) -> Dict[ObjectId, int]:
+        docs = await self._collection.find(
+            {"_id": {"$in": list(book_ids)}}, {"quantity": 1}, session=self._session
+        ).to_list(length=None)
+        return {doc["_id"]: doc.get("quantity", 0) for doc in docs}
+
+    async def count(self, start=None, end=None) -> int:
+        return await self._reads.count_documents(date_filter("_id", start, end), session=self._session)
+
+    def stream(self, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        return self._stream(date_filter("_id", start, end), projection)
+
+## ============================================
+## Users
+## ============================================
+
+class MongoUserRepository(_MongoRepository, UserRepository):
+    """Users in the "users" collection"""
+
+    def __init__(self, repos: "MongoRepositories"):
+        super().__init__(repos, User.Settings.name)
+
+    async def get(self, user_id, projection=None) -> Optional[dict]:
+        return await self._reads.find_one({"_id": user_id}, projection, session=self._session)
+
+    async def by_username(self, username) -> Optional[dict]:
+        return await self._reads.find_one({"username": username}, session=self._session)
+
+    async def by_email(self, email) -> Optional[dict]:
+        return await self._reads.find_one({"email": email}, session=self._session)
+
+    async def insert(self, doc: dict) -> dict:
+        try:
+            await self._collection.insert_one(doc, session=self._session)
+        except DuplicateKeyError as exc:
+            raise DuplicateError(str(exc)) from exc
+        return doc
+
+    async def set_role(self, user_id, role, projection=None) -> Optional[dict]:
+        return await self._collection.find_one_and_update(
+            {"_id": user_id}, {"$set": {"role": role}}, projection,
+            return_document=ReturnDocument.AFTER, session=self._session,
+        )
+
+    async def delete(self, user_id) -> bool:
+        result = await self._collection.delete_one({"_id": user_id}, session=self._session)
+        return result.deleted_count == 1
+
+    async def list(self, projection=None) -> List[dict]:
+        return await self._reads.find({}, projection, session=self._session).sort("_id", 1).to_list(length=None)
+
+    async def get_many(self, user_ids, projection=None) -> List[dict]:
+        cursor = self._reads.find({"_id": {"$in": list(user_ids)}}, projection, session=self._session)
+        return await cursor.to_list(length=None)
+
+    async def count_by_role(self) -> Dict[str, int]:
+        groups = await self._reads.aggregate(
+            [{"$group": {"_id": "$role", "count": {"$sum": 1}}}], session=self._session
+        ).to_list(length=None)
+        return {group["_id"]: group["count"] for group in groups}
+
+    async def count(self, start=None, end=None) -> int:
+        return await self._reads.count_documents(date_filter("created_at", start, end), session=self._session)
+
+    def stream(self, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        return self._stream(date_filter("created_at", start, end), projection)
+
+## ============================================
+## Transactions (collection หลัก + archive)
+## ============================================
+
+## _bucket_update - UpdateOne สำหรับเพิ่ม transactions ของผู้ใช้หนึ่งคนในเดือนหนึ่งลง bucket (สร้างถ้ายังไม่มี)
+def _bucket_update(user_id: str, month: str, docs: list) -> UpdateOne:
+    borrow_dates = [doc["borrow_date"] for doc in docs]
+    return UpdateOne(
+        {"user_id": user_id, "month": month},
+        {
+            "$addToSet": {"transactions": {"$each": docs}},
+            "$min": {"first_borrow_date": min(borrow_dates)},
+            "$max": {"last_borrow_date": max(borrow_dates)},
+        },
+        upsert=True,
+    )
+
+## _bucket_filter - filter ระดับ bucket จาก query ของ transaction (None = archive ไม่มีรายการที่ตรง)
+## ใช้ user_id และช่วง borrow_date เพื่อไม่ต้อง unwind ทุก bucket
+def _bucket_filter(query: dict) -> Optional[dict]:
+    status = query.get("status")
+    if status is not None and status != "Returned":
+        return None
+    bucket = {}
+    if "user_id" in query:
+        bucket["user_id"] = query["user_id"]
+    bounds = query.get("borrow_date", {})
+    if "$gte" in bounds:
+        bucket["last_borrow_date"] = {"$gte": bounds["$gte"]}
+    if "$lt" in bounds:
+        bucket["first_borrow_date"] = {"$lt": bounds["$lt"]}
+    return bucket
+
+## _archive_pipeline - แตก bucket เป็นเอกสาร transaction เดิมแล้วกรองด้วย query
+def _archive_pipeline(bucket: dict, query: dict) -> list:
+    return [
+        {"$match": bucket},  # ใช้ index user_month เมื่อกรองด้วย user_id
+        {"$unwind": "$transactions"},
+        {"$replaceRoot": {"newRoot": "$transactions"}},
+        {"$match": query},
+    ]
+
+## _transaction_query - filter ของ documents/count
+def _transaction_query(user_id=None, status=None, start=None, end=None) -> dict:
+    query = date_filter("borrow_date", start, end)
+    if user_id is not None:
+        query["user_id"] = user_id
+    if status is not None:
+        query["status"] = status
+    return query
+
+## _merge - รวม stream สองชุดที่เรียงตาม CHRONOLOGICAL แล้วให้ยังคงเรียงอยู่ (อ่านทีละเอกสารจากแต่ละฝั่ง)
+async def _merge(left: AsyncIterator[dict], right: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    key = lambda doc: (doc["borrow_date"], doc["_id"])
+    a = await anext(left, None)
+    b = await anext(right, None)
+    while a is not None and b is not None:
+        if key(a) <= key(b):
+            yield a
+            a = await anext(left, None)
+        else:
+            yield b
+            b = await anext(right, None)
+    rest, pending = (left, a) if a is not None else (right, b)
+    if pending is not None:
+        yield pending
+        async for doc in rest:
+            yield doc
+
+## _empty - stream ว่าง (archive ไม่มีรายการที่ตรงกับ query)
+async def _empty() -> AsyncIterator[dict]:
+    return
+    yield
+
+class MongoTransactionRepository(_MongoRepository, TransactionRepository):
+    """Transactions in "transactions" plus monthly buckets in "transactions_archive\""""
+
+    def __init__(self, repos: "MongoRepositories"):
+        super().__init__(repos, Transaction.Settings.name)
+        self._archive = repos.database[TransactionArchive.Settings.name]
+
+    @property
+    def _archive_reads(self):
+        return self._repos.route(self._archive)
+
+    async def insert(self, doc: dict) -> dict:
+        await self._collection.insert_one(doc, session=self._session)
+        return doc
+
+    async def get(self, transaction_id, projection=None) -> Optional[dict]:
+        return await self._reads.find_one({"_id": transaction_id}, projection, session=self._session)
+
+    async def find(self, transaction_id, projection=None) -> Optional[dict]:
+        doc = await self.get(transaction_id, projection)
+        if doc is not None:
+            return doc
+        pipeline = _archive_pipeline({"transactions._id": transaction_id}, {"_id": transaction_id})
+        if projection:
+            pipeline.append({"$project": projection})
+        found = await self._archive_reads.aggregate(pipeline, session=self._session).to_list(length=1)
+        return found[0] if found else None
+
+    async def find_open(self, user_id, book_id, statuses) -> Optional[dict]:
+        return await self._collection.find_one(
+            {"user_id": user_id, "book_id": book_id, "status": {"$in": list(statuses)}}, session=self._session
+        )
+
+    async def transition(self, transaction_id, from_status, fields, projection=None) -> Optional[dict]:
+        return await self._collection.find_one_and_update(
+            {"_id": transaction_id, "status": from_status},
+            {"$set": fields},
+            projection,
+            return_document=ReturnDocument.AFTER,
+            session=self._session,
+        )
+
+    ## claim_many - bulk_write ครั้งเดียว แต่ละ UpdateOne มีเงื่อนไขสถานะเดิม
+    ## ทุกรายการที่เปลี่ยนได้ถูกติด claim_token (uuid ของการเรียกนี้) ไว้ใช้ตรวจว่ารายการไหนเป็นของเรา
+    async def claim_many(self, transaction_ids, from_status, fields) -> Set[ObjectId]:
+        if not transaction_ids:
+            return set()
+        token = uuid.uuid4().hex
+        result = await self._collection.bulk_write(
+            [
+                UpdateOne({"_id": oid, "status": from_status}, {"$set": {**fields, "claim_token": token}})
+                for oid in transaction_ids
+            ],
+            ordered=False,
+            session=self._session,
+        )
+        if result.modified_count == len(transaction_ids):
+            return set(transaction_ids)
+        # มีบางรายการถูกเปลี่ยนสถานะไปก่อน ตรวจว่ารายการไหนเป็นของการเรียกนี้จาก claim_token
+        claimed = await self._collection.find(
+            {"_id": {"$in": list(transaction_ids)}, "claim_token": token}, {"_id": 1}, session=self._session
+        ).to_list(length=None)
+        return {doc["_id"] for doc in claimed}
+
+    async def by_ids(self, transaction_ids, projection=None) -> List[dict]:
+        cursor = self._collection.find({"_id": {"$in": list(transaction_ids)}}, projection, session=self._session)
+        return await cursor.sort(CHRONOLOGICAL).to_list(length=None)
+
+    async def by_book(self, book_id, status, limit, projection=None) -> List[dict]:
+        cursor = self._collection.find({"book_id": book_id, "status": status}, projection, session=self._session)
+        return await cursor.sort(CHRONOLOGICAL).limit(limit).to_list(length=limit)
+
+    ## documents - แต่ละฝั่งเรียงใน MongoDB แล้ว merge ทีละเอกสาร
+    async def documents(self, user_id=None, status=None, start=None, end=None, projection=None) -> AsyncIterator[dict]:
+        query = _transaction_query(user_id, status, start, end)
+        if projection:
+            projection = {**projection, "borrow_date": 1}  # ต้องใช้ borrow_date ในการ merge
+        hot = self._reads.find(query, projection, session=self._session).sort(CHRONOLOGICAL)
+        archived = _empty()
+        bucket = _bucket_filter(query)
+        if bucket is not None:
+            pipeline = _archive_pipeline(bucket, query) + [{"$sort": dict(CHRONOLOGICAL)}]
+            if projection:
+                pipeline.append({"$project": projection})
+            # allowDiskUse - archive ของผู้ใช้ทุกคนอาจเกิน memory limit ของ $sort
+            archived = self._archive_reads.aggregate(pipeline, allowDiskUse=True, session=self._session)
+        async for doc in _merge(archived, hot):
+            yield doc
+
+    async def count(self, user_id=None, status=None, start=None, end=None) -> int:
+        query = _transaction_query(user_id, status, start, end)
+        count = await self._reads.count_documents(query, session=self._session)
+        bucket = _bucket_filter(query)
+        if bucket is not None:
+            pipeline = _archive_pipeline(bucket, query) + [{"$count": "n"}]
+            result = await self._archive_reads.aggregate(pipeline, session=self._session).to_list(length=None)
+            count += result[0]["n"] if result else 0
+        return count
+
+    async def count_by_status(self) -> Dict[str, int]:
+        groups = await self._reads.aggregate(
+            [{"$group": {"_id": "$status", "count": {"$sum": 1}}}], session=self._session
+        ).to_list(length=None)
+        return {group["_id"]: group["count"] for group in groups}
+
+    async def count_on_loan(self, user_id) -> int:
+        return await self._collection.count_documents(
+            {"user_id": user_id, "status": {"$in": ["Borrowed", "PendingReturn"]}}, session=self._session
+        )
+
+    async def loans_by_book(self) -> Dict[str, int]:
+        groups = await self._reads.aggregate([
+            {"$match": {"status": {"$in": ["Borrowed", "PendingReturn"]}}},
+            {"$group": {"_id": "$book_id", "count": {"$sum": 1}}},
+        ], session=self._session).to_list(length=None)
+        return {group["_id"]: group["count"] for group in groups}
+
+    async def cancel_pending(self, user_id, token) -> List[dict]:
+        await self._collection.update_many(
+            {"user_id": user_id, "status": "Pending"},
+            {"$set": {"status": "Cancelled", "claim_token": token}},
+            session=self._session,
+        )
+        return await self._collection.find(
+            {"user_id": user_id, "claim_token": token, "status": "Cancelled"},
+            {"user_id": 1, "book_id": 1},
+            session=self._session,
+        ).to_list(length=None)
+
+    async def restore_pending(self, transaction_ids, token) -> None:
+        await self._collection.update_many(
+            {"_id": {"$in": list(transaction_ids)}, "claim_token": token, "status": "Cancelled"},
+            {"$set": {"status": "Pending"}, "$unset": {"claim_token": ""}},
+            session=self._session,
+        )
+
+    async def delete_cancelled(self, user_id, token) -> int:
+        result = await self._collection.delete_many(
+            {"user_id": user_id, "claim_token": token, "status": "Cancelled"}, session=self._session
+        )
+        return result.deleted_count
+
+    async def count_archivable(self, cutoff) -> int:
+        return await self._collection.count_documents(
+            {"status": "Returned", "return_date": {"$lt": cutoff}}, session=self._session
+        )
+
+    ## archive_batch - เขียน bucket ด้วย bulk_write ครั้งเดียว แล้วจึงลบจาก collection หลัก
+    ## ถ้าหยุดกลางทางให้รันใหม่ได้ ($addToSet ไม่เพิ่มรายการที่อยู่ใน bucket แล้วซ้ำ)
+    async def archive_batch(self, cutoff, batch_size) -> Tuple[int, int]:
+        docs = await self._collection.find(
+            {"status": "Returned", "return_date": {"$lt": cutoff}}, session=self._session
+        ).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not docs:
+            return 0, 0
+        groups = {}
+        for doc in docs:
+            groups.setdefault((doc["user_id"], bucket_month(doc)), []).append(doc)
+        await self._archive.bulk_write(
+            [_bucket_update(user_id, month, items) for (user_id, month), items in groups.items()],
+            ordered=False,
+            session=self._session,
+        )
+        # Returned เป็นสถานะสุดท้าย จึงลบได้โดยไม่ต้องกลัวว่ารายการถูกแก้ไขระหว่างย้าย
+        await self._collection.delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}, "status": "Returned"}, session=self._session
+        )
+        return len(docs), len(groups)
+
+    async def count_archived(self) -> int:
+        result = await self._archive_reads.aggregate(
+            [{"$group": {"_id": None, "n": {"$sum": {"$size": "$transactions"}}}}], session=self._session
+        ).to_list(length=None)
+        return result[0]["n"] if result else 0
+
+## ============================================
+## Jobs
+## ============================================
+
+class MongoJobRepository(_MongoRepository, JobRepository):
+    """Background jobs in the "jobs" collection"""
+
+    def __init__(self, repos: "MongoRepositories"):
+        super().__init__(repos, Job.Settings.name)
+
+    async def insert(self, doc: dict) -> dict:
+        await self._collection.insert_one(doc, session=self._session)
+        return doc
+
+    async def update(self, job_id, fields) -> None:
+        await self._collection.update_one({"_id": job_id}, {"$set": fields}, session=self._session)
+
+    async def get(self, job_id) -> Optional[dict]:
+        return await self._collection.find_one({"_id": job_id}, session=self._session)
+
+    async def list(self, kind=None, status=None, limit=50) -> List[dict]:
+        query = {}
+        if kind:
+            query["kind"] = kind
+        if status:
+            query["status"] = status
+        cursor = self._collection.find(query, session=self._session).sort("created_at", -1)
+        return await cursor.limit(limit).to_list(length=limit)
+
+    async def fail_unfinished(self, error, finished_at) -> int:
+        result = await self._collection.update_many(
+            {"status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "failed", "error": error, "finished_at": finished_at}},
+            session=self._session,
+        )
+        return result.modified_count
+
+## ============================================
+## MongoRepositories
+## ============================================
+
+## MongoRepositories - repositories ทั้งหมดบน database เดียว
+## reporting / catalog() / with_transaction สร้าง "view" ที่ใช้ database เดียวกัน
+## แต่เปลี่ยน read routing หรือผูกกับ session
+class MongoRepositories(Repositories):
+    """Repositories backed by one MongoDB database"""
+
+    backend = "mongo"
+
+    def __init__(self, database, route: Callable = _primary, session=None, shared: Optional[dict] = None):
+        self.database = database
+        self.route = route
+        self.session = session
+        self._shared = shared if shared is not None else {}  # ผลที่ตรวจแล้ว ใช้ร่วมกันทุก view
+        self.books = MongoBookRepository(self)
+        self.users = MongoUserRepository(self)
+        self.transactions = MongoTransactionRepository(self)
+        self.jobs = MongoJobRepository(self)
+
+    ## open - สร้าง indexes ที่ประกาศใน app/models.py (init_beanie) แล้วคืน repositories ของ database
+    @classmethod
+    async def open(cls, database) -> "MongoRepositories":
+        await init_beanie(database=database, document_models=[Book, User, Transaction, TransactionArchive, Job])
+        return cls(database)
+
+    def _view(self, route: Optional[Callable] = None, session=None) -> "MongoRepositories":
+        return MongoRepositories(self.database, route or self.route, session, self._shared)
+
+    @property
+    def reporting(self) -> "MongoRepositories":
+        return self._view(reporting_reads)
+
+    ## catalog - ถ้าอ่านจาก secondary จะใช้ causal session เดียวตลอดบล็อก
+    ## (เช่น อ่านเวอร์ชันของ catalog สำหรับ ETag แล้วจึงอ่านหนังสือ - ข้อมูลจะไม่เก่ากว่า ETag)
+    @asynccontextmanager
+    async def catalog(self) -> AsyncIterator["MongoRepositories"]:
+        async with causal_session(catalog_reads(self.books._collection)) as session:
+            yield self._view(catalog_reads, session)
+
+    ## supports_transactions - ต้องเป็น replica set (หรือ sharded cluster) ซึ่งตอบ operationTime ใน ping
+    ## (ตรวจแบบเดียวกับ catalog cache) ตรวจครั้งเดียวแล้วจำผลไว้
+    async def supports_transactions(self) -> bool:
+        if "transactions" not in self._shared:
+            reply = await self.database.command("ping")
+            self._shared["transactions"] = reply.get("operationTime") is not None
+        return self._shared["transactions"]
+
+    ## with_transaction - session.with_transaction ลองใหม่เองเมื่อเกิด transient error (write conflict)
+    async def with_transaction(self, fn):
+        async with await self.database.client.start_session() as session:
+            return await session.with_transaction(lambda s: fn(self._view(session=s)))
+
+    async def start_catalog_cache(self, cache) -> None:
+        await cache.start(self.books._collection)
+
+    async def audit_indexes(self) -> List[dict]:
+        return await audit_indexes(self.database)
@@ -5,16 +5,41 @@
 - User Management: ดู, แก้ไข, ลบผู้ใช้
 - Statistics: ดูสถิติระบบ
 - Transaction Management: ดูและอนุมัติการยืม-คืนหนังสือ
+- Export: ส่งออก transactions, หนังสือ และผู้ใช้แบบ stream (NDJSON/CSV)
+- Events: รับการเปลี่ยนสถานะของ transactions แบบ real-time (Server-Sent Events)
 
 ทุก endpoint ในไฟล์นี้ต้อง login เป็น Admin เท่านั้น
+รายการ สถิติ และ export อ่านตาม REPORTING_READ_PREFERENCE (อ่านจาก secondary ได้)
+ส่วนการอนุมัติและการแก้ไขข้อมูลอ่าน/เขียนที่ primary เสมอ
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from app.models import User, Book, Transaction
-from app.schemas import UserResponse, BookResponse, TransactionResponse
-from app.auth import get_current_admin
-from beanie import PydanticObjectId
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Literal, Optional
+from app.schemas import (
+    UserResponse,
+    BookResponse,
+    TransactionResponse,
+    TransactionDetailResponse,
+    BulkApproveRequest,
+    BulkApproveItem,
+    BulkApproveResponse,
+)
+from app.auth import Principal, get_current_admin, password_hash_pool
+from app.database import pool_stats
+from app.catalog_cache import catalog_cache
+from app.events import event_broker, publish_transaction, sse_stream
+from app.jobs import job_runner
+from app.singleflight import single_flight, singleflight_stats
+from app.serialization import json_list_response, project, projection_for
+from app.expansion import expand_transactions
+from app.export import export_response, serialize_chunks, stream_export
+from app.repositories import BookRepository, Repositories, repositories
+from app.cache import stats_cache, stats_generation, store_stats, invalidate_stats, invalidate_principal
+from bson import ObjectId
+from bson.errors import InvalidId
 
 ## สร้าง Router สำหรับ admin endpoints
 router = APIRouter()
@@ -25,39 +50,24 @@ router = APIRouter()
 ## GET /admin/users - ดึงรายการผู้ใช้ทั้งหมด
 ## Admin only - ใช้สำหรับแสดงรายการผู้ใช้ในหน้า UsersScreen
 @router.get("/users", response_model=List[UserResponse])
-async def get_all_users(admin: User = Depends(get_current_admin)):
+async def get_all_users(admin: Principal = Depends(get_current_admin)):
     """Get all users (Admin only)"""
-    # ดึงผู้ใช้ทั้งหมดจากฐานข้อมูล
-    users = await User.find_all().to_list()
-    # แปลงเป็น UserResponse format และส่งกลับ
-    return [
-        UserResponse(
-            id=str(user.id),
-            username=user.username,
-            email=user.email,
-            role=user.role,
-            created_at=user.created_at
-        )
-        for user in users
-    ]
+    # ดึงผู้ใช้ทั้งหมดจากฐานข้อมูล (เฉพาะ field ของ UserResponse ไม่ดึง password)
+    users = await repositories().reporting.users.list(projection_for(UserResponse))
+    # แปลงเป็น JSON ตามโครงสร้าง UserResponse และส่งกลับ
+    return json_list_response(users, UserResponse)
 
 ## GET /admin/users/{user_id} - ดึงข้อมูลผู้ใช้ตาม ID
 ## Admin only - ใช้สำหรับดูรายละเอียดผู้ใช้เฉพาะคน
 @router.get("/users/{user_id}", response_model=UserResponse)
-async def get_user_by_id(user_id: str, admin: User = Depends(get_current_admin)):
+async def get_user_by_id(user_id: str, admin: Principal = Depends(get_current_admin)):
     """Get user by ID (Admin only)"""
     # ค้นหาผู้ใช้จาก ID
-    user = await User.get(PydanticObjectId(user_id))
+    user = await repositories().users.get(ObjectId(user_id), projection_for(UserResponse))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # ส่งข้อมูลผู้ใช้กลับ
-    return UserResponse(
-        id=str(user.id),
-        username=user.username,
-        email=user.email,
-        role=user.role,
-        created_at=user.created_at
-    )
+    return UserResponse(**project(user, UserResponse))
 
 ## PUT /admin/users/{user_id}/role - แก้ไขบทบาทผู้ใช้
 ## Admin only - ใช้สำหรับเปลี่ยน role จาก "user" เป็น "admin" หรือกลับกัน
@@ -65,178 +75,257 @@ async def get_user_by_id(user_id: str, admin: User = Depends(get_current_admin))
 async def update_user_role(
     user_id: str,
     new_role: str,
-    admin: User = Depends(get_current_admin)
+    admin: Principal = Depends(get_current_admin)
 ):
     """Update user role (Admin only)"""
     # ตรวจสอบว่า role ที่ส่งมาถูกต้องหรือไม่ (ต้องเป็น "user" หรือ "admin")
     if new_role not in ["user", "admin"]:
         raise HTTPException(status_code=400, detail="Invalid role. Must be 'user' or 'admin'")
     
-    # ค้นหาผู้ใช้จาก ID
-    user = await User.get(PydanticObjectId(user_id))
+    # อัปเดต role ในฐานข้อมูล (None ถ้าไม่พบผู้ใช้)
+    user = await repositories().users.set_role(ObjectId(user_id), new_role, projection_for(UserResponse))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # อัปเดต role และบันทึกลงฐานข้อมูล
-    user.role = new_role
-    await user.save()
+    invalidate_principal(user["username"])  # สิทธิ์เปลี่ยน ต้องโหลดผู้ใช้ใหม่ใน request ถัดไป
+    invalidate_stats()  # จำนวน Admin เปลี่ยน ต้องคำนวณสถิติใหม่
     
     # ส่งข้อมูลผู้ใช้ที่อัปเดตแล้วกลับไป
-    return UserResponse(
-        id=str(user.id),
-        username=user.username,
-        email=user.email,
-        role=user.role,
-        created_at=user.created_at
-    )
+    return UserResponse(**project(user, UserResponse))
 
 ## DELETE /admin/users/{user_id} - ลบผู้ใช้
 ## Admin only - ใช้สำหรับลบผู้ใช้ออกจากระบบ
 ## หมายเหตุ: Admin ไม่สามารถลบบัญชีตัวเองได้
 @router.delete("/users/{user_id}")
-async def delete_user(user_id: str, admin: User = Depends(get_current_admin)):
+async def delete_user(user_id: str, admin: Principal = Depends(get_current_admin)):
     """Delete user (Admin only)"""
+    users = repositories().users
     # ค้นหาผู้ใช้จาก ID
-    user = await User.get(PydanticObjectId(user_id))
+    user = await users.get(ObjectId(user_id), {"username": 1})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # ป้องกันการลบบัญชีตัวเอง (เพื่อความปลอดภัย)
-    if str(user.id) == str(admin.id):
+    if str(user["_id"]) == admin.id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     # ลบผู้ใช้ออกจากฐานข้อมูล
-    await user.delete()
+    await users.delete(user["_id"])
+    invalidate_principal(user["username"])  # token ของผู้ใช้ที่ถูกลบต้องใช้ไม่ได้ทันที
+    invalidate_stats()
     return {"message": "User deleted successfully"}
 
 ## ============================================
 ## Admin Statistics - สถิติระบบ
 ## ============================================
 
-## GET /admin/stats - ดึงสถิติระบบ
-## Admin only - ใช้สำหรับแสดงสถิติในหน้า HomeScreen (Admin)
-## สถิติที่แสดง: จำนวนผู้ใช้, จำนวนหนังสือ, จำนวน transactions, etc.
-@router.get("/stats")
-async def get_statistics(admin: User = Depends(get_current_admin)):
-    """Get system statistics (Admin only)"""
-    # นับจำนวนผู้ใช้ทั้งหมด
-    total_users = await User.count()
-    # นับจำนวน Admin
-    total_admins = await User.find(User.role == "admin").count()
-    # นับจำนวนหนังสือทั้งหมด
-    total_books = await Book.count()
-    # นับจำนวน transactions ทั้งหมด
-    total_transactions = await Transaction.count()
-    # นับจำนวนการยืมที่กำลังยืมอยู่ (status = "Borrowed")
-    active_borrows = await Transaction.find(Transaction.status == "Borrowed").count()
-    # นับจำนวนการยืมที่คืนแล้ว (status = "Returned")
-    returned_books = await Transaction.find(Transaction.status == "Returned").count()
-    
-    # ส่งสถิติทั้งหมดกลับไป
+## _compute_statistics - คำนวณสถิติทั้งหมดด้วย query เดียวต่อ collection
+## นับตาม role (users) และ status (transactions) ครั้งเดียวแทนการ count() ทีละเงื่อนไข
+## และรันทุก collection (รวม archive) พร้อมกันด้วย asyncio.gather (ตาม REPORTING_READ_PREFERENCE)
+async def _compute_statistics() -> dict:
+    reads = repositories().reporting
+    users_by_role, total_books, transactions_by_status, archived = await asyncio.gather(
+        reads.users.count_by_role(),
+        reads.books.count(),
+        reads.transactions.count_by_status(),
+        reads.transactions.count_archived(),
+    )
+    # รายการใน archive คืนแล้วทั้งหมด
+    transactions_by_status["Returned"] = transactions_by_status.get("Returned", 0) + archived
+    total_users = sum(users_by_role.values())
+    total_admins = users_by_role.get("admin", 0)
     return {
         "total_users": total_users,
         "total_admins": total_admins,
         "total_regular_users": total_users - total_admins,  # ผู้ใช้ทั่วไป (ไม่ใช่ Admin)
         "total_books": total_books,
-        "total_transactions": total_transactions,
-        "active_borrows": active_borrows,
-        "returned_books": returned_books
+        "total_transactions": sum(transactions_by_status.values()),
+        "active_borrows": transactions_by_status.get("Borrowed", 0),  # กำลังยืมอยู่
+        "returned_books": transactions_by_status.get("Returned", 0),  # คืนแล้ว
     }
 
+## _refresh_statistics - คำนวณสถิติใหม่และเก็บลงแคช
+## ถ้าแคชหมดอายุขณะที่ Dashboard หลายจอ poll พร้อมกัน จะคำนวณแค่ครั้งเดียว (single-flight)
+## ถ้ามีการ invalidate ระหว่างคำนวณ ผลนี้ยังส่งให้ request ที่รออยู่ แต่ไม่ถูกเก็บลงแคช
+_stats_reads = single_flight("stats")
+
+async def _refresh_statistics(generation: int) -> dict:
+    stats = await _compute_statistics()
+    store_stats(stats, generation)
+    return stats
+
+## GET /admin/stats - ดึงสถิติระบบ
+## Admin only - ใช้สำหรับแสดงสถิติในหน้า HomeScreen (Admin)
+## สถิติที่แสดง: จำนวนผู้ใช้, จำนวนหนังสือ, จำนวน transactions, etc.
+## ผลลัพธ์ถูกแคชไว้ช่วงสั้นๆ (STATS_CACHE_TTL) เพื่อให้การ poll ของ Dashboard
+## แทบไม่ต้องเข้าฐานข้อมูล และแคชจะถูกล้างเมื่อมีการยืม/คืน/แก้ไขผู้ใช้
+@router.get("/stats")
+async def get_statistics(admin: Principal = Depends(get_current_admin)):
+    """Get system statistics (Admin only)"""
+    stats = stats_cache.get("stats")
+    if stats is None:
+        # request ที่เข้ามาหลัง invalidate ไม่รวมกับการคำนวณที่เริ่มก่อนหน้า (key ต่างกัน)
+        generation = stats_generation()
+        stats = await _stats_reads.do(("stats", generation), lambda: _refresh_statistics(generation))
+    return stats
+
+## GET /admin/system/password-hashing - สถิติของ thread pool ที่ใช้ hash รหัสผ่าน
+## Admin only - ใช้ดูความยาวคิวและเวลารอ เพื่อปรับ PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_QUEUE
+@router.get("/system/password-hashing")
+async def get_password_hashing_stats(admin: Principal = Depends(get_current_admin)):
+    """Get password hashing pool statistics (Admin only)"""
+    return password_hash_pool.stats()
+
+## GET /admin/system/db-pool - สถิติ connection pool ของ MongoDB
+## ใช้ปรับ MONGODB_MAX_POOL_SIZE ให้เหมาะกับจำนวน worker
+## (in_use/peak_in_use ชนเพดาน หรือ wait สูง = pool เล็กเกินไป)
+@router.get("/system/db-pool")
+async def get_db_pool_stats(admin: Principal = Depends(get_current_admin)):
+    """Get MongoDB connection pool settings and usage (Admin only)"""
+    return pool_stats()
+
+## GET /admin/system/catalog-cache - สถานะของแคช catalog (change stream)
+## ready=false หมายถึง GET /books/ อ่านจาก MongoDB ตรง (stream ไม่พร้อมหรือช้าเกิน max_lag_seconds)
+@router.get("/system/catalog-cache")
+async def get_catalog_cache_stats(admin: Principal = Depends(get_current_admin)):
+    """Get in-process catalog cache status (Admin only)"""
+    return catalog_cache.stats()
+
+## GET /admin/system/singleflight - จำนวน query ที่รันจริง และ request ที่รวมเข้ากับ query อื่น
+@router.get("/system/singleflight")
+async def get_singleflight_stats(admin: Principal = Depends(get_current_admin)):
+    """Get request coalescing statistics per read type (Admin only)"""
+    return singleflight_stats()
+
+## GET /admin/system/events - จำนวนการเชื่อมต่อ GET /admin/events และ event ที่ส่งไปแล้ว
+## overflows สูง = client อ่านไม่ทัน (ได้ resync แทน) ลองเพิ่ม EVENTS_QUEUE_SIZE
+@router.get("/system/events")
+async def get_event_stats(admin: Principal = Depends(get_current_admin)):
+    """Get event stream connection statistics (Admin only)"""
+    return event_broker.stats()
+
+## GET /admin/system/jobs - จำนวนงานเบื้องหลังที่กำลังรัน/รอคิว และผลลัพธ์ตั้งแต่ worker เริ่มทำงาน
+## queued สูงต่อเนื่อง = ลองเพิ่ม JOBS_CONCURRENCY (ถ้าฐานข้อมูลรับไหว)
+@router.get("/system/jobs")
+async def get_job_stats(admin: Principal = Depends(get_current_admin)):
+    """Get background job runner statistics (Admin only)"""
+    return job_runner.stats()
+
 ## ============================================
 ## Admin Transaction Management - จัดการการยืม-คืน
 ## ============================================
 
 ## GET /admin/transactions - ดึงรายการ transactions ทั้งหมด
 ## Admin only - ใช้สำหรับแสดงรายการการยืม-คืนในหน้า TransactionsScreen
-@router.get("/transactions", response_model=List[TransactionResponse])
-async def get_all_transactions(admin: User = Depends(get_current_admin)):
+## รวมรายการที่ถูกย้ายไป archive แล้ว เรียงตาม borrow_date (เก่าก่อน)
+## expand=true: เติมชื่อหนังสือ ผู้แต่ง และชื่อผู้ใช้ให้แต่ละรายการ (TransactionDetailResponse)
+@router.get("/transactions", response_model=List[TransactionDetailResponse])
+async def get_all_transactions(expand: bool = False, admin: Principal = Depends(get_current_admin)):
     """Get all transactions (Admin only)"""
-    # ดึง transactions ทั้งหมดจากฐานข้อมูล
-    transactions = await Transaction.find_all().to_list()
-    # แปลงเป็น TransactionResponse format และส่งกลับ
-    return [
-        TransactionResponse(
-            id=str(t.id),
-            user_id=t.user_id,
-            book_id=t.book_id,
-            borrow_date=t.borrow_date,
-            return_date=t.return_date,
-            status=t.status
-        )
-        for t in transactions
+    reads = repositories().reporting
+    # ดึง transactions ทั้งหมดจากทั้งสองที่ (เฉพาะ field ของ TransactionResponse)
+    transactions = [
+        doc async for doc in reads.transactions.documents(projection=projection_for(TransactionResponse))
     ]
+    if expand:
+        # ดึงหนังสือและผู้ใช้ที่เกี่ยวข้องทั้งหมดด้วย $in query เดียวต่อ collection
+        await expand_transactions(transactions, reads)
+        return json_list_response(transactions, TransactionDetailResponse)
+    # แปลงเป็น JSON ตามโครงสร้าง TransactionResponse และส่งกลับ
+    return json_list_response(transactions, TransactionResponse)
 
 ## GET /admin/transactions/{transaction_id} - ดึงข้อมูล transaction ตาม ID
 ## Admin only - ใช้สำหรับดูรายละเอียด transaction เฉพาะรายการ
 @router.get("/transactions/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction_by_id(
     transaction_id: str,
-    admin: User = Depends(get_current_admin)
+    admin: Principal = Depends(get_current_admin)
 ):
     """Get transaction by ID (Admin only)"""
-    # ค้นหา transaction จาก ID
-    transaction = await Transaction.get(PydanticObjectId(transaction_id))
+    # ค้นหา transaction จาก ID (รวมรายการที่ถูกย้ายไป archive แล้ว)
+    transaction = await repositories().transactions.find(ObjectId(transaction_id), projection_for(TransactionResponse))
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     # ส่งข้อมูล transaction กลับ
-    return TransactionResponse(
-        id=str(transaction.id),
-        user_id=transaction.user_id,
-        book_id=transaction.book_id,
-        borrow_date=transaction.borrow_date,
-        return_date=transaction.return_date,
-        status=transaction.status
+    return TransactionResponse(**project(transaction, TransactionResponse))
+
+## _raise_transition_error - หาสาเหตุที่การเปลี่ยนสถานะแบบ atomic ไม่สำเร็จ
+## เรียกเฉพาะตอนที่ update ไม่ match เท่านั้น (ไม่เพิ่ม round trip ในกรณีปกติ)
+async def _raise_transition_error(repos: Repositories, transaction_id: ObjectId, detail: str):
+    transaction = await repos.transactions.get(transaction_id, {"status": 1})
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    raise HTTPException(
+        status_code=400,
+        detail=f"{detail}. Current status: {transaction['status']}"
+    )
+
+## _raise_stock_error - หาสาเหตุที่ตัดสต็อกไม่สำเร็จ (หนังสือถูกลบ หรือหมด)
+async def _raise_stock_error(repos: Repositories, book_id: ObjectId):
+    if not await repos.books.get(book_id, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Book not found")
+    raise HTTPException(status_code=400, detail="Book out of stock")
+
+## _claim_borrow - เปลี่ยน status จาก "Pending" เป็น "Borrowed" แบบ atomic (คืนเอกสารหลังแก้ไข)
+## ถ้า transaction ไม่ได้อยู่ในสถานะ "Pending" (เช่น Admin อีกคนอนุมัติไปแล้ว) จะคืน None
+async def _claim_borrow(repos: Repositories, transaction_id: ObjectId) -> Optional[dict]:
+    return await repos.transactions.transition(
+        transaction_id,
+        "Pending",
+        {"status": "Borrowed", "approved_at": datetime.utcnow()},
+        projection_for(TransactionResponse),
     )
 
 ## POST /admin/transactions/{transaction_id}/approve-borrow - อนุมัติการยืมหนังสือ
 ## Admin only - ใช้เมื่อ Admin กดปุ่ม "อนุมัติ" ในหน้า TransactionsScreen
 ## หลังจากอนุมัติ: status จะเปลี่ยนเป็น "Borrowed" และ quantity จะลดลง 1
+## ทั้งสองขั้นตอนเป็น atomic update แบบมีเงื่อนไข ทำให้ Admin หลายคนอนุมัติพร้อมกันได้
+## โดยหนังสือไม่ถูกยืมเกินจำนวนที่มี และไม่มี transaction ที่เป็น Borrowed โดยไม่ได้ตัดสต็อก:
+## - replica set: ตัดสต็อกและเปลี่ยนสถานะใน transaction เดียวของ MongoDB (สำเร็จทั้งคู่หรือไม่มีผลทั้งคู่)
+## - ไม่มี transactions (standalone, memory): ตัดสต็อกก่อนแล้วจึงเปลี่ยนสถานะ ถ้าเปลี่ยนสถานะไม่สำเร็จจะคืนสต็อก
+##   (ระหว่างนั้นสต็อกอาจน้อยกว่าจริงชั่วคราว ซึ่งปลอดภัยกว่าให้ยืมเกิน)
 @router.post("/transactions/{transaction_id}/approve-borrow", response_model=TransactionResponse)
 async def approve_borrow(
     transaction_id: str,
-    admin: User = Depends(get_current_admin)
+    admin: Principal = Depends(get_current_admin)
 ):
     """Approve a borrow request (Admin only)"""
-    # ค้นหา transaction จาก ID
-    transaction = await Transaction.get(PydanticObjectId(transaction_id))
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+    repos = repositories()
+    oid = ObjectId(transaction_id)
     
-    # ตรวจสอบว่า transaction อยู่ในสถานะ "Pending" หรือไม่
-    # ถ้าไม่ใช่ "Pending" แสดงว่าได้รับการอนุมัติหรือถูกยกเลิกไปแล้ว
-    if transaction.status != "Pending":
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Transaction is not pending. Current status: {transaction.status}"
-        )
-    
-    # ตรวจสอบว่าหนังสือมีอยู่ในระบบและมีจำนวนพอหรือไม่
-    book = await Book.get(PydanticObjectId(transaction.book_id))
-    if not book:
+    # อ่าน transaction ก่อน เพื่อตรวจ book_id ก่อนเขียนอะไรลงฐานข้อมูล
+    pending = await repos.transactions.get(oid, {"status": 1, "book_id": 1})
+    if not pending:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    if pending["status"] != "Pending":
+        raise HTTPException(status_code=400, detail=f"Transaction is not pending. Current status: {pending['status']}")
+    if not ObjectId.is_valid(pending["book_id"]):
         raise HTTPException(status_code=404, detail="Book not found")
+    book_id = ObjectId(pending["book_id"])
     
-    # ตรวจสอบว่าหนังสือมีจำนวนพอหรือไม่ (อาจมีคนอื่นยืมไปแล้ว)
-    if book.quantity < 1:
-        raise HTTPException(status_code=400, detail="Book out of stock")
-    
-    # เปลี่ยน status เป็น "Borrowed" (อนุมัติการยืมแล้ว)
-    transaction.status = "Borrowed"
-    await transaction.save()
-    
-    # ลดจำนวนหนังสือลง 1 เล่ม (เพราะถูกยืมไปแล้ว)
-    book.quantity -= 1
-    await book.save()
+    if await repos.supports_transactions():
+        # HTTPException ที่ raise ใน callback ทำให้ transaction ถูกยกเลิก (ไม่มีผลทั้งคู่)
+        async def claim_and_take(tx: Repositories) -> dict:
+            transaction = await _claim_borrow(tx, oid)
+            if transaction is None:
+                await _raise_transition_error(repos, oid, "Transaction is not pending")
+            if not await tx.books.take(book_id):
+                await _raise_stock_error(repos, book_id)
+            return transaction
+        transaction = await repos.with_transaction(claim_and_take)
+    else:
+        if not await repos.books.take(book_id):
+            await _raise_stock_error(repos, book_id)
+        transaction = await _claim_borrow(repos, oid)
+        if transaction is None:
+            # Admin คนอื่นเปลี่ยนสถานะไปก่อน คืนสต็อกที่ตัดไว้
+            await repos.books.restock({book_id: 1})
+            await _raise_transition_error(repos, oid, "Transaction is not pending")
+    await repos.books.bump_version()  # จำนวนคงเหลือเปลี่ยน
+    invalidate_stats()
+    publish_transaction(transaction["_id"], transaction["user_id"], transaction["book_id"], "Borrowed", "Pending")
     
     # ส่งข้อมูล transaction ที่อัปเดตแล้วกลับไป
-    return TransactionResponse(
-        id=str(transaction.id),
-        user_id=transaction.user_id,
-        book_id=transaction.book_id,
-        borrow_date=transaction.borrow_date,
-        return_date=transaction.return_date,
-        status=transaction.status
-    )
+    return TransactionResponse(**project(transaction, TransactionResponse))
 
 ## POST /admin/transactions/{transaction_id}/approve-return - อนุมัติการคืนหนังสือ
 ## Admin only - ใช้เมื่อ Admin กดปุ่ม "อนุมัติการคืน" ในหน้า TransactionsScreen
@@ -244,40 +333,266 @@ async def approve_borrow(
 @router.post("/transactions/{transaction_id}/approve-return", response_model=TransactionResponse)
 async def approve_return(
     transaction_id: str,
-    admin: User = Depends(get_current_admin)
+    admin: Principal = Depends(get_current_admin)
 ):
     """Approve a return request (Admin only)"""
-    # ค้นหา transaction จาก ID
-    transaction = await Transaction.get(PydanticObjectId(transaction_id))
+    repos = repositories()
+    oid = ObjectId(transaction_id)
+    
+    # เปลี่ยน status จาก "PendingReturn" เป็น "Returned" และบันทึกวันที่คืนแบบ atomic
+    now = datetime.utcnow()
+    transaction = await repos.transactions.transition(
+        oid,
+        "PendingReturn",
+        {"status": "Returned", "return_date": now, "approved_at": now},
+        projection_for(TransactionResponse),
+    )
     if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+        await _raise_transition_error(repos, oid, "Transaction is not pending return")
+    
+    # เพิ่มจำนวนหนังสือขึ้น 1 เล่มแบบ atomic (เพราะคืนแล้ว)
+    # ถ้าหนังสือถูกลบไปแล้ว (หรือ book_id ไม่ถูกต้อง) จะไม่มีผลอะไร
+    if ObjectId.is_valid(transaction["book_id"]):
+        await repos.books.restock({ObjectId(transaction["book_id"]): 1})
+    await repos.books.bump_version()  # จำนวนคงเหลือเปลี่ยน
+    invalidate_stats()
+    publish_transaction(transaction["_id"], transaction["user_id"], transaction["book_id"], "Returned", "PendingReturn")
     
-    # ตรวจสอบว่า transaction อยู่ในสถานะ "PendingReturn" หรือไม่
-    # ถ้าไม่ใช่ "PendingReturn" แสดงว่าไม่ใช่การรออนุมัติการคืน
-    if transaction.status != "PendingReturn":
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Transaction is not pending return. Current status: {transaction.status}"
-        )
+    # ส่งข้อมูล transaction ที่อัปเดตแล้วกลับไป
+    return TransactionResponse(**project(transaction, TransactionResponse))
+
+## ============================================
+## Bulk Approval - อนุมัติหลายรายการพร้อมกัน
+## ============================================
+
+## จำนวน transactions สูงสุดที่อนุมัติได้ในหนึ่ง request
+MAX_BULK_APPROVE = 500
+
+## สถานะก่อนและหลังอนุมัติของแต่ละ action
+_BULK_TRANSITIONS = {
+    "borrow": ("Pending", "Borrowed"),
+    "return": ("PendingReturn", "Returned"),
+}
+
+## _take_copies - ตัดสต็อกหนังสือเล่มเดียวแบบมีเงื่อนไข quantity >= จำนวนที่ตัด
+## ถ้าสต็อกเปลี่ยนระหว่างทาง (มีการอนุมัติพร้อมกัน) จะลองใหม่ด้วยจำนวนที่เหลืออยู่จริง
+## จนกว่าจะตัดได้ หรือสต็อกหมด - คืนค่าจำนวนเล่มที่ตัดได้จริง
+async def _take_copies(books: BookRepository, book_id: ObjectId, wanted: int, available: int) -> int:
+    take = min(wanted, available)
+    while take >= 1:
+        if await books.take(book_id, take):
+            return take
+        current = await books.quantities([book_id])
+        take = min(wanted, current.get(book_id, 0))
+    return 0
+
+## _reserve_stock - ตัดสต็อกของหนังสือหลายเล่ม (wanted = จำนวนที่ต้องการต่อเล่ม)
+## คืนค่าจำนวนเล่มที่ตัดได้จริงต่อหนังสือ (หนังสือที่ไม่พบจะไม่อยู่ในผลลัพธ์)
+## - ใน transaction (replica set): อ่าน snapshot แล้วตัดทุกเล่มด้วย take_many ครั้งเดียว
+##   ($inc แบบมีเงื่อนไข ถ้ามีการแก้ไขหนังสือเล่มเดียวกันพร้อมกัน MongoDB จะ abort แล้ว with_transaction ลองใหม่)
+## - ไม่มี transaction: take_many ไม่บอกว่าเล่มไหนตัดได้ จึงตัดทีละเล่ม (พร้อมกันทุกเล่ม)
+##   ด้วย _take_copies ซึ่งรู้ผลของแต่ละเล่มแน่นอน
+async def _reserve_stock(repos: Repositories, wanted: Dict[ObjectId, int], transactional: bool) -> Dict[ObjectId, int]:
+    stock = {book_id: max(quantity, 0) for book_id, quantity in (await repos.books.quantities(wanted)).items()}
+    if not transactional:
+        taken = await asyncio.gather(*[
+            _take_copies(repos.books, book_id, wanted[book_id], available) for book_id, available in stock.items()
+        ])
+        return dict(zip(stock, taken))
+    taken = {book_id: min(wanted[book_id], available) for book_id, available in stock.items()}
+    await repos.books.take_many(taken)
+    return taken
+
+## _approve_borrows - ตัดสต็อกก่อน แล้วจึงเปลี่ยนสถานะ transactions (ตามลำดับวันที่ยืมของแต่ละหนังสือ)
+## สต็อกที่ตัดไว้แต่เปลี่ยนสถานะไม่ได้ (Admin คนอื่นอนุมัติไปก่อน) จะถูกคืน
+## คืนค่า (ID ที่อนุมัติได้, จำนวนเล่มที่ตัดได้ต่อหนังสือ)
+async def _approve_borrows(repos: Repositories, by_book: Dict[ObjectId, list], update: dict, transactional: bool):
+    taken = await _reserve_stock(repos, {book_id: len(ids) for book_id, ids in by_book.items()}, transactional)
+    accepted = [oid for book_id, ids in by_book.items() for oid in ids[:taken.get(book_id, 0)]]
+    claimed = await repos.transactions.claim_many(accepted, "Pending", update)
+    await repos.books.restock({
+        book_id: count - sum(1 for oid in by_book[book_id][:count] if oid in claimed)
+        for book_id, count in taken.items()
+    })
+    return claimed, taken
+
+## POST /admin/transactions/bulk-approve - อนุมัติการยืมหรือการคืนหลายรายการพร้อมกัน
+## Admin only - ใช้เคลียร์คิวรออนุมัติทีละมากๆ แทนการกดอนุมัติทีละรายการ
+## - ระบุ transaction_ids หรือ book_id (ทุกรายการที่รออนุมัติของหนังสือเล่มนั้น)
+## - การยืม: อนุมัติตามลำดับวันที่ยืม จนกว่าหนังสือจะหมด รายการที่เหลือจะถูกปฏิเสธ "Book out of stock"
+## - การเปลี่ยนสถานะใช้ claim_many ครั้งเดียว, การตัดสต็อกทำครั้งเดียวต่อหนังสือหนึ่งเล่ม (ไม่ใช่ต่อ transaction)
+## - การยืมตัดสต็อกก่อนเปลี่ยนสถานะ (ใน transaction เดียวถ้าเป็น replica set) เหมือน approve_borrow
+## ส่งผลของแต่ละรายการกลับไป (อนุมัติสำเร็จ หรือเหตุผลที่ไม่อนุมัติ)
+@router.post("/transactions/bulk-approve", response_model=BulkApproveResponse)
+async def bulk_approve(request: BulkApproveRequest, admin: Principal = Depends(get_current_admin)):
+    """Approve many borrow or return requests at once (Admin only)"""
+    repos = repositories()
+    from_status, to_status = _BULK_TRANSITIONS[request.action]
+    results: Dict[str, BulkApproveItem] = {}
     
-    # เปลี่ยน status เป็น "Returned" และตั้งค่า return_date เป็นเวลาปัจจุบัน
-    from datetime import datetime
-    transaction.return_date = datetime.utcnow()  # บันทึกวันที่คืน
-    transaction.status = "Returned"  # เปลี่ยนสถานะเป็นคืนแล้ว
-    await transaction.save()
+    # ดึง transactions ที่ต้องการอนุมัติด้วย query เดียว
+    if request.transaction_ids:
+        if len(request.transaction_ids) > MAX_BULK_APPROVE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_APPROVE} transactions per request")
+        oids = []
+        for transaction_id in request.transaction_ids:
+            try:
+                oids.append(ObjectId(transaction_id))
+            except InvalidId:
+                results[transaction_id] = BulkApproveItem(transaction_id=transaction_id, approved=False, detail="Invalid transaction ID")
+        transactions = await repos.transactions.by_ids(oids)
+        found = {str(t["_id"]) for t in transactions}
+        for oid in oids:
+            if str(oid) not in found:
+                results[str(oid)] = BulkApproveItem(transaction_id=str(oid), approved=False, detail="Transaction not found")
+    elif request.book_id:
+        transactions = await repos.transactions.by_book(request.book_id, from_status, MAX_BULK_APPROVE)
+    else:
+        raise HTTPException(status_code=400, detail="Provide transaction_ids or book_id")
     
-    # เพิ่มจำนวนหนังสือขึ้น 1 เล่ม (เพราะคืนแล้ว)
-    book = await Book.get(PydanticObjectId(transaction.book_id))
-    if book:
-        book.quantity += 1
-        await book.save()
+    # แยกรายการที่สถานะไม่ถูกต้อง และจัดกลุ่มรายการที่อนุมัติได้ตามหนังสือ
+    by_book: Dict[str, list] = {}
+    for t in transactions:
+        if t["status"] != from_status:
+            results[str(t["_id"])] = BulkApproveItem(
+                transaction_id=str(t["_id"]), approved=False,
+                detail=f"Transaction is not {from_status}. Current status: {t['status']}"
+            )
+        else:
+            by_book.setdefault(t["book_id"], []).append(t["_id"])
     
-    # ส่งข้อมูล transaction ที่อัปเดตแล้วกลับไป
-    return TransactionResponse(
-        id=str(transaction.id),
-        user_id=transaction.user_id,
-        book_id=transaction.book_id,
-        borrow_date=transaction.borrow_date,
-        return_date=transaction.return_date,
-        status=transaction.status
+    approved_at = datetime.utcnow()
+    update = {"status": to_status, "approved_at": approved_at}
+    if request.action == "return":
+        update["return_date"] = approved_at
+    
+    if request.action == "borrow":
+        # book_id ที่รูปแบบไม่ถูกต้องไม่มีหนังสือให้ยืม - ปฏิเสธเฉพาะรายการเหล่านั้น
+        wanted: Dict[ObjectId, list] = {}
+        for book_id, ids in by_book.items():
+            if ObjectId.is_valid(book_id):
+                wanted[ObjectId(book_id)] = ids
+            else:
+                for oid in ids:
+                    results[str(oid)] = BulkApproveItem(transaction_id=str(oid), approved=False, detail="Book not found")
+        
+        if wanted and await repos.supports_transactions():
+            # replica set: ตัดสต็อกและเปลี่ยนสถานะใน transaction เดียว
+            claimed, taken = await repos.with_transaction(
+                lambda tx: _approve_borrows(tx, wanted, update, transactional=True)
+            )
+        else:
+            claimed, taken = await _approve_borrows(repos, wanted, update, transactional=False)
+        
+        accepted = []
+        for book_id, ids in wanted.items():
+            if book_id not in taken:
+                for oid in ids:
+                    results[str(oid)] = BulkApproveItem(transaction_id=str(oid), approved=False, detail="Book not found")
+                continue
+            accepted.extend(ids[:taken[book_id]])
+            for oid in ids[taken[book_id]:]:
+                results[str(oid)] = BulkApproveItem(transaction_id=str(oid), approved=False, detail="Book out of stock")
+    else:
+        accepted = [oid for ids in by_book.values() for oid in ids]
+        claimed = await repos.transactions.claim_many(accepted, from_status, update)
+        # คืนสต็อกด้วย restock ครั้งเดียว (ข้ามหนังสือที่ book_id ไม่ถูกต้อง)
+        await repos.books.restock({
+            ObjectId(book_id): sum(1 for oid in ids if oid in claimed)
+            for book_id, ids in by_book.items() if ObjectId.is_valid(book_id)
+        })
+    
+    for oid in accepted:
+        if oid in claimed:
+            results[str(oid)] = BulkApproveItem(transaction_id=str(oid), approved=True)
+        elif str(oid) not in results:
+            results[str(oid)] = BulkApproveItem(
+                transaction_id=str(oid), approved=False,
+                detail=f"Transaction is no longer {from_status}"
+            )
+    if claimed:
+        await repos.books.bump_version()  # จำนวนคงเหลือเปลี่ยน
+        invalidate_stats()
+        for t in transactions:
+            if t["_id"] in claimed:
+                publish_transaction(t["_id"], t["user_id"], t["book_id"], to_status, from_status)
+    
+    # เรียงผลลัพธ์ตามลำดับที่ส่งมา (ถ้าระบุ transaction_ids) หรือตามวันที่ยืม
+    order = dict.fromkeys(request.transaction_ids or [str(t["_id"]) for t in transactions])
+    items = [results[transaction_id] for transaction_id in order if transaction_id in results]
+    approved = sum(1 for item in items if item.approved)
+    return BulkApproveResponse(approved=approved, rejected=len(items) - approved, results=items)
+
+## ============================================
+## Admin Export - ส่งออกข้อมูลแบบ stream
+## ============================================
+## ทุก endpoint อ่านข้อมูลทีละ batch และส่งออกทีละ chunk (หน่วยความจำคงที่)
+## - format: "ndjson" (ค่าเริ่มต้น) หรือ "csv"
+## - start / end: ช่วงวันที่ (start <= วันที่ < end)
+## - อ่านตาม REPORTING_READ_PREFERENCE (export ขนาดใหญ่ไม่ไปแย่ง primary)
+
+## GET /admin/export/transactions - ส่งออก transactions
+## ช่วงวันที่ใช้ borrow_date และกรองตามสถานะได้ด้วย status
+## รวมรายการที่ถูกย้ายไป archive แล้ว เรียงตาม borrow_date รวมกันทั้งสองที่
+@router.get("/export/transactions")
+async def export_transactions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[Literal["Pending", "Borrowed", "PendingReturn", "Returned"]] = None,
+    admin: Principal = Depends(get_current_admin),
+):
+    """Stream all matching transactions as NDJSON or CSV (Admin only)"""
+    docs = repositories().reporting.transactions.documents(
+        status=status, start=start, end=end, projection=projection_for(TransactionResponse)
+    )
+    return export_response(serialize_chunks(docs, TransactionResponse, format), format, "transactions")
+
+## GET /admin/export/books - ส่งออกหนังสือ (ช่วงวันที่ใช้เวลาที่เพิ่มหนังสือ)
+@router.get("/export/books")
+async def export_books(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: Principal = Depends(get_current_admin),
+):
+    """Stream the book catalog as NDJSON or CSV (Admin only)"""
+    docs = repositories().reporting.books.stream(start, end, projection_for(BookResponse))
+    return stream_export(docs, BookResponse, format, "books")
+
+## GET /admin/export/users - ส่งออกผู้ใช้ (ไม่มีรหัสผ่าน, ช่วงวันที่ใช้ created_at)
+@router.get("/export/users")
+async def export_users(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: Principal = Depends(get_current_admin),
+):
+    """Stream all users as NDJSON or CSV (Admin only)"""
+    docs = repositories().reporting.users.stream(start, end, projection_for(UserResponse))
+    return stream_export(docs, UserResponse, format, "users")
+
+## ============================================
+## Admin Events - แจ้งการเปลี่ยนสถานะแบบ real-time
+## ============================================
+
+## GET /admin/events - Server-Sent Events ของการเปลี่ยนสถานะ transactions
+## เปิดค้างไว้แทนการ poll GET /admin/transactions
+## - event "transaction": {transaction_id, user_id, book_id, status, previous_status}
+## - event "resync": client อ่านไม่ทันหรือพลาด event ไป ให้โหลดรายการใหม่ทั้งหมด
+## - ": ping" ทุก EVENTS_HEARTBEAT_SECONDS (comment ที่ EventSource ไม่ส่งให้ application)
+## ส่ง Last-Event-ID ตอนเชื่อมต่อใหม่เพื่อรับ event ที่พลาดไป
+@router.get("/events")
+async def stream_events(
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    admin: Principal = Depends(get_current_admin),
+):
+    """Stream transaction status changes as Server-Sent Events (Admin only)"""
+    if event_broker.full:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many event stream connections")
+    return StreamingResponse(
+        sse_stream(event_broker, last_event_id),
+        media_type="text/event-stream",
+        # ไม่ให้ proxy (เช่น nginx) buffer หรือแคช stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -11,11 +11,14 @@
 from datetime import timedelta
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from app.models import User
 from app.schemas import UserCreate, UserResponse, Token, UserLogin
+from app.cache import invalidate_stats
+from app.repositories import DuplicateError, repositories, user_document
+from app.serialization import project
 from app.auth import (
-    verify_password,
-    get_password_hash,
+    Principal,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_active_user
@@ -30,8 +33,9 @@ router = APIRouter()
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate):
     """Register a new user or admin"""
+    users = repositories().users
     # ตรวจสอบว่าชื่อผู้ใช้ซ้ำหรือไม่ (username ต้องไม่ซ้ำกัน)
-    existing_user = await User.find_one(User.username == user_data.username)
+    existing_user = await users.by_username(user_data.username)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -39,7 +43,7 @@ async def register(user_data: UserCreate):
         )
     
     # ตรวจสอบว่าอีเมลซ้ำหรือไม่ (email ต้องไม่ซ้ำกัน)
-    existing_email = await User.find_one(User.email == user_data.email)
+    existing_email = await users.by_email(user_data.email)
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,25 +60,22 @@ async def register(user_data: UserCreate):
         user_role = user_data.role
     
     # Hash password ก่อนเก็บในฐานข้อมูล (เพื่อความปลอดภัย)
-    hashed_password = get_password_hash(user_data.password)
+    # รันบน thread pool แยก เพื่อไม่ให้ bcrypt บล็อก request อื่น
+    hashed_password = await get_password_hash_async(user_data.password)
     
-    # สร้าง User object และบันทึกลงฐานข้อมูล
-    user = User(
-        username=user_data.username,
-        email=user_data.email,
-        password=hashed_password,
-        role=user_role
-    )
-    await user.insert()
+    # สร้างเอกสารผู้ใช้และบันทึกลงฐานข้อมูล
+    # (ถ้ามีคนสมัครด้วยชื่อหรืออีเมลเดียวกันพร้อมกัน unique index จะปฏิเสธรายการที่สอง)
+    try:
+        user = await users.insert(user_document(user_data.username, user_data.email, hashed_password, user_role))
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
+    invalidate_stats()
     
     # ส่งข้อมูลผู้ใช้ที่สร้างแล้วกลับไป (ไม่ส่ง password)
-    return UserResponse(
-        id=str(user.id), 
-        username=user.username, 
-        email=user.email,
-        role=user.role,
-        created_at=user.created_at
-    )
+    return UserResponse(**project(user, UserResponse))
 
 ## POST /auth/login - เข้าสู่ระบบ (OAuth2 Form)
 ## Public endpoint - ใช้สำหรับ OAuth2 standard form
@@ -83,7 +84,7 @@ async def register(user_data: UserCreate):
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login and get access token"""
     # ค้นหาผู้ใช้จาก username
-    user = await User.find_one(User.username == form_data.username)
+    user = await repositories().users.by_username(form_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -92,7 +93,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     # ตรวจสอบรหัสผ่าน (เปรียบเทียบกับ hashed password ในฐานข้อมูล)
-    if not verify_password(form_data.password, user.password):
+    if not await verify_password_async(form_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -102,7 +103,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # สร้าง JWT token พร้อมข้อมูล username และ role
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
+        data={"sub": user["username"], "role": user["role"]}, expires_delta=access_token_expires
     )
     
     # ส่ง token กลับไป (Frontend จะใช้ token นี้ในการเรียก API อื่นๆ)
@@ -116,7 +117,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 async def login_json(login_data: UserLogin):
     """Login with JSON body (for frontend compatibility)"""
     # ค้นหาผู้ใช้จาก username
-    user = await User.find_one(User.username == login_data.username)
+    user = await repositories().users.by_username(login_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -125,7 +126,7 @@ async def login_json(login_data: UserLogin):
         )
     
     # ตรวจสอบรหัสผ่าน
-    if not verify_password(login_data.password, user.password):
+    if not await verify_password_async(login_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -135,7 +136,7 @@ async def login_json(login_data: UserLogin):
     # สร้าง JWT token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
+        data={"sub": user["username"], "role": user["role"]}, expires_delta=access_token_expires
     )
     
     # ส่ง token กลับไป
@@ -145,11 +146,11 @@ async def login_json(login_data: UserLogin):
 ## Protected endpoint - ต้อง login และส่ง token
 ## ใช้สำหรับ Frontend เพื่อดึงข้อมูลผู้ใช้ที่ login อยู่
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_active_user)):
     """Get current user information"""
     # ส่งข้อมูลผู้ใช้ปัจจุบันกลับไป (ไม่ส่ง password)
     return UserResponse(
-        id=str(current_user.id), 
+        id=current_user.id, 
         username=current_user.username, 
         email=current_user.email,
         role=current_user.role,
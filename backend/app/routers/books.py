@@ -2,55 +2,194 @@
 ## Books Router - API Endpoints สำหรับจัดการหนังสือ
 
 ไฟล์นี้จัดการ API endpoints ทั้งหมดที่เกี่ยวข้องกับหนังสือ:
-- GET /books/ - ดึงรายการหนังสือทั้งหมด
+- GET /books/ - ดึงรายการหนังสือ (แบ่งหน้าแบบ cursor)
+- GET /books/search?q= - ค้นหาหนังสือจากชื่อ/ผู้แต่ง/ISBN
+- GET /books/batch?ids= - ดึงหนังสือหลายเล่มตาม ID ในครั้งเดียว
+- POST /books/import - นำเข้าหนังสือจำนวนมากจากไฟล์ CSV/NDJSON (Admin only)
 - GET /books/{id} - ดึงข้อมูลหนังสือตาม ID
 - POST /books/ - สร้างหนังสือใหม่ (Admin only)
 - PUT /books/{id} - แก้ไขข้อมูลหนังสือ (Admin only)
 - DELETE /books/{id} - ลบหนังสือ (Admin only)
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
-from app.models import Book, User
-from app.schemas import BookCreate, BookResponse, BookUpdate
-from app.auth import get_current_active_user, get_current_admin
-from beanie import PydanticObjectId
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from typing import List, Literal, Optional
+from bson import ObjectId
+from app.schemas import BookCreate, BookResponse, BookUpdate, BookBatchResponse, BookImportSummary
+from app.auth import Principal, get_current_active_user, get_current_admin
+from app.cache import invalidate_stats
+from app.catalog import (
+    catalog_etag,
+    catalog_headers,
+    not_modified,
+    set_catalog_headers,
+)
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    next_cursor,
+)
+from app.serialization import json_list_response, json_response, project, projection_for
+from app.batch import batch_result, fetch_batch, parse_ids
+from app.catalog_cache import catalog_cache
+from app.singleflight import single_flight
+from app.importer import ImportFormatError, format_from_content_type, import_books
+from app.repositories import DuplicateError, repositories
 
 ## สร้าง Router สำหรับ books endpoints
 router = APIRouter()
 
-## GET /books/ - ดึงรายการหนังสือทั้งหมด
+## GET /books/{id} ที่เข้ามาพร้อมกันด้วย ID เดียวกันใช้ query เดียวกัน
+_book_reads = single_flight("book")
+
+## GET /books/ - ดึงรายการหนังสือแบบแบ่งหน้า (keyset/cursor pagination)
 ## Public endpoint - ไม่ต้อง login ก็ดูได้
 ## ใช้สำหรับแสดงรายการหนังสือในหน้าแรกหรือหน้า UserBorrowScreen
+## - limit: จำนวนหนังสือต่อหน้า
+## - after: cursor ที่ได้จาก header X-Next-Cursor ของหน้าก่อนหน้า
+## - sort: "id" (ลำดับการเพิ่ม) หรือ "title" (เรียงตามชื่อหนังสือ)
+## ถ้ามีหน้าถัดไป จะส่ง cursor กลับมาใน header X-Next-Cursor
+## รองรับ Conditional GET: ถ้า If-None-Match ตรงกับ ETag จะตอบ 304 โดยไม่ query หนังสือ
+## ถ้าแคชของ catalog พร้อม จะตอบจากหน่วยความจำโดยไม่ query MongoDB
+## ถ้าไม่พร้อม อ่านตาม CATALOG_READ_PREFERENCE (เวอร์ชันและหนังสืออ่านใน causal session เดียวกัน)
 @router.get("/", response_model=List[BookResponse])
-async def get_books():
-    """Get all books (Public - no authentication required)"""
-    # ดึงหนังสือทั้งหมดจากฐานข้อมูล
-    books = await Book.find_all().to_list()
-    # แปลงเป็น BookResponse format และส่งกลับ
-    return [BookResponse(id=str(book.id), title=book.title, author=book.author, isbn=book.isbn, quantity=book.quantity, image_url=book.image_url) for book in books]
+async def get_books(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    sort: str = Query("id", pattern="^(id|title)$"),
+):
+    """Get a page of books (Public - no authentication required)"""
+    # ETag ขึ้นกับเวอร์ชันของ catalog และ parameters ของหน้านี้
+    variant = f"list:{limit}:{after}:{sort}"
+    sort_field = "title" if sort == "title" else None
+    if catalog_cache.ready:
+        etag = catalog_etag(catalog_cache.version, variant)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        books = catalog_cache.page(after, sort_field, limit + 1)
+    else:
+        async with repositories().catalog() as reads:
+            etag = catalog_etag(await reads.books.version(), variant)
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+            # ดึงหนังสือมา limit + 1 เล่ม เพื่อใช้ตรวจว่ามีหน้าถัดไปหรือไม่
+            # การ seek ต่อจาก cursor ใช้ index ได้ตรงๆ ไม่ต้อง skip รายการก่อนหน้า
+            # ดึงเฉพาะ field ของ BookResponse และแปลงเป็น JSON โดยตรง (ไม่สร้าง model ทีละเล่ม)
+            books = await reads.books.page(after, sort_field, limit + 1, projection_for(BookResponse))
+    headers = catalog_headers(etag)
+    cursor = next_cursor(books, limit, sort_field)
+    if cursor:
+        headers[NEXT_CURSOR_HEADER] = cursor
+    return json_list_response(books, BookResponse, headers)
+
+## GET /books/search?q= - ค้นหาหนังสือ
+## Public endpoint - ไม่ต้อง login ก็ค้นหาได้
+## - ถ้า q ตรงกับ ISBN พอดี จะคืนหนังสือเล่มนั้นทันที (ใช้ unique index ของ isbn)
+## - ถ้าไม่ตรง จะค้นหาจากชื่อหนังสือและผู้แต่งด้วย text index เรียงตามความเกี่ยวข้อง
+## แบ่งหน้าด้วย limit และ after (cursor จาก header X-Next-Cursor)
+## หมายเหตุ: ต้องประกาศก่อน /{id} ไม่อย่างนั้น "search" จะถูกตีความเป็น ID
+@router.get("/search", response_model=List[BookResponse])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+):
+    """Search books by title, author or exact ISBN (Public)"""
+    term = q.strip()
+    async with repositories().catalog() as reads:
+        # Fast path: ค้นหาด้วย ISBN ตรงตัว (หน้าแรกเท่านั้น)
+        if not after:
+            if catalog_cache.ready:
+                book = catalog_cache.by_isbn(term)
+            else:
+                book = await reads.books.by_isbn(term, projection_for(BookResponse))
+            if book:
+                return json_list_response([book], BookResponse)
+        
+        # ค้นหาจากชื่อหนังสือและผู้แต่ง เรียงตามคะแนนความเกี่ยวข้อง (มากไปน้อย) และ _id
+        # หน้าถัดไป seek ต่อจาก (คะแนน, _id) ของรายการสุดท้าย แทนการ skip รายการก่อนหน้า
+        # ดึงมา limit + 1 รายการ เพื่อใช้ตรวจว่ามีหน้าถัดไปหรือไม่
+        docs = await reads.books.search(term, after, limit + 1, projection_for(BookResponse))
+    headers = {}
+    cursor = next_cursor(docs, limit, "score")
+    if cursor:
+        headers[NEXT_CURSOR_HEADER] = cursor
+    return json_list_response(docs, BookResponse, headers)
+
+## GET /books/batch?ids=a,b,c - ดึงหนังสือหลายเล่มตาม ID ด้วย query เดียว
+## Public endpoint - ใช้แทนการเรียก GET /books/{id} ทีละเล่ม
+## ผลลัพธ์เรียงตามลำดับ ID ที่ส่งมา และรายงาน ID ที่ไม่พบใน "missing"
+## รองรับ Conditional GET เหมือน GET /books/
+## ต้องประกาศก่อน /{id} เพื่อไม่ให้ "batch" ถูกตีความเป็น ID
+@router.get("/batch", response_model=BookBatchResponse)
+async def get_books_batch(request: Request, ids: str = Query(..., description="Comma-separated book IDs")):
+    """Get several books by ID in one request (Public)"""
+    id_list = parse_ids(ids)
+    if catalog_cache.ready:
+        etag = catalog_etag(catalog_cache.version, "batch:" + ",".join(id_list))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        result = batch_result(id_list, catalog_cache.get, BookResponse)
+        return json_response(result, headers=catalog_headers(etag))
+    
+    async with repositories().catalog() as reads:
+        etag = catalog_etag(await reads.books.version(), "batch:" + ",".join(id_list))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
+        # ดึงหนังสือทั้งหมดด้วย $in query เดียว
+        result = await fetch_batch(reads.books, id_list, BookResponse)
+    return json_response(result, headers=catalog_headers(etag))
+
+## _read_book - อ่านเวอร์ชันของ catalog และหนังสือหนึ่งเล่ม (ใน causal session เดียวกัน)
+async def _read_book(id: str):
+    async with repositories().catalog() as reads:
+        version = await reads.books.version()
+        book = await reads.books.get(ObjectId(id), projection_for(BookResponse))
+    return version, book
 
 ## GET /books/{id} - ดึงข้อมูลหนังสือตาม ID
 ## Public endpoint - ไม่ต้อง login ก็ดูได้
 ## ใช้สำหรับดูรายละเอียดหนังสือเฉพาะเล่ม
+## รองรับ Conditional GET เหมือน GET /books/
+## ถ้าไม่ได้ตอบจากแคช request ของ ID เดียวกันที่เข้ามาพร้อมกันจะรวมเป็น query เดียว (single-flight)
 @router.get("/{id}", response_model=BookResponse)
-async def get_book(id: str):
+async def get_book(id: str, request: Request, response: Response):
     """Get book by ID (Public - no authentication required)"""
-    # ค้นหาหนังสือจาก ID
-    book = await Book.get(PydanticObjectId(id))
+    if catalog_cache.ready:
+        etag = catalog_etag(catalog_cache.version, f"book:{id}")
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        book = catalog_cache.get(id)
+    else:
+        # ค้นหาหนังสือจาก ID (ผลลัพธ์ใช้ร่วมกันระหว่าง request ที่รออยู่ - ห้ามแก้ไข)
+        version, book = await _book_reads.do(id, lambda: _read_book(id))
+        etag = catalog_etag(version, f"book:{id}")
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
+    set_catalog_headers(response, etag)
     # ส่งข้อมูลหนังสือกลับ
-    return BookResponse(id=str(book.id), title=book.title, author=book.author, isbn=book.isbn, quantity=book.quantity, image_url=book.image_url)
+    return BookResponse(**project(book, BookResponse))
 
 ## POST /books/ - สร้างหนังสือใหม่
 ## Admin only - ต้อง login เป็น Admin เท่านั้น
 ## ใช้เมื่อ Admin เพิ่มหนังสือใหม่ในระบบ (รวมถึงอัปโหลดรูปภาพ)
 @router.post("/", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
-async def create_book(book_in: BookCreate, admin: User = Depends(get_current_admin)):
+async def create_book(book_in: BookCreate, admin: Principal = Depends(get_current_admin)):
     """Create a new book (Admin only)"""
+    books = repositories().books
     # ตรวจสอบว่า ISBN ซ้ำหรือไม่ (ISBN ต้องไม่ซ้ำกัน)
-    existing_book = await Book.find_one(Book.isbn == book_in.isbn)
+    existing_book = await books.by_isbn(book_in.isbn, {"_id": 1})
     if existing_book:
         raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
     
@@ -59,47 +198,75 @@ async def create_book(book_in: BookCreate, admin: User = Depends(get_current_adm
     book_data = book_in.model_dump()
     print(f"[DEBUG] Creating book with data: {book_data}")  # Debug log
     
-    # สร้าง Book object และบันทึกลงฐานข้อมูล
-    book = Book(**book_data)
-    await book.insert()
+    # บันทึกหนังสือลงฐานข้อมูล (unique index ของ isbn กันการเพิ่ม ISBN เดียวกันพร้อมกัน)
+    try:
+        book = await books.insert(book_data)
+    except DuplicateError:
+        raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
+    await books.bump_version()
+    invalidate_stats()
     
-    print(f"[DEBUG] Book created successfully with ID: {book.id}")  # Debug log
-    print(f"[DEBUG] Book saved to MongoDB - Title: {book.title}, ISBN: {book.isbn}, Image URL: {book.image_url}")  # Debug log
+    print(f"[DEBUG] Book created successfully with ID: {book['_id']}")  # Debug log
+    print(f"[DEBUG] Book saved - Title: {book['title']}, ISBN: {book['isbn']}, Image URL: {book.get('image_url')}")  # Debug log
     
     # ส่งข้อมูลหนังสือที่สร้างแล้วกลับไป
-    return BookResponse(id=str(book.id), title=book.title, author=book.author, isbn=book.isbn, quantity=book.quantity, image_url=book.image_url)
+    return BookResponse(**project(book, BookResponse))
+
+## POST /books/import - นำเข้าหนังสือจำนวนมากจากไฟล์ CSV หรือ NDJSON
+## Admin only - ส่งเนื้อหาไฟล์เป็น body ตรงๆ (ไม่ใช่ multipart)
+## Content-Type: text/csv หรือ application/x-ndjson (หรือระบุ ?format=csv|ndjson)
+## - mode=insert: ISBN ที่มีอยู่แล้วจะถูกปฏิเสธ
+## - mode=upsert: ISBN ที่มีอยู่แล้วจะถูกแก้ไขข้อมูล
+## อ่าน body แบบ stream และเขียนเป็นชุด ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ
+@router.post("/import", response_model=BookImportSummary)
+async def import_books_file(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    mode: Literal["insert", "upsert"] = "insert",
+    admin: Principal = Depends(get_current_admin),
+):
+    """Bulk-import books from a CSV or NDJSON body (Admin only)"""
+    fmt = format or format_from_content_type(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=",
+        )
+    try:
+        return await import_books(request.stream(), fmt, upsert=mode == "upsert")
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
 
 ## PUT /books/{id} - แก้ไขข้อมูลหนังสือ
 ## Admin only - ต้อง login เป็น Admin เท่านั้น
 ## ใช้เมื่อ Admin แก้ไขข้อมูลหนังสือ (ชื่อ, ผู้แต่ง, จำนวน, รูปภาพ)
 ## หมายเหตุ: ISBN ไม่สามารถแก้ไขได้ (เพื่อป้องกันปัญหา)
 @router.put("/{id}", response_model=BookResponse)
-async def update_book(id: str, book_update: BookUpdate, admin: User = Depends(get_current_admin)):
+async def update_book(id: str, book_update: BookUpdate, admin: Principal = Depends(get_current_admin)):
     """Update book (Admin only)"""
-    # ค้นหาหนังสือจาก ID
-    book = await Book.get(PydanticObjectId(id))
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
+    books = repositories().books
     # แปลงข้อมูลที่ต้องการอัปเดต (เฉพาะ field ที่ส่งมา)
     # exclude_unset=True หมายความว่าถ้า field ไม่ได้ส่งมา จะไม่ update field นั้น
     update_data = book_update.model_dump(exclude_unset=True)
-    await book.set(update_data)  # อัปเดตข้อมูลในฐานข้อมูล
+    # อัปเดตข้อมูลในฐานข้อมูล (None ถ้าไม่พบหนังสือ)
+    book = await books.update(ObjectId(id), update_data)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    await books.bump_version()
     
     # ส่งข้อมูลหนังสือที่อัปเดตแล้วกลับไป
-    return BookResponse(id=str(book.id), title=book.title, author=book.author, isbn=book.isbn, quantity=book.quantity, image_url=book.image_url)
+    return BookResponse(**project(book, BookResponse))
 
 ## DELETE /books/{id} - ลบหนังสือ
 ## Admin only - ต้อง login เป็น Admin เท่านั้น
 ## ใช้เมื่อ Admin ลบหนังสือออกจากระบบ
 @router.delete("/{id}")
-async def delete_book(id: str, admin: User = Depends(get_current_admin)):
+async def delete_book(id: str, admin: Principal = Depends(get_current_admin)):
     """Delete book (Admin only)"""
-    # ค้นหาหนังสือจาก ID
-    book = await Book.get(PydanticObjectId(id))
-    if not book:
+    books = repositories().books
+    # ลบหนังสือออกจากฐานข้อมูล (False ถ้าไม่พบหนังสือ)
+    if not await books.delete(ObjectId(id)):
         raise HTTPException(status_code=404, detail="Book not found")
-    
-    # ลบหนังสือออกจากฐานข้อมูล
-    await book.delete()
+    await books.bump_version()
+    invalidate_stats()
     return {"message": "Book deleted successfully"}
@@ -0,0 +1,161 @@
+"""
+## Jobs Router - API Endpoints สำหรับงานเบื้องหลังของ Admin
+
+ไฟล์นี้จัดการ API endpoints ของงานที่ใช้เวลานาน (ดู app/jobs.py และ app/job_tasks.py):
+- POST /admin/jobs/export/{collection} - ส่งออก transactions/books/users เป็นไฟล์
+- POST /admin/jobs/import-books - นำเข้าหนังสือจากไฟล์ CSV/NDJSON
+- POST /admin/jobs/recount-inventory - นับสต็อกหนังสือใหม่
+- POST /admin/jobs/delete-user/{user_id} - ลบผู้ใช้พร้อมยกเลิกคำขอยืมที่รออนุมัติ
+- POST /admin/jobs/archive-transactions - ย้าย transactions ที่คืนแล้วและเก่าไปยัง archive
+- GET /admin/jobs/ - รายการงานล่าสุด
+- GET /admin/jobs/{job_id} - สถานะและความคืบหน้าของงาน
+- GET /admin/jobs/{job_id}/download - ดาวน์โหลดไฟล์ของงาน export
+
+POST ทุกตัวตอบ 202 ทันทีพร้อม JobResponse แล้วให้ client poll GET /admin/jobs/{job_id}
+ทุก endpoint ในไฟล์นี้ต้อง login เป็น Admin เท่านั้น
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import FileResponse
+from typing import List, Literal, Optional
+from bson import ObjectId
+from app.schemas import JobResponse
+from app.auth import Principal, get_current_admin
+from app.archive import ARCHIVE_AFTER_DAYS
+from app.export import EXPORT_MEDIA_TYPES
+from app.importer import format_from_content_type
+from app.jobs import job_path, job_runner
+from app.job_tasks import export_filename
+from app.repositories import repositories
+from app.serialization import project
+
+## สร้าง Router สำหรับ jobs endpoints
+router = APIRouter()
+
+## _job_response - แปลงเอกสารของงานเป็น JobResponse
+def _job_response(job: dict) -> JobResponse:
+    return JobResponse(**project(job, JobResponse))
+
+## _get_job - ดึงงานตาม ID (404 ถ้าไม่พบหรือ ID ไม่ถูกต้อง)
+async def _get_job(job_id: str) -> dict:
+    job = await repositories().jobs.get(ObjectId(job_id)) if ObjectId.is_valid(job_id) else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+## POST /admin/jobs/export/{collection} - ส่งออกข้อมูลเป็นไฟล์แบบเบื้องหลัง
+## พารามิเตอร์เหมือน GET /admin/export/{collection} (format, start, end และ status สำหรับ transactions)
+## เหมาะกับ export ขนาดใหญ่ที่ stream ตรงๆ แล้วโดน timeout - เมื่อเสร็จดาวน์โหลดที่ /admin/jobs/{id}/download
+@router.post("/export/{collection}", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_export(
+    collection: Literal["transactions", "books", "users"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[Literal["Pending", "Borrowed", "PendingReturn", "Returned"]] = None,
+    admin: Principal = Depends(get_current_admin),
+):
+    """Export a collection to a downloadable file in the background (Admin only)"""
+    params = {"collection": collection, "format": format, "start": start, "end": end}
+    if collection == "transactions":
+        params["status"] = status
+    job = await job_runner.enqueue("export", params, admin.username)
+    return _job_response(job)
+
+## POST /admin/jobs/import-books - นำเข้าหนังสือจากไฟล์แบบเบื้องหลัง
+## body และพารามิเตอร์เหมือน POST /books/import แต่ตอบ 202 ทันทีหลังบันทึกไฟล์ลง JOBS_DIR
+## ผลลัพธ์ (inserted/updated/rejected/errors) อยู่ใน result ของงานเมื่อเสร็จ
+@router.post("/import-books", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_import_books(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    mode: Literal["insert", "upsert"] = "insert",
+    admin: Principal = Depends(get_current_admin),
+):
+    """Bulk-import books from a CSV or NDJSON body in the background (Admin only)"""
+    fmt = format or format_from_content_type(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=",
+        )
+    # บันทึก body ลงไฟล์ทีละ chunk (ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ) ให้งานอ่านภายหลัง
+    upload = f"import-{uuid.uuid4().hex}.{fmt}"
+    path = job_path(upload)
+    try:
+        with open(path, "wb") as out:
+            async for chunk in request.stream():
+                await asyncio.to_thread(out.write, chunk)
+        job = await job_runner.enqueue("import_books", {"upload": upload, "format": fmt, "mode": mode}, admin.username)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return _job_response(job)
+
+## POST /admin/jobs/recount-inventory - นับสต็อกหนังสือใหม่จากข้อมูลจริง
+## result: books, copies_available, copies_on_loan, out_of_stock, negative_stock, orphaned_loans
+@router.post("/recount-inventory", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_recount_inventory(admin: Principal = Depends(get_current_admin)):
+    """Recount book inventory and loans in the background (Admin only)"""
+    job = await job_runner.enqueue("recount_inventory", {}, admin.username)
+    return _job_response(job)
+
+## POST /admin/jobs/delete-user/{user_id} - ลบผู้ใช้พร้อม cleanup แบบเบื้องหลัง
+## คำขอยืมที่รออนุมัติถูกยกเลิกก่อน (Admin อนุมัติไม่ได้อีก) แล้วงานจะล้มเหลวถ้าผู้ใช้ยังมีหนังสือที่ยืมอยู่
+## (คำขอที่ยกเลิกได้สถานะ Pending คืน) ประวัติที่คืนแล้วเก็บไว้
+## หมายเหตุ: Admin ไม่สามารถลบบัญชีตัวเองได้
+@router.post("/delete-user/{user_id}", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_delete_user(user_id: str, admin: Principal = Depends(get_current_admin)):
+    """Delete a user and cancel their pending requests in the background (Admin only)"""
+    if user_id == admin.id:
+        raise HTTPException(status_code=400, detail="Cannot delete your own account")
+    job = await job_runner.enqueue("delete_user", {"user_id": user_id}, admin.username)
+    return _job_response(job)
+
+## POST /admin/jobs/archive-transactions - ย้าย transactions ที่คืนแล้วและเก่ากว่า older_than_days วันไปยัง archive
+## ประวัติของผู้ใช้ export และสถิติยังเห็นรายการเหล่านี้ตามปกติ
+@router.post("/archive-transactions", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_archive_transactions(
+    older_than_days: int = Query(ARCHIVE_AFTER_DAYS, ge=0),
+    admin: Principal = Depends(get_current_admin),
+):
+    """Move old returned transactions to the archive in the background (Admin only)"""
+    job = await job_runner.enqueue("archive_transactions", {"older_than_days": older_than_days}, admin.username)
+    return _job_response(job)
+
+## GET /admin/jobs/ - รายการงานล่าสุด (ใหม่สุดก่อน)
+## กรองด้วย kind และ status ได้
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    kind: Optional[str] = None,
+    status: Optional[Literal["queued", "running", "succeeded", "failed"]] = None,
+    limit: int = Query(50, ge=1, le=200),
+    admin: Principal = Depends(get_current_admin),
+):
+    """List recent background jobs (Admin only)"""
+    jobs = await repositories().jobs.list(kind, status, limit)
+    return [_job_response(job) for job in jobs]
+
+## GET /admin/jobs/{job_id} - สถานะและความคืบหน้าของงาน (done/total)
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, admin: Principal = Depends(get_current_admin)):
+    """Get a background job's status and progress (Admin only)"""
+    return _job_response(await _get_job(job_id))
+
+## GET /admin/jobs/{job_id}/download - ดาวน์โหลดไฟล์ของงาน export ที่สำเร็จแล้ว
+## 409 ถ้างานยังไม่เสร็จหรือไม่ใช่ export, 410 ถ้าไฟล์ถูกลบไปแล้ว (เก่ากว่า JOBS_FILE_RETENTION_HOURS)
+@router.get("/{job_id}/download")
+async def download_job_file(job_id: str, admin: Principal = Depends(get_current_admin)):
+    """Download the file produced by a finished export job (Admin only)"""
+    job = await _get_job(job_id)
+    if job["kind"] != "export" or job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail="Job has no file to download")
+    path = job_path(export_filename(job))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Job file has expired")
+    return FileResponse(path, media_type=EXPORT_MEDIA_TYPES[job["params"]["format"]], filename=job["result"]["filename"])
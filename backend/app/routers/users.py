@@ -1,24 +1,36 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import List
-from app.models import User
-from app.schemas import UserResponse
-from app.auth import get_current_active_user
-from beanie import PydanticObjectId
+from bson import ObjectId
+from app.schemas import UserResponse, UserBatchResponse
+from app.auth import Principal, get_current_active_user
+from app.batch import fetch_batch, parse_ids
+from app.repositories import repositories
+from app.serialization import json_response, project, projection_for
+from app.singleflight import single_flight
 
 router = APIRouter()
 
+## GET /users/{id} ที่เข้ามาพร้อมกันด้วย ID เดียวกันใช้ query เดียวกัน
+_user_reads = single_flight("user")
+
 # Note: User registration is now handled by auth router
 # This endpoint is kept for backward compatibility but should use auth/register instead
 
+## GET /users/batch?ids=a,b,c - ดึงผู้ใช้หลายคนตาม ID ด้วย query เดียว
+## ต้อง login - ผลลัพธ์เรียงตามลำดับ ID ที่ส่งมา และรายงาน ID ที่ไม่พบใน "missing"
+## ต้องประกาศก่อน /{id} เพื่อไม่ให้ "batch" ถูกตีความเป็น ID
+@router.get("/batch", response_model=UserBatchResponse)
+async def get_users_batch(
+    ids: str = Query(..., description="Comma-separated user IDs"),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """Get several users by ID in one request"""
+    result = await fetch_batch(repositories().users, parse_ids(ids), UserResponse)
+    return json_response(result)
+
 @router.get("/{id}", response_model=UserResponse)
 async def get_user(id: str):
-    user = await User.get(PydanticObjectId(id))
+    user = await _user_reads.do(id, lambda: repositories().users.get(ObjectId(id), projection_for(UserResponse)))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse(
-        id=str(user.id),
-        username=user.username,
-        email=user.email,
-        role=user.role,
-        created_at=user.created_at
-    )
+    return UserResponse(**project(user, UserResponse))
@@ -6,7 +6,7 @@
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 ## ============================================
@@ -40,6 +40,19 @@ class BookUpdate(BaseModel):
 class BookResponse(BookBase):
     id: str  # ID ของหนังสือในฐานข้อมูล
 
+## BookImportError - รายละเอียดของแถวที่นำเข้าไม่ได้ (line = เลขบรรทัดในไฟล์)
+class BookImportError(BaseModel):
+    line: int
+    detail: str
+
+## BookImportSummary - สรุปผลการนำเข้าหนังสือจากไฟล์ (POST /books/import)
+## errors เก็บรายละเอียดแค่ 100 แถวแรกที่ถูกปฏิเสธ (rejected นับทั้งหมด)
+class BookImportSummary(BaseModel):
+    inserted: int  # จำนวนหนังสือที่เพิ่มใหม่
+    updated: int  # จำนวนหนังสือที่มี ISBN อยู่แล้วและถูกแก้ไข (mode=upsert)
+    rejected: int  # จำนวนแถวที่ไม่ผ่านการตรวจสอบหรือ ISBN ซ้ำ
+    errors: List[BookImportError]
+
 ## ============================================
 ## User Schemas - โครงสร้างข้อมูลผู้ใช้
 ## ============================================
@@ -68,6 +81,21 @@ class UserResponse(UserBase):
     role: str  # บทบาท (user หรือ admin)
     created_at: datetime  # วันที่สร้างบัญชี
 
+## ============================================
+## Batch Schemas - ผลลัพธ์ของการดึงข้อมูลหลายรายการตาม ID
+## ============================================
+
+## BookBatchResponse - ผลลัพธ์ของ GET /books/batch
+## items เรียงตามลำดับ ID ที่ส่งมา, missing คือ ID ที่ไม่พบ (หรือรูปแบบไม่ถูกต้อง)
+class BookBatchResponse(BaseModel):
+    items: List[BookResponse]
+    missing: List[str]
+
+## UserBatchResponse - ผลลัพธ์ของ GET /users/batch (โครงสร้างเดียวกับ BookBatchResponse)
+class UserBatchResponse(BaseModel):
+    items: List[UserResponse]
+    missing: List[str]
+
 ## Token - โครงสร้างข้อมูล JWT Token
 ## ใช้เมื่อ API ส่ง token กลับไปหลังจาก login สำเร็จ
 class Token(BaseModel):
@@ -99,3 +127,51 @@ class TransactionResponse(BaseModel):
     borrow_date: datetime  # วันที่ยืม
     return_date: Optional[datetime] = None  # วันที่คืน (NULL ถ้ายังไม่คืน)
     status: str  # สถานะ: "Pending", "Borrowed", "PendingReturn", "Returned"
+
+## TransactionDetailResponse - transaction พร้อมรายละเอียดหนังสือและผู้ใช้ (expand=true)
+## ใช้แสดงคิวอนุมัติ/ประวัติได้ทันทีโดยไม่ต้องเรียก /books/{id} และ /users/{id} ทีละรายการ
+## field จะเป็น None ถ้าหนังสือหรือผู้ใช้ถูกลบไปแล้ว
+class TransactionDetailResponse(TransactionResponse):
+    book_title: Optional[str] = None  # ชื่อหนังสือ
+    book_author: Optional[str] = None  # ชื่อผู้แต่ง
+    username: Optional[str] = None  # ชื่อผู้ใช้ที่ยืม
+
+## BulkApproveRequest - โครงสร้างข้อมูลสำหรับอนุมัติหลายรายการพร้อมกัน
+## ใช้เมื่อ Admin อนุมัติการยืมหรือการคืนทีละหลายรายการ
+## ระบุ transaction_ids (รายการที่ต้องการ) หรือ book_id (ทุกรายการที่รออนุมัติของหนังสือเล่มนั้น)
+class BulkApproveRequest(BaseModel):
+    action: Literal["borrow", "return"]  # "borrow" = อนุมัติการยืม, "return" = อนุมัติการคืน
+    transaction_ids: Optional[List[str]] = None  # ID ของ transactions ที่ต้องการอนุมัติ
+    book_id: Optional[str] = None  # อนุมัติทุกรายการที่รออนุมัติของหนังสือเล่มนี้
+
+## BulkApproveItem - ผลการอนุมัติของแต่ละ transaction
+class BulkApproveItem(BaseModel):
+    transaction_id: str  # ID ของ transaction
+    approved: bool  # อนุมัติสำเร็จหรือไม่
+    detail: Optional[str] = None  # เหตุผลที่ไม่อนุมัติ (เช่น "Book out of stock")
+
+## BulkApproveResponse - สรุปผลการอนุมัติหลายรายการ
+class BulkApproveResponse(BaseModel):
+    approved: int  # จำนวนรายการที่อนุมัติสำเร็จ
+    rejected: int  # จำนวนรายการที่ไม่อนุมัติ
+    results: List[BulkApproveItem]  # ผลของแต่ละรายการ
+
+## ============================================
+## Job Schemas - โครงสร้างข้อมูลงานเบื้องหลัง
+## ============================================
+
+## JobResponse - สถานะและความคืบหน้าของงานเบื้องหลัง
+## POST /admin/jobs/... ตอบ 202 พร้อมข้อมูลนี้ แล้ว poll GET /admin/jobs/{id} จนกว่า status จะเป็น succeeded/failed
+class JobResponse(BaseModel):
+    id: str  # ID ของงาน
+    kind: str  # ประเภทงาน
+    status: str  # "queued", "running", "succeeded", "failed"
+    params: dict  # พารามิเตอร์ของงาน
+    done: int  # จำนวนที่ทำเสร็จแล้ว
+    total: Optional[int] = None  # จำนวนทั้งหมด (None ถ้ายังไม่ทราบ)
+    result: Optional[dict] = None  # ผลลัพธ์เมื่อสำเร็จ
+    error: Optional[str] = None  # ข้อความ error เมื่อล้มเหลว
+    created_by: str  # Admin ที่สั่งงาน
+    created_at: datetime  # เวลาที่สั่งงาน
+    started_at: Optional[datetime] = None  # เวลาที่เริ่มทำงาน
+    finished_at: Optional[datetime] = None  # เวลาที่ทำงานเสร็จ
@@ -0,0 +1,79 @@
+"""
+## Serialization - แปลงเอกสารจาก MongoDB เป็น JSON แบบเร็ว
+
+ทางปกติของ list endpoints: MongoDB document -> Beanie model -> Response schema
+-> FastAPI ตรวจสอบ response_model อีกรอบ -> JSON ซึ่งแปลงข้อมูลซ้ำหลายรอบต่อรายการ
+
+ไฟล์นี้ให้ทางลัด: ดึงเฉพาะ field ที่อยู่ใน Response schema จาก MongoDB (projection)
+แล้วแปลง dictionary เป็น JSON bytes โดยตรงด้วย orjson (ถ้าไม่มี orjson จะใช้ json ปกติ)
+Response schemas ใน app/schemas.py ยังเป็นตัวกำหนดว่าส่ง field อะไรกลับไปบ้าง
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Type
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson เป็น optional dependency
+    orjson = None
+
+## dumps - แปลง object เป็น JSON bytes
+def dumps(obj: Any) -> bytes:
+    """Encode to JSON bytes with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+## _schema_fields - รายชื่อ field ของ schema พร้อมค่า default (คำนวณครั้งเดียวต่อ schema)
+_FIELDS_CACHE: Dict[type, List[tuple]] = {}
+
+def _schema_fields(schema: Type[BaseModel]) -> List[tuple]:
+    fields = _FIELDS_CACHE.get(schema)
+    if fields is None:
+        fields = [
+            (name, None if field.is_required() else field.get_default(call_default_factory=True))
+            for name, field in schema.model_fields.items()
+        ]
+        _FIELDS_CACHE[schema] = fields
+    return fields
+
+## projection_for - projection ของ MongoDB ที่ดึงเฉพาะ field ที่ schema ต้องใช้
+## (field "id" ของ schema คือ "_id" ในฐานข้อมูล ซึ่ง MongoDB ส่งมาเสมออยู่แล้ว)
+def projection_for(schema: Type[BaseModel]) -> dict:
+    """MongoDB projection containing only the schema's fields"""
+    return {name: 1 for name, _ in _schema_fields(schema) if name != "id"}
+
+## project - แปลงเอกสารจาก MongoDB (dict) เป็น dict ตามโครงสร้างของ schema
+def project(doc: dict, schema: Type[BaseModel]) -> dict:
+    """Shape a raw MongoDB document like the given response schema"""
+    out = {}
+    for name, default in _schema_fields(schema):
+        if name == "id":
+            out["id"] = str(doc["_id"])
+        else:
+            out[name] = doc.get(name, default)
+    return out
+
+## json_list_response - สร้าง Response JSON จากเอกสารหลายรายการโดยตรง
+## FastAPI จะส่ง Response นี้ออกไปเลย ไม่ validate/serialize ซ้ำผ่าน response_model
+def json_list_response(
+    docs: Iterable[dict],
+    schema: Type[BaseModel],
+    headers: Optional[dict] = None,
+) -> Response:
+    """Serialize raw documents straight to a JSON array response"""
+    body = dumps([project(doc, schema) for doc in docs])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+## json_response - สร้าง Response JSON จาก object ที่แปลงโครงสร้างไว้แล้ว (dict/list)
+def json_response(obj: Any, headers: Optional[dict] = None) -> Response:
+    """Serialize an already-shaped object straight to a JSON response"""
+    return Response(content=dumps(obj), media_type="application/json", headers=headers)
@@ -0,0 +1,80 @@
+"""
+## Single-flight - รวม request ที่อ่านข้อมูลเดียวกันพร้อมกันให้เหลือ query เดียว
+
+เมื่อหนังสือเล่มหนึ่งได้รับความนิยม อาจมี GET /books/{id} ของ ID เดียวกันเข้ามาพร้อมกันหลายร้อย request
+ถ้าไม่รวมกัน ทุก request จะ query MongoDB เองทั้งหมด
+
+SingleFlight ให้ request แรกของแต่ละ key เป็นคนเรียกฐานข้อมูล (leader)
+request ที่เข้ามาระหว่างนั้นด้วย key เดียวกันจะรอผลเดียวกัน แทนที่จะ query ซ้ำ
+เมื่อ query เสร็จ key จะถูกลบ - request ถัดไปจะ query ใหม่ (ไม่ใช่แคช ข้อมูลไม่เก่ากว่าเดิม)
+
+ใช้เฉพาะการอ่านที่ไม่มีผลข้างเคียง และผลลัพธ์ต้องไม่ถูกแก้ไขโดยผู้รอ (ทุกคนได้ object เดียวกัน)
+query รันเป็น task แยก ถ้า client ของ leader ยกเลิก request ผู้รอคนอื่นยังได้ผลลัพธ์ตามปกติ
+
+ดูจำนวนที่รวมได้ที่ GET /admin/system/singleflight และใน GET /metrics
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+## SingleFlight - กลุ่มของการอ่านประเภทเดียวกัน (เช่น "book", "user")
+## ทำงานใน event loop เดียว จึงไม่ต้องใช้ lock
+class SingleFlight:
+    """Merge concurrent identical lookups into one in-flight call"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0  # จำนวนครั้งที่เรียกฐานข้อมูลจริง
+        self.coalesced = 0  # จำนวน request ที่ได้ผลจาก query ของ request อื่น
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    ## do - คืนผลของ fn() โดยถ้ามี key เดียวกันกำลังทำงานอยู่ จะรอผลนั้นแทนการเรียกใหม่
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn once per key at a time and share its result with concurrent callers"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: การยกเลิก request หนึ่งไม่ยกเลิก query ที่คนอื่นรออยู่
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # ไม่ให้ asyncio เตือน "exception was never retrieved" ถ้าทุกคนยกเลิกไปแล้ว
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+## ============================================
+## Groups - กลุ่มที่ใช้ใน routers
+## ============================================
+
+_groups: Dict[str, SingleFlight] = {}
+
+## single_flight - ดึงกลุ่มตามชื่อ (สร้างใหม่ถ้ายังไม่มี)
+def single_flight(name: str) -> SingleFlight:
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+## singleflight_stats - สถิติของทุกกลุ่ม (สำหรับ GET /admin/system/singleflight)
+def singleflight_stats() -> dict:
+    return {name: group.stats() for name, group in sorted(_groups.items())}
+
+## render_singleflight_metrics - สถิติในรูปแบบ Prometheus (ต่อท้าย GET /metrics)
+def render_singleflight_metrics() -> str:
+    lines = [
+        "# HELP singleflight_calls_total Reads by single-flight group, executed or coalesced into another in-flight read.",
+        "# TYPE singleflight_calls_total counter",
+    ]
+    for name, group in sorted(_groups.items()):
+        lines.append(f'singleflight_calls_total{{group="{name}",result="executed"}} {group.executed}')
+        lines.append(f'singleflight_calls_total{{group="{name}",result="coalesced"}} {group.coalesced}')
+    return "\n".join(lines) + "\n"
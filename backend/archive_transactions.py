@@ -0,0 +1,48 @@
+"""
+Script to move old returned transactions into the archive collection
+Returned transactions older than --older-than-days are moved in batches into
+per-user monthly buckets in transactions_archive; history and exports still include them
+Usage: python archive_transactions.py [--older-than-days 180] [--batch-size 1000]
+
+Safe to re-run (e.g. from cron): an interrupted run is completed by the next one
+"""
+import argparse
+import asyncio
+import os
+import sys
+from app.database import init_db, close_db
+from app.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_returned
+
+async def report(moved, total):
+    print(f"    {moved}/{total} moved")
+
+async def main(args):
+    # MongoDB URL comes from MONGODB_URL (defaults to a local server; see init_db)
+    # Database name
+    database_name = os.getenv("MONGODB_DB_NAME", "Book_borrowing_and_return_system_Phayu")
+
+    print("=" * 60)
+    print("Transaction Archive")
+    print("=" * 60)
+    print(f"Database: {database_name}")
+    print(f"Returned more than {args.older_than_days} days ago, {args.batch_size} per batch")
+    print("=" * 60)
+    print()
+
+    # Connect to MongoDB (also creates the unique bucket index the archive relies on)
+    await init_db("mongo")
+
+    try:
+        result = await archive_returned(args.older_than_days, args.batch_size, on_batch=report)
+    finally:
+        close_db()
+
+    print(f"✅ Archived: {result['archived']} transactions ({result['buckets_written']} bucket writes)")
+    print(f"   Cutoff:   {result['cutoff'].isoformat()}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old returned transactions into the archive")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive transactions returned more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="transactions moved per batch")
+    sys.exit(asyncio.run(main(parser.parse_args())))
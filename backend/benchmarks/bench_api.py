@@ -0,0 +1,341 @@
+"""
+Load benchmark for the API
+Drives the real app.main:app in-process through httpx.ASGITransport (default)
+or a running server (--base-url), runs realistic scenarios with concurrent
+clients and reports throughput and p50/p95/p99 latency per scenario and per
+route. Results are saved as JSON; pass a previous results file to --compare
+to flag regressions between releases.
+
+Scenarios:
+  catalog    browse two catalog pages, search, open a book
+  login      login storm (bcrypt on the password hashing pool)
+  borrow     borrow -> approve borrow -> return -> approve return
+  dashboard  admin stats, expanded transactions, user list
+
+In-process mode uses its own database (--mongodb-url / --db, dropped afterwards
+unless --keep-db), or no MongoDB at all with --backend memory (useful to
+profile the application code itself; database latency is not included).
+Against a running server the seed data is created through the API and left
+in place.
+
+Usage:
+  python -m benchmarks.bench_api [--duration 10] [--concurrency 20] [--scenarios catalog,login]
+  python -m benchmarks.bench_api --backend memory --scenarios borrow,dashboard
+  python -m benchmarks.bench_api --base-url http://localhost:8000 --output results.json
+  python -m benchmarks.bench_api --compare old.json --threshold 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import httpx
+
+WORDS = ["python", "history", "data", "design", "garden", "ocean", "music", "science", "travel", "cooking"]
+
+## Recorder - times every request and groups latencies by route template
+class Recorder:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, method: str, url: str, route: Optional[str] = None, ok=(200,), **kwargs) -> httpx.Response:
+        route = f"{method} {route or url}"
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        if response.status_code not in ok:
+            self.errors[route] += 1
+        return response
+
+## Context - seed data and tokens shared by the scenarios
+class Context:
+    def __init__(self, client: httpx.AsyncClient, run_id: str):
+        self.client = client
+        self.run_id = run_id
+        self.admin_headers: dict = {}
+        self.users: List[dict] = []  # {"username", "password", "id", "headers"}
+        self.book_ids: List[str] = []
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    response = await client.post("/auth/login-json", json={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def register(client: httpx.AsyncClient, username: str, password: str, role: str = "user") -> dict:
+    response = await client.post("/auth/register", json={
+        "username": username, "email": f"{username}@bench.local", "password": password, "role": role,
+    })
+    response.raise_for_status()
+    return response.json()
+
+## seed - admin, users and books created through the API (works for both modes)
+async def seed(ctx: Context, books: int, users: int) -> None:
+    client, run_id = ctx.client, ctx.run_id
+    await register(client, f"bench_admin_{run_id}", "benchpass", role="admin")
+    ctx.admin_headers = auth(await login(client, f"bench_admin_{run_id}", "benchpass"))
+
+    lines = [
+        json.dumps({
+            "title": f"{random.choice(WORDS).title()} {random.choice(WORDS)} volume {i}",
+            "author": f"Author {i % 50}",
+            "isbn": f"bench-{run_id}-{i}",
+            "quantity": 1000,
+        })
+        for i in range(books)
+    ]
+    response = await client.post(
+        "/books/import", content="\n".join(lines),
+        headers={**ctx.admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    response.raise_for_status()
+    prefix = f"bench-{run_id}-"
+    after = None
+    while True:
+        params = {"limit": 200, **({"after": after} if after else {})}
+        page = await client.get("/books/", params=params)
+        ctx.book_ids += [book["id"] for book in page.json() if book["isbn"].startswith(prefix)]
+        after = page.headers.get("X-Next-Cursor")
+        if not after:
+            break
+
+    async def make_user(i: int) -> dict:
+        username, password = f"bench_user_{run_id}_{i}", "benchpass"
+        user = await register(client, username, password)
+        token = await login(client, username, password)
+        return {"username": username, "password": password, "id": user["id"], "headers": auth(token)}
+
+    ctx.users = await asyncio.gather(*(make_user(i) for i in range(users)))
+
+## ============================================
+## Scenarios - one call is one user "session"; worker is the client index
+## ============================================
+
+async def catalog(ctx: Context, rec: Recorder, worker: int) -> None:
+    page = await rec.request("GET", "/books/", params={"limit": 50})
+    cursor = page.headers.get("X-Next-Cursor")
+    if cursor:
+        await rec.request("GET", "/books/", params={"limit": 50, "after": cursor})
+    await rec.request("GET", "/books/search", params={"q": random.choice(WORDS)})
+    await rec.request("GET", f"/books/{random.choice(ctx.book_ids)}", route="/books/{id}")
+
+async def login_storm(ctx: Context, rec: Recorder, worker: int) -> None:
+    user = random.choice(ctx.users)
+    await rec.request("POST", "/auth/login-json", json={"username": user["username"], "password": user["password"]})
+
+async def borrow_cycle(ctx: Context, rec: Recorder, worker: int) -> None:
+    # each worker owns one user so concurrent cycles never collide on the same borrow
+    user = ctx.users[worker % len(ctx.users)]
+    body = {"user_id": user["id"], "book_id": random.choice(ctx.book_ids)}
+    borrowed = await rec.request("POST", "/transactions/borrow", json=body, headers=user["headers"])
+    if borrowed.status_code != 200:
+        return
+    transaction_id = borrowed.json()["id"]
+    await rec.request("POST", f"/admin/transactions/{transaction_id}/approve-borrow",
+                      route="/admin/transactions/{id}/approve-borrow", headers=ctx.admin_headers)
+    await rec.request("POST", "/transactions/return", json=body, headers=user["headers"])
+    await rec.request("POST", f"/admin/transactions/{transaction_id}/approve-return",
+                      route="/admin/transactions/{id}/approve-return", headers=ctx.admin_headers)
+
+async def dashboard(ctx: Context, rec: Recorder, worker: int) -> None:
+    await rec.request("GET", "/admin/stats", headers=ctx.admin_headers)
+    await rec.request("GET", "/admin/transactions", params={"expand": "true"}, headers=ctx.admin_headers)
+    await rec.request("GET", "/admin/users", headers=ctx.admin_headers)
+
+SCENARIOS = {
+    "catalog": catalog,
+    "login": login_storm,
+    "borrow": borrow_cycle,
+    "dashboard": dashboard,
+}
+
+## ============================================
+## Runner and reporting
+## ============================================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+            "max": round(values[-1], 3) if values else 0.0,
+        },
+    }
+
+async def run_scenario(ctx: Context, name: str, concurrency: int, duration: float, warmup: float) -> dict:
+    scenario = SCENARIOS[name]
+
+    async def drive(rec: Recorder, seconds: float) -> float:
+        start = time.perf_counter()
+        deadline = start + seconds
+
+        async def worker(index: int) -> None:
+            while time.perf_counter() < deadline:
+                await scenario(ctx, rec, index)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return time.perf_counter() - start
+
+    if warmup:
+        await drive(Recorder(ctx.client), warmup)
+    rec = Recorder(ctx.client)
+    elapsed = await drive(rec, duration)
+
+    all_latencies = [value for values in rec.latencies.values() for value in values]
+    result = summarize(all_latencies, sum(rec.errors.values()), elapsed)
+    result["duration_s"] = round(elapsed, 3)
+    result["routes"] = {
+        route: summarize(values, rec.errors.get(route, 0), elapsed)
+        for route, values in sorted(rec.latencies.items())
+    }
+    return result
+
+def print_results(results: Dict[str, dict]) -> None:
+    print(f"{'scenario / route':<50}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        rows = [(name, result)] + [(f"  {route}", stats) for route, stats in result["routes"].items()]
+        for label, stats in rows:
+            latency = stats["latency_ms"]
+            print(f"{label:<50}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>10.1f}"
+                  f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}")
+
+## compare - flag scenarios whose throughput dropped or p95 rose by more than threshold percent
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    print()
+    print(f"{'scenario':<20}{'rps before':>12}{'rps now':>10}{'p95 before':>12}{'p95 now':>10}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        rps_old, rps_new = old["throughput_rps"], result["throughput_rps"]
+        p95_old, p95_new = old["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        print(f"{name:<20}{rps_old:>12.1f}{rps_new:>10.1f}{p95_old:>12.2f}{p95_new:>10.2f}")
+        if rps_old and (rps_old - rps_new) / rps_old * 100 > threshold:
+            regressions.append(f"{name}: throughput {rps_old:.1f} -> {rps_new:.1f} rps")
+        if p95_old and (p95_new - p95_old) / p95_old * 100 > threshold:
+            regressions.append(f"{name}: p95 {p95_old:.2f} -> {p95_new:.2f} ms")
+    return regressions
+
+async def open_client(args):
+    """Return (client, cleanup) for the chosen target"""
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+
+        async def cleanup():
+            await client.aclose()
+        return client, cleanup
+
+    from app.main import app
+    from app.repositories import use_repositories
+    from app.repositories.memory import MemoryRepositories
+    from app.repositories.mongo import MongoRepositories
+
+    mongo = None
+    if args.backend == "memory":
+        use_repositories(MemoryRepositories())
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo = AsyncIOMotorClient(args.mongodb_url)
+        use_repositories(await MongoRepositories.open(mongo[args.db]))
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    async def cleanup():
+        await client.aclose()
+        use_repositories(None)
+        if mongo is not None:
+            if not args.keep_db:
+                await mongo.drop_database(args.db)
+            mongo.close()
+    return client, cleanup
+
+async def main(args) -> int:
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+        return 2
+
+    client, cleanup = await open_client(args)
+    try:
+        ctx = Context(client, uuid.uuid4().hex[:8])
+        print(f"Seeding {args.books} books and {max(args.users, args.concurrency)} users ...")
+        await seed(ctx, args.books, max(args.users, args.concurrency))
+        results = {}
+        for name in names:
+            print(f"Running {name} for {args.duration}s with {args.concurrency} clients ...")
+            results[name] = await run_scenario(ctx, name, args.concurrency, args.duration, args.warmup)
+    finally:
+        await cleanup()
+
+    print()
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.base_url or f"in-process (ASGITransport, {args.backend})",
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "books": args.books,
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️  Regressions over {args.threshold}%:")
+            for line in regressions:
+                print(f"    {line}")
+            return 1
+        print(f"\n✅ No regressions over {args.threshold}%")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="warm-up seconds per scenario (not recorded)")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--books", type=int, default=500, help="books to seed")
+    parser.add_argument("--users", type=int, default=20, help="users to seed (at least --concurrency)")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--backend", choices=["mongo", "memory"], default="mongo", help="in-process mode only")
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017", help="in-process mode only")
+    parser.add_argument("--db", default="bench_library_db", help="in-process mode only")
+    parser.add_argument("--keep-db", action="store_true", help="keep the in-process database afterwards")
+    parser.add_argument("--output", default="bench_api_results.json", help="where to save the JSON results")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=20, help="regression threshold in percent")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,85 @@
+"""
+Benchmark for list response serialization
+Compares the per-item cost of the Pydantic path (build a response model per
+document, then validate and serialize again through response_model) with the
+fast path in app/serialization.py (project the raw document and encode it to
+JSON bytes directly). No database is needed.
+
+Usage: python -m benchmarks.bench_serialization [--items 5000] [--repeat 5]
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import List
+from bson import ObjectId
+from pydantic import TypeAdapter
+from app.schemas import BookResponse, TransactionResponse
+from app.serialization import json_list_response, orjson
+
+def make_books(n: int) -> List[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"Book {i}",
+            "author": f"Author {i % 100}",
+            "isbn": f"978-{i:010d}",
+            "quantity": i % 7,
+            "image_url": None,
+        }
+        for i in range(n)
+    ]
+
+def make_transactions(n: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": str(ObjectId()),
+            "book_id": str(ObjectId()),
+            "borrow_date": now,
+            "return_date": now if i % 2 else None,
+            "status": "Returned" if i % 2 else "Borrowed",
+        }
+        for i in range(n)
+    ]
+
+## pydantic_path - what the routers did before: one model per document,
+## then FastAPI validates the list against response_model and dumps it
+def pydantic_path(docs: List[dict], schema) -> bytes:
+    adapter = TypeAdapter(List[schema])
+    fields = [name for name in schema.model_fields if name != "id"]
+    models = [schema(id=str(doc["_id"]), **{name: doc.get(name) for name in fields}) for doc in docs]
+    validated = adapter.validate_python([m.model_dump() for m in models])
+    return adapter.dump_json(validated)
+
+def fast_path(docs: List[dict], schema) -> bytes:
+    return json_list_response(docs, schema).body
+
+def measure(fn, docs, schema, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs, schema)
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs) * 1_000_000  # microseconds per item
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Encoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"Items per run: {args.items}, best of {args.repeat}")
+    print()
+    print(f"{'schema':<22}{'pydantic us/item':>18}{'fast us/item':>16}{'speedup':>10}")
+    for schema, docs in [
+        (BookResponse, make_books(args.items)),
+        (TransactionResponse, make_transactions(args.items)),
+    ]:
+        slow = measure(pydantic_path, docs, schema, args.repeat)
+        fast = measure(fast_path, docs, schema, args.repeat)
+        print(f"{schema.__name__:<22}{slow:>18.2f}{fast:>16.2f}{slow / fast:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Script to check that the hot queries are backed by indexes
+Runs explain() on each known hot query and reports any collection scans or in-memory sorts
+Usage: python check_indexes.py
+"""
+import asyncio
+import os
+import sys
+from app.database import init_db, close_db
+
+async def check_indexes():
+    # MongoDB URL comes from MONGODB_URL (defaults to a local server; see init_db)
+    # Database name
+    database_name = os.getenv("MONGODB_DB_NAME", "Book_borrowing_and_return_system_Phayu")
+    
+    print("=" * 60)
+    print("Index Audit for Hot Queries")
+    print("=" * 60)
+    print(f"Database: {database_name}")
+    print("=" * 60)
+    print()
+    
+    # Connect to MongoDB (also creates the indexes declared on the models)
+    repos = await init_db("mongo")
+    
+    results = await repos.audit_indexes()
+    close_db()
+    
+    for result in results:
+        mark = "✅" if result["index_backed"] else "❌"
+        print(f"{mark} {result['name']} ({result['collection']})")
+        print(f"    Filter: {result['filter']}")
+        print(f"    Plan: {' <- '.join(result['stages'])}")
+    
+    missing = [r for r in results if not r["index_backed"]]
+    print()
+    if missing:
+        print(f"⚠️  {len(missing)} hot quer{'y is' if len(missing) == 1 else 'ies are'} not index-backed!")
+        return 1
+    print("✅ All hot queries are index-backed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(check_indexes()))
@@ -0,0 +1,70 @@
+"""
+Script to bulk-import books from a CSV or NDJSON file
+The file is read in chunks and written in batches, so large catalogs can be loaded quickly
+Usage: python import_books.py books.csv [--upsert] [--format csv|ndjson] [--batch-size 1000]
+
+CSV files need a header row with: title, author, isbn, quantity (image_url is optional)
+NDJSON files contain one JSON object per line with the same fields
+"""
+import argparse
+import asyncio
+import os
+import sys
+from app.database import init_db, close_db
+from app.importer import IMPORT_BATCH_SIZE, ImportFormatError, import_books
+
+CHUNK_SIZE = 64 * 1024
+
+async def read_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+async def main(args):
+    # MongoDB URL comes from MONGODB_URL (defaults to a local server; see init_db)
+    # Database name
+    database_name = os.getenv("MONGODB_DB_NAME", "Book_borrowing_and_return_system_Phayu")
+
+    # Detect format from the file extension unless given
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.path.lower().endswith(".csv") else "ndjson"
+
+    print("=" * 60)
+    print("Bulk Book Import")
+    print("=" * 60)
+    print(f"Database: {database_name}")
+    print(f"File: {args.path} ({fmt}, {'upsert' if args.upsert else 'insert'})")
+    print("=" * 60)
+    print()
+
+    # Connect to MongoDB (also creates the unique isbn index the import relies on)
+    await init_db("mongo")
+
+    try:
+        summary = await import_books(read_chunks(args.path), fmt, upsert=args.upsert, batch_size=args.batch_size)
+    except ImportFormatError as exc:
+        print(f"❌ {exc}")
+        return 1
+    finally:
+        close_db()
+
+    print(f"✅ Inserted: {summary.inserted}")
+    print(f"✅ Updated:  {summary.updated}")
+    print(f"{'⚠️ ' if summary.rejected else '✅'} Rejected: {summary.rejected}")
+    for error in summary.errors:
+        print(f"    line {error.line}: {error.detail}")
+    if summary.rejected > len(summary.errors):
+        print(f"    ... and {summary.rejected - len(summary.errors)} more")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import books from CSV or NDJSON")
+    parser.add_argument("path", help="CSV or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="file format (default: from extension)")
+    parser.add_argument("--upsert", action="store_true", help="update books whose ISBN already exists")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per bulk write")
+    sys.exit(asyncio.run(main(parser.parse_args())))
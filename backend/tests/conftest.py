@@ -1,56 +1,75 @@
 import pytest
 import pytest_asyncio
 import os
+
+# Cheap password hashing for tests (must be set before the app is imported)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 from httpx import AsyncClient, ASGITransport
-from urllib.parse import urlparse
 from app.main import app
-from app.database import init_db
-from app.models import Book, User, Transaction
-from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
+from app.repositories import use_repositories
+from app.repositories.memory import MemoryRepositories
+from app.repositories.mongo import MongoRepositories
+from app.cache import invalidate_stats, principal_cache
 
 # Use a separate database for testing
 # ถ้ารันใน Docker container ใช้ db:27017, ถ้ารันโดยตรงใช้ localhost:27017
 TEST_MONGODB_HOST = os.getenv("TEST_MONGODB_HOST", "localhost")
-TEST_MONGODB_URL = f"mongodb://{TEST_MONGODB_HOST}:27017/test_library_db"
+TEST_MONGODB_URL = f"mongodb://{TEST_MONGODB_HOST}:27017"
+TEST_DATABASE_NAME = "test_library_db"
+
+# Storage backend for tests:
+# - "memory" (default): MemoryRepositories, no MongoDB needed
+# - "mongomock": MongoRepositories on mongomock-motor (pip install -r requirements-dev.txt)
+# - "mongo": MongoRepositories on a real MongoDB at TEST_MONGODB_HOST (CI runs this too)
+# Tests marked requires_mongo only run on "mongo"; text_search tests are skipped on "mongomock"
+TEST_STORAGE_BACKEND = os.getenv("TEST_STORAGE_BACKEND", "memory").lower()
+
+def pytest_collection_modifyitems(config, items):
+    skips = []
+    if TEST_STORAGE_BACKEND != "mongo":
+        skips.append(("requires_mongo", "needs a real MongoDB (run with TEST_STORAGE_BACKEND=mongo)"))
+    if TEST_STORAGE_BACKEND == "mongomock":
+        skips.append(("text_search", "mongomock has no $text search"))
+    for marker, reason in skips:
+        for item in items:
+            if marker in item.keywords:
+                item.add_marker(pytest.mark.skip(reason=reason))
 
 @pytest_asyncio.fixture(scope="function")
-async def validation_client():
-    # Parse database name from URL
-    parsed_url = urlparse(TEST_MONGODB_URL)
-    database_name = parsed_url.path.lstrip('/') if parsed_url.path else "test_library_db"
-    
-    # Remove database name from URL for client connection
-    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    
-    # Initialize Beanie with Test DB
-    client = AsyncIOMotorClient(base_url)
-    database = client[database_name]
-    await init_beanie(database=database, document_models=[Book, User, Transaction])
-    
+async def repos():
+    # Fresh storage for every test, used by the app through repositories()
+    client = None
+    if TEST_STORAGE_BACKEND == "memory":
+        storage = MemoryRepositories()
+    elif TEST_STORAGE_BACKEND == "mongomock":
+        from mongomock_client import create_client
+        client = create_client()
+        storage = await MongoRepositories.open(client[TEST_DATABASE_NAME])
+    elif TEST_STORAGE_BACKEND == "mongo":
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(TEST_MONGODB_URL)
+        await client.drop_database(TEST_DATABASE_NAME)
+        storage = await MongoRepositories.open(client[TEST_DATABASE_NAME])
+    else:
+        raise ValueError(f"Unknown TEST_STORAGE_BACKEND {TEST_STORAGE_BACKEND!r}")
+    use_repositories(storage)
+    yield storage
+    use_repositories(None)
+    # Cleanup after tests
+    if client is not None:
+        await client.drop_database(TEST_DATABASE_NAME)
+        client.close()
+
+@pytest_asyncio.fixture(scope="function")
+async def validation_client(repos):
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
-    
-    # Cleanup after tests
-    await client.drop_database(database_name)
-    client.close()
 
 @pytest_asyncio.fixture(autouse=True, scope="function")
-async def clear_db(validation_client):
-    # Clear collections before each test to ensure isolation
-    # This fixture depends on validation_client to ensure Beanie is initialized
-    # และใช้ event loop เดียวกับ validation_client
-    try:
-        await Book.delete_all()
-        await User.delete_all()
-        await Transaction.delete_all()
-    except Exception:
-        pass  # Ignore errors if collections don't exist yet
+async def clear_db(repos):
+    # Every test gets fresh storage (the repos fixture) and empty caches
+    # In-process caches outlive the storage between tests
+    invalidate_stats()
+    principal_cache.clear()
     yield
-    # Cleanup after each test
-    try:
-        await Book.delete_all()
-        await User.delete_all()
-        await Transaction.delete_all()
-    except Exception:
-        pass
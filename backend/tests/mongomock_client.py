@@ -0,0 +1,31 @@
+"""
+## mongomock client - MongoDB ในหน่วยความจำสำหรับ tests ที่ TEST_STORAGE_BACKEND=mongomock
+
+ใช้รัน MongoRepositories (query, update และ aggregation ของ MongoDB) ได้โดยไม่ต้องมี MongoDB server
+ข้อจำกัด: ไม่มี $text search, sessions/transactions, command monitoring และ change streams
+(tests ที่ต้องใช้ใช้ marker text_search หรือ requires_mongo)
+
+ต้องติดตั้ง requirements-dev.txt (mongomock-motor) - application ไม่ได้ใช้ไฟล์นี้
+"""
+
+import inspect
+import mongomock.collection
+from mongomock_motor import AsyncMongoMockClient
+
+## _patch_bulk_sort - pymongo รุ่นใหม่ส่ง sort= ให้ UpdateOne ใน bulk_write
+## ซึ่ง mongomock ยังไม่รองรับ (ไม่มีผลกับการทำงาน เพราะ update หนึ่งรายการไม่ต้องเรียง)
+def _patch_bulk_sort() -> None:
+    builder = mongomock.collection.BulkOperationBuilder
+    if "sort" in inspect.signature(builder.add_update).parameters:
+        return
+    original = builder.add_update
+
+    def add_update(self, *args, sort=None, **kwargs):
+        return original(self, *args, **kwargs)
+
+    builder.add_update = add_update
+
+## create_client - client ใหม่ที่ว่างเปล่า (API เดียวกับ AsyncIOMotorClient)
+def create_client() -> AsyncMongoMockClient:
+    _patch_bulk_sort()
+    return AsyncMongoMockClient()
@@ -1,5 +1,24 @@
+import asyncio
+import csv
+import io
+import json
+from types import SimpleNamespace
 import pytest
 from httpx import AsyncClient
+from app.metrics import metrics
+from app.database import PoolMonitor, mongo_client_options
+from app.profiler import CommandProfiler, RequestProfile, current_profile
+from app import read_routing
+from app.catalog_cache import CatalogCache, catalog_cache
+from app.repositories import repositories, transaction_document
+from app.events import EventBroker, event_broker, sse_stream
+from app.singleflight import SingleFlight, singleflight_stats
+from app import jobs
+from app.archive import archive_returned
+from app.auth import PasswordHashPool, get_current_user
+from app.pagination import encode_cursor
+from app.cache import invalidate_stats, stats_cache, stats_generation, store_stats
+from app.cache import principal_cache, principal_generation, store_principal, invalidate_principal
 
 # Helper function to get admin token
 async def get_admin_token(client: AsyncClient):
@@ -222,3 +241,932 @@ async def test_isbn_uniqueness(validation_client: AsyncClient):
     response = await validation_client.post("/books/", json={"title": "b10", "author": "a10", "isbn": "000", "quantity": 1}, headers=headers)
     assert response.status_code == 400
     assert "already exists" in response.json()["detail"]
+
+# 11. Get Book List - Cursor pagination
+@pytest.mark.asyncio
+async def test_get_books_pagination(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(5):
+        await validation_client.post("/books/", json={"title": f"p{i}", "author": "a", "isbn": f"p-{i}", "quantity": 1}, headers=headers)
+
+    # First page
+    response = await validation_client.get("/books/", params={"limit": 2})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    # Walk remaining pages with the cursor
+    seen = [b["isbn"] for b in response.json()]
+    while cursor:
+        response = await validation_client.get("/books/", params={"limit": 2, "after": cursor})
+        assert response.status_code == 200
+        seen.extend(b["isbn"] for b in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    assert seen == [f"p-{i}" for i in range(5)]
+
+    # Invalid cursor
+    response = await validation_client.get("/books/", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+# 12. Admin Statistics - Cached and invalidated by mutations
+@pytest.mark.asyncio
+async def test_admin_stats(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    user_token = await get_user_token(validation_client, "u7", "e7@test.com", "pass123")
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+
+    book = await validation_client.post("/books/", json={"title": "s1", "author": "a", "isbn": "s-1", "quantity": 2}, headers=admin_headers)
+    book_id = book.json()["id"]
+    user_id = (await validation_client.get("/auth/me", headers=user_headers)).json()["id"]
+
+    response = await validation_client.get("/admin/stats", headers=admin_headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total_users"] == 2
+    assert stats["total_admins"] == 1
+    assert stats["total_books"] == 1
+    assert stats["total_transactions"] == 0
+
+    # Borrow + approve must invalidate the cached stats
+    borrow = await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=user_headers)
+    await validation_client.post(f"/admin/transactions/{borrow.json()['id']}/approve-borrow", headers=admin_headers)
+
+    stats = (await validation_client.get("/admin/stats", headers=admin_headers)).json()
+    assert stats["total_transactions"] == 1
+    assert stats["active_borrows"] == 1
+
+    # A recompute that started before an invalidation must not be cached
+    generation = stats_generation()
+    invalidate_stats()
+    assert store_stats({"total_users": -1}, generation) is False
+    assert stats_cache.get("stats") is None
+    assert (await validation_client.get("/admin/stats", headers=admin_headers)).json()["total_users"] == 2
+    assert stats_cache.get("stats")["total_users"] == 2
+
+# 13. Approve Borrow - Last copy cannot be approved twice
+@pytest.mark.asyncio
+async def test_approve_borrow_out_of_stock(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    book = await validation_client.post("/books/", json={"title": "c1", "author": "a", "isbn": "c-1", "quantity": 1}, headers=admin_headers)
+    book_id = book.json()["id"]
+
+    transaction_ids = []
+    for i in range(2):
+        token = await get_user_token(validation_client, f"cu{i}", f"cu{i}@test.com", "pass123")
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+        borrow = await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=headers)
+        transaction_ids.append(borrow.json()["id"])
+
+    first = await validation_client.post(f"/admin/transactions/{transaction_ids[0]}/approve-borrow", headers=admin_headers)
+    assert first.status_code == 200
+    assert first.json()["status"] == "Borrowed"
+
+    # Second approval fails and the transaction stays Pending
+    second = await validation_client.post(f"/admin/transactions/{transaction_ids[1]}/approve-borrow", headers=admin_headers)
+    assert second.status_code == 400
+    assert "out of stock" in second.json()["detail"].lower()
+    pending = await validation_client.get(f"/admin/transactions/{transaction_ids[1]}", headers=admin_headers)
+    assert pending.json()["status"] == "Pending"
+
+    # Approving an already approved transaction is rejected
+    again = await validation_client.post(f"/admin/transactions/{transaction_ids[0]}/approve-borrow", headers=admin_headers)
+    assert again.status_code == 400
+
+    book_check = await validation_client.get(f"/books/{book_id}")
+    assert book_check.json()["quantity"] == 0
+
+    # A malformed book_id is rejected before anything is written
+    broken = await repositories().transactions.insert(transaction_document(first.json()["user_id"], "not-an-id"))
+    response = await validation_client.post(f"/admin/transactions/{broken['_id']}/approve-borrow", headers=admin_headers)
+    assert response.status_code == 404
+    assert (await repositories().transactions.get(broken["_id"]))["status"] == "Pending"
+
+    # Return + approve return puts the copy back
+    borrowed = first.json()
+    await validation_client.post("/transactions/return", json={"user_id": borrowed["user_id"], "book_id": book_id}, headers=admin_headers)
+    returned = await validation_client.post(f"/admin/transactions/{transaction_ids[0]}/approve-return", headers=admin_headers)
+    assert returned.status_code == 200
+    assert returned.json()["status"] == "Returned"
+    assert returned.json()["return_date"] is not None
+    book_check = await validation_client.get(f"/books/{book_id}")
+    assert book_check.json()["quantity"] == 1
+
+# 14. Bulk Approve - Per-item outcomes including out-of-stock rejections
+@pytest.mark.asyncio
+async def test_bulk_approve(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    book = await validation_client.post("/books/", json={"title": "k1", "author": "a", "isbn": "k-1", "quantity": 2}, headers=admin_headers)
+    book_id = book.json()["id"]
+
+    transaction_ids = []
+    for i in range(3):
+        token = await get_user_token(validation_client, f"bu{i}", f"bu{i}@test.com", "pass123")
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+        borrow = await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=headers)
+        transaction_ids.append(borrow.json()["id"])
+
+    # Approve all pending borrows for the book: only 2 copies are available
+    response = await validation_client.post("/admin/transactions/bulk-approve", json={"action": "borrow", "book_id": book_id}, headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["approved"] == 2
+    assert data["rejected"] == 1
+    assert [item["transaction_id"] for item in data["results"]] == transaction_ids
+    assert data["results"][2]["detail"] == "Book out of stock"
+    assert (await validation_client.get(f"/books/{book_id}")).json()["quantity"] == 0
+
+    # Return both borrowed copies and approve the returns by ID
+    for item in data["results"][:2]:
+        t = (await validation_client.get(f"/admin/transactions/{item['transaction_id']}", headers=admin_headers)).json()
+        await validation_client.post("/transactions/return", json={"user_id": t["user_id"], "book_id": book_id}, headers=admin_headers)
+    response = await validation_client.post("/admin/transactions/bulk-approve", json={"action": "return", "transaction_ids": transaction_ids[:2] + ["bad-id"]}, headers=admin_headers)
+    data = response.json()
+    assert data["approved"] == 2
+    assert data["results"][2]["detail"] == "Invalid transaction ID"
+    assert (await validation_client.get(f"/books/{book_id}")).json()["quantity"] == 2
+
+    # A malformed book_id rejects only its own item; the rest of the batch is approved
+    broken = await repositories().transactions.insert(transaction_document("u", "not-an-id"))
+    token = await get_user_token(validation_client, "bu3", "bu3@test.com", "pass123")
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+    borrow = await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=headers)
+    response = await validation_client.post("/admin/transactions/bulk-approve", json={"action": "borrow", "transaction_ids": [str(broken["_id"]), borrow.json()["id"]]}, headers=admin_headers)
+    data = response.json()
+    assert response.status_code == 200
+    assert data["results"][0] == {"transaction_id": str(broken["_id"]), "approved": False, "detail": "Book not found"}
+    assert data["results"][1]["approved"] is True
+
+    # Concurrent bulk approvals of the same requests approve each one once and take one copy each
+    pending = [transaction_ids[2]]
+    for i in range(4, 6):
+        token = await get_user_token(validation_client, f"bu{i}", f"bu{i}@test.com", "pass123")
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+        borrow = await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=headers)
+        pending.append(borrow.json()["id"])
+    responses = await asyncio.gather(*[
+        validation_client.post("/admin/transactions/bulk-approve", json={"action": "borrow", "transaction_ids": pending}, headers=admin_headers)
+        for _ in range(2)
+    ])
+    assert sum(r.json()["approved"] for r in responses) == 1  # only one copy was left
+    assert (await validation_client.get(f"/books/{book_id}")).json()["quantity"] == 0
+    assert await repositories().transactions.count(status="Borrowed") == 2
+
+# 15. Password Hashing Pool - Logins run on the pool and report stats
+@pytest.mark.asyncio
+async def test_password_hashing_stats(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await validation_client.get("/admin/system/password-hashing", headers=headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["completed"] >= 2  # register + login
+    assert stats["queued"] == 0
+    assert stats["workers"] >= 1
+
+# 16. Principal Cache - Role changes and deletion take effect immediately
+@pytest.mark.asyncio
+async def test_principal_cache_eviction(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    user_token = await get_user_token(validation_client, "pc1", "pc1@test.com", "pass123")
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    user_id = (await validation_client.get("/auth/me", headers=user_headers)).json()["id"]
+
+    # Cached as a regular user
+    assert (await validation_client.get("/admin/stats", headers=user_headers)).status_code == 403
+
+    # Each request gets its own instance: mutating one does not leak into the cache
+    current = await get_current_user(user_token)
+    current.role = "admin"
+    assert (await get_current_user(user_token)).role == "user"
+    assert (await validation_client.get("/admin/stats", headers=user_headers)).status_code == 403
+
+    # Promote: the same token now has admin access
+    await validation_client.put(f"/admin/users/{user_id}/role", params={"new_role": "admin"}, headers=admin_headers)
+    assert (await validation_client.get("/admin/stats", headers=user_headers)).status_code == 200
+
+    # Delete: the token stops working
+    await validation_client.delete(f"/admin/users/{user_id}", headers=admin_headers)
+    assert (await validation_client.get("/auth/me", headers=user_headers)).status_code == 401
+
+# 17. Search Books - Exact ISBN fast path
+@pytest.mark.asyncio
+async def test_search_books_by_isbn(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    await validation_client.post("/books/", json={"title": "Dune", "author": "Frank Herbert", "isbn": "978-0441013593", "quantity": 1}, headers=headers)
+
+    response = await validation_client.get("/books/search", params={"q": "978-0441013593"})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["title"] == "Dune"
+
+    # Search cursors seek by relevance score; a cursor without a numeric score is rejected
+    response = await validation_client.get("/books/search", params={"q": "dune", "after": encode_cursor("0" * 24, "dune")})
+    assert response.status_code == 400
+
+# 18. Search Books - Relevance-ranked text search with pagination
+@pytest.mark.text_search
+@pytest.mark.asyncio
+async def test_search_books_text(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    await validation_client.post("/books/", json={"title": "Python Tricks", "author": "Dan Bader", "isbn": "t-1", "quantity": 1}, headers=headers)
+    await validation_client.post("/books/", json={"title": "Fluent Python", "author": "Luciano Ramalho", "isbn": "t-2", "quantity": 1}, headers=headers)
+    await validation_client.post("/books/", json={"title": "Snakes of the World", "author": "Python Society", "isbn": "t-3", "quantity": 1}, headers=headers)
+    await validation_client.post("/books/", json={"title": "Dune", "author": "Frank Herbert", "isbn": "t-4", "quantity": 1}, headers=headers)
+
+    response = await validation_client.get("/books/search", params={"q": "python", "limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    # Title matches outrank author-only matches
+    assert all("Python" in book["title"] for book in first_page)
+
+    response = await validation_client.get("/books/search", params={"q": "python", "limit": 2, "after": response.headers["X-Next-Cursor"]})
+    second_page = response.json()
+    assert [book["isbn"] for book in second_page] == ["t-3"]
+    assert "X-Next-Cursor" not in response.headers
+
+# 19. Conditional GET - ETag / If-None-Match on catalog endpoints
+@pytest.mark.asyncio
+async def test_catalog_etag(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = await validation_client.post("/books/", json={"title": "e1", "author": "a", "isbn": "e-1", "quantity": 1}, headers=headers)
+    book_id = book.json()["id"]
+
+    for url in ["/books/", f"/books/{book_id}"]:
+        response = await validation_client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert "must-revalidate" in response.headers["Cache-Control"]
+
+        # Unchanged catalog answers 304 without a body
+        response = await validation_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    # Any catalog change produces a new ETag
+    await validation_client.put(f"/books/{book_id}", json={"quantity": 3}, headers=headers)
+    response = await validation_client.get(f"/books/{book_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 3
+
+# 20. Fast Serialization - List endpoints match the response schemas
+@pytest.mark.asyncio
+async def test_fast_serialization_matches_schema(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    book = await validation_client.post("/books/", json={"title": "f1", "author": "a", "isbn": "f-1", "quantity": 1}, headers=admin_headers)
+    book_id = book.json()["id"]
+    admin_id = (await validation_client.get("/auth/me", headers=admin_headers)).json()["id"]
+    borrow = await validation_client.post("/transactions/borrow", json={"user_id": admin_id, "book_id": book_id}, headers=admin_headers)
+
+    # List items are identical to the single-item (Pydantic) responses
+    books = (await validation_client.get("/books/")).json()
+    assert books == [(await validation_client.get(f"/books/{book_id}")).json()]
+
+    transactions = (await validation_client.get("/admin/transactions", headers=admin_headers)).json()
+    single = (await validation_client.get(f"/admin/transactions/{borrow.json()['id']}", headers=admin_headers)).json()
+    assert transactions == [single]
+
+    users = (await validation_client.get("/admin/users", headers=admin_headers)).json()
+    assert users == [(await validation_client.get(f"/admin/users/{admin_id}", headers=admin_headers)).json()]
+    assert "password" not in users[0]
+
+# 21. Expanded Transactions - Book and user details joined in one request
+@pytest.mark.asyncio
+async def test_expanded_transactions(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    book = await validation_client.post("/books/", json={"title": "x1", "author": "Ann", "isbn": "x-1", "quantity": 2}, headers=admin_headers)
+    book_id = book.json()["id"]
+    user_token = await get_user_token(validation_client)
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    user_id = (await validation_client.get("/auth/me", headers=user_headers)).json()["id"]
+    await validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=user_headers)
+
+    response = await validation_client.get("/admin/transactions", params={"expand": "true"}, headers=admin_headers)
+    assert response.status_code == 200
+    item = response.json()[0]
+    assert (item["book_title"], item["book_author"], item["username"]) == ("x1", "Ann", "testuser")
+
+    history = (await validation_client.get(f"/transactions/user/{user_id}", params={"expand": "true"}, headers=user_headers)).json()
+    assert history == [item]
+
+    # Deleted books leave the details empty instead of failing
+    await validation_client.delete(f"/books/{book_id}", headers=admin_headers)
+    item = (await validation_client.get("/admin/transactions", params={"expand": "true"}, headers=admin_headers)).json()[0]
+    assert item["book_title"] is None and item["username"] == "testuser"
+
+    # Without expand the shape is unchanged
+    plain = (await validation_client.get("/admin/transactions", headers=admin_headers)).json()[0]
+    assert "book_title" not in plain
+
+# 22. Batch Fetch - Books and users by ID list, in request order
+@pytest.mark.asyncio
+async def test_batch_fetch(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = []
+    for i in range(3):
+        book = await validation_client.post("/books/", json={"title": f"b{i}", "author": "a", "isbn": f"b-{i}", "quantity": 1}, headers=headers)
+        ids.append(book.json()["id"])
+    unknown = "000000000000000000000000"
+
+    requested = [ids[2], unknown, ids[0], "not-an-id", ids[2]]
+    response = await validation_client.get("/books/batch", params={"ids": ",".join(requested)})
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["id"] for book in data["items"]] == [ids[2], ids[0]]
+    assert data["items"][0] == (await validation_client.get(f"/books/{ids[2]}")).json()
+    assert data["missing"] == [unknown, "not-an-id"]
+
+    response = await validation_client.get("/books/batch", params={"ids": ",".join(str(i) for i in range(501))})
+    assert response.status_code == 400
+
+    # Users batch requires login
+    admin_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+    response = await validation_client.get("/users/batch", params={"ids": f"{unknown},{admin_id}"})
+    assert response.status_code == 401
+    response = await validation_client.get("/users/batch", params={"ids": f"{unknown},{admin_id}"}, headers=headers)
+    assert [user["username"] for user in response.json()["items"]] == ["admin"]
+    assert response.json()["missing"] == [unknown]
+
+# 23. Bulk Import - CSV insert and NDJSON upsert with per-line rejections
+@pytest.mark.asyncio
+async def test_import_books(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    await validation_client.post("/books/", json={"title": "Old", "author": "a", "isbn": "i-1", "quantity": 1, "image_url": "http://old"}, headers=headers)
+
+    csv_body = (
+        "title,author,isbn,quantity,image_url\n"
+        "Old again,a,i-1,5,\n"
+        "\"Multi\nline, title\",b,i-2,2,http://img\n"
+        "Bad quantity,c,i-3,many,\n"
+        "Short row,d\n"
+        "New,e,i-4,1,\n"
+    )
+    response = await validation_client.post("/books/import", content=csv_body, headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200
+    summary = response.json()
+    assert (summary["inserted"], summary["updated"], summary["rejected"]) == (2, 0, 3)
+    assert [error["line"] for error in summary["errors"]] == [5, 6, 2]
+    books = {book["isbn"]: book for book in (await validation_client.get("/books/")).json()}
+    assert books["i-2"]["title"] == "Multi\nline, title"
+    assert books["i-1"]["title"] == "Old"
+
+    ndjson_body = '{"title": "Updated", "author": "a", "isbn": "i-1", "quantity": 7}\n[1]\n{"title": "x", "author": "y", "isbn": "i-5", "quantity": 1}\n'
+    response = await validation_client.post("/books/import", params={"format": "ndjson", "mode": "upsert"}, content=ndjson_body, headers=headers)
+    summary = response.json()
+    assert (summary["inserted"], summary["updated"], summary["rejected"]) == (1, 1, 1)
+    books = {book["isbn"]: book for book in (await validation_client.get("/books/")).json()}
+    assert (books["i-1"]["title"], books["i-1"]["quantity"]) == ("Updated", 7)
+    # Upsert only overwrites the fields present in the row
+    assert books["i-1"]["image_url"] == "http://old"
+    assert books["i-5"]["image_url"] is None
+
+    # Missing required columns fails before anything is written
+    response = await validation_client.post("/books/import", content="title,isbn\nx,y\n", headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 400
+    response = await validation_client.post("/books/import", content="x", headers=headers)
+    assert response.status_code == 415
+
+# 24. Streaming Export - NDJSON / CSV with status and date filters
+@pytest.mark.asyncio
+async def test_export(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    admin_id = (await validation_client.get("/auth/me", headers=headers)).json()["id"]
+    book_ids = []
+    for i in range(3):
+        book = await validation_client.post("/books/", json={"title": f"Book, {i}", "author": "a", "isbn": f"ex-{i}", "quantity": 1}, headers=headers)
+        book_ids.append(book.json()["id"])
+    for book_id in book_ids:
+        await validation_client.post("/transactions/borrow", json={"user_id": admin_id, "book_id": book_id}, headers=headers)
+    await validation_client.post("/admin/transactions/bulk-approve", json={"action": "borrow", "book_id": book_ids[0]}, headers=headers)
+
+    response = await validation_client.get("/admin/export/transactions", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == (await validation_client.get("/admin/transactions", headers=headers)).json()
+
+    response = await validation_client.get("/admin/export/transactions", params={"status": "Borrowed"}, headers=headers)
+    assert [json.loads(line)["book_id"] for line in response.text.splitlines()] == [book_ids[0]]
+    response = await validation_client.get("/admin/export/transactions", params={"end": "2000-01-01T00:00:00"}, headers=headers)
+    assert response.text == ""
+
+    response = await validation_client.get("/admin/export/books", params={"format": "csv"}, headers=headers)
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["title", "author", "isbn", "quantity", "image_url", "id"]
+    assert [row[0] for row in rows[1:]] == ["Book, 0", "Book, 1", "Book, 2"]
+
+    response = await validation_client.get("/admin/export/users", params={"format": "csv", "start": "2100-01-01T00:00:00"}, headers=headers)
+    assert response.text.strip() == "username,email,id,role,created_at"
+
+# 25. Metrics - Per-route-template counts and latency in Prometheus format
+@pytest.mark.asyncio
+async def test_metrics(validation_client: AsyncClient):
+    metrics.reset()
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = await validation_client.post("/books/", json={"title": "m", "author": "a", "isbn": "m-1", "quantity": 1}, headers=headers)
+    await validation_client.get(f"/books/{book.json()['id']}")
+    await validation_client.get("/books/000000000000000000000000")
+    await validation_client.get("/no/such/path")
+
+    response = await validation_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    # IDs are collapsed into the route template
+    assert 'http_requests_total{method="GET",route="/books/{id}",status="200"} 1' in body
+    assert 'http_requests_total{method="GET",route="/books/{id}",status="404"} 1' in body
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/books/{id}"} 2' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/books/{id}",le="+Inf"} 2' in body
+    # The scrape itself is in flight while rendering
+    assert "http_requests_in_flight 1" in body
+
+# 26. DB Profiler - Database time and call count on every response
+@pytest.mark.requires_mongo
+@pytest.mark.asyncio
+async def test_db_profiler_headers(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = await validation_client.post("/books/", json={"title": "p", "author": "a", "isbn": "p-1", "quantity": 1}, headers=headers)
+
+    response = await validation_client.get(f"/books/{book.json()['id']}")
+    # Catalog version + book lookup
+    assert int(response.headers["X-DB-Calls"]) >= 2
+    assert float(response.headers["X-DB-Time"]) > 0
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+# 27. Slow Query Log - Filter shape and route, without the values
+def test_slow_query_log(caplog):
+    profiler = CommandProfiler(slow_query_ms=5)
+    profile = RequestProfile({"method": "GET", "path": "/books/abc", "route": object(), "path_params": {"id": "abc"}})
+    command = {"find": "books", "filter": {"isbn": "secret-isbn", "quantity": {"$gt": 0}}}
+    token = current_profile.set(profile)
+    try:
+        for request_id, micros in [(1, 1000), (2, 20000)]:
+            profiler.started(SimpleNamespace(command_name="find", command=command, connection_id=("h", 1), request_id=request_id))
+            with caplog.at_level("WARNING", logger="app.profiler"):
+                profiler.succeeded(SimpleNamespace(command_name="find", connection_id=("h", 1), request_id=request_id, duration_micros=micros))
+    finally:
+        current_profile.reset(token)
+
+    assert (profile.calls, profile.total_ms) == (2, 21.0)
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert "find on books took 20.0ms" in message
+    assert "{'isbn': '?', 'quantity': {'$gt': '?'}}" in message
+    assert "route=GET /books/{id}" in message
+    assert "secret-isbn" not in message
+
+# 28. MongoDB Client Settings - Pool, timeouts and concerns from the environment
+def test_mongo_client_options(monkeypatch):
+    monkeypatch.setenv("MONGODB_MAX_POOL_SIZE", "40")
+    monkeypatch.setenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "2000")
+    monkeypatch.setenv("MONGODB_COMPRESSORS", "zstd,snappy")
+    monkeypatch.setenv("MONGODB_WRITE_CONCERN", "majority")
+    monkeypatch.setenv("MONGODB_READ_CONCERN", "")
+    assert mongo_client_options() == {
+        "maxPoolSize": 40,
+        "serverSelectionTimeoutMS": 2000,
+        "compressors": "zstd,snappy",
+        "w": "majority",
+    }
+    monkeypatch.setenv("MONGODB_WRITE_CONCERN", "1")
+    assert mongo_client_options()["w"] == 1
+
+# 29. Connection Pool Stats - In-use, peak and checkout wait per server
+@pytest.mark.asyncio
+async def test_db_pool_stats(validation_client: AsyncClient):
+    monitor = PoolMonitor()
+    address = ("db", 27017)
+    monitor.pool_created(SimpleNamespace(address=address))
+    for _ in range(2):
+        monitor.connection_created(SimpleNamespace(address=address))
+        monitor.connection_checked_out(SimpleNamespace(address=address, duration=0.004))
+    monitor.connection_checked_in(SimpleNamespace(address=address))
+    assert monitor.stats() == [{
+        "address": "db:27017", "open": 2, "in_use": 1, "peak_in_use": 2, "checkouts": 2,
+        "checkout_failures": 0, "avg_wait_ms": 4.0, "max_wait_ms": 4.0,
+    }]
+
+    admin_token = await get_admin_token(validation_client)
+    response = await validation_client.get("/admin/system/db-pool", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert {"backend", "max_pool_size", "servers"} <= set(response.json())
+
+# 30. Read Routing - Catalog and reporting reads go to the configured replica
+@pytest.mark.asyncio
+async def test_read_routing(validation_client: AsyncClient, monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.read_preferences import Secondary
+
+    assert read_routing.read_preference("primary") is None
+    preference = read_routing.read_preference("secondaryPreferred", max_staleness=120)
+    assert (preference.mongos_mode, preference.max_staleness) == ("secondaryPreferred", 120)
+    with pytest.raises(ValueError):
+        read_routing.read_preference("fastest")
+
+    # ที่เก็บข้อมูลของ test ไม่มี replica - endpoint ต้องทำงานเหมือนเดิม
+    response = await validation_client.get("/books/")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+
+    monkeypatch.setattr(read_routing, "CATALOG_READ_PREFERENCE", Secondary(max_staleness=90))
+    motor_books = AsyncIOMotorClient("mongodb://db:27017", connect=False)["library"]["books"]
+    assert read_routing.catalog_reads(motor_books).read_preference.mongos_mode == "secondary"
+    assert read_routing.reporting_reads(motor_books) is motor_books  # reporting ยังเป็น primary
+
+# 31. Catalog Cache - Change events keep the in-memory catalog and ETag current
+@pytest.mark.asyncio
+async def test_catalog_cache(validation_client: AsyncClient):
+    from bson import ObjectId
+
+    cache = CatalogCache(max_lag=5)
+    a, b, c = ObjectId(), ObjectId(), ObjectId()
+    doc = lambda oid, title, isbn, quantity=1: {"_id": oid, "title": title, "author": "x", "isbn": isbn, "quantity": quantity}
+    cache.load([doc(b, "Beta", "i-b"), doc(a, "Alpha", "i-a")], version=3)
+    assert cache.ready and cache.version == 3
+
+    cache.apply({"operationType": "insert", "ns": {"coll": "books"}, "documentKey": {"_id": c}, "fullDocument": doc(c, "Aardvark", "i-c")})
+    cache.apply({"operationType": "update", "ns": {"coll": "books"}, "documentKey": {"_id": a}, "fullDocument": doc(a, "Zeta", "i-a", quantity=0)})
+    cache.apply({"operationType": "delete", "ns": {"coll": "books"}, "documentKey": {"_id": b}})
+    cache.apply({"operationType": "update", "ns": {"coll": "catalog_meta"}, "documentKey": {"_id": "catalog"}, "fullDocument": {"_id": "catalog", "version": 6}})
+    assert cache.version == 6
+    assert [book["title"] for book in cache.page(None, "title", 10)] == ["Aardvark", "Zeta"]
+    assert [book["_id"] for book in cache.page(None, None, 10)] == [a, c]
+    assert cache.get(str(b)) is None and cache.by_isbn("i-a")["quantity"] == 0
+    assert cache.apply({"operationType": "drop", "ns": {"coll": "books"}}) is False
+    assert not cache.ready  # ต้องโหลดใหม่ - router กลับไปอ่านจาก MongoDB
+
+    # โหลดแคชกลางจากฐานข้อมูลของ test แล้วตรวจว่า endpoint ตอบจากแคช
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = (await validation_client.post("/books/", json={"title": "Cached", "author": "a", "isbn": "cc-1", "quantity": 1}, headers=headers)).json()
+    docs = [doc async for doc in repositories().books.stream()]
+    catalog_cache.load(docs, version=42)
+    try:
+        response = await validation_client.get("/books/")
+        assert response.headers["ETag"].startswith('W/"42-')
+        assert [item["id"] for item in response.json()] == [book["id"]]
+        batch = await validation_client.get("/books/batch", params={"ids": f"{book['id']},{ObjectId()}"})
+        assert [item["isbn"] for item in batch.json()["items"]] == ["cc-1"]
+        assert (await validation_client.get(f"/books/{book['id']}")).json()["title"] == "Cached"
+        stats = await validation_client.get("/admin/system/catalog-cache", headers=headers)
+        assert stats.json()["ready"] is True and stats.json()["books"] == 1
+    finally:
+        await catalog_cache.stop()
+
+# 32. Catalog Cache Change Stream - Writes appear in the cache (replica set only)
+@pytest.mark.requires_mongo
+@pytest.mark.asyncio
+async def test_catalog_cache_change_stream(validation_client: AsyncClient):
+    import asyncio
+
+    cache = CatalogCache(max_lag=5)
+    await repositories().start_catalog_cache(cache)
+    if not cache.ready:
+        pytest.skip("MongoDB is not a replica set")
+    try:
+        admin_token = await get_admin_token(validation_client)
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        book = (await validation_client.post("/books/", json={"title": "Live", "author": "a", "isbn": "cs-1", "quantity": 1}, headers=headers)).json()
+        for _ in range(50):
+            if cache.get(book["id"]) is not None:
+                break
+            await asyncio.sleep(0.1)
+        assert cache.get(book["id"])["title"] == "Live"
+    finally:
+        await cache.stop()
+
+# 33. Admin Events - Transaction changes pushed to subscribers, with replay and backpressure
+@pytest.mark.asyncio
+async def test_admin_events(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = (await validation_client.post("/books/", json={"title": "e", "author": "a", "isbn": "ev-1", "quantity": 1}, headers=headers)).json()
+    user_token = await get_user_token(validation_client)
+    me = (await validation_client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"})).json()
+
+    subscriber = event_broker.subscribe()
+    try:
+        borrow = await validation_client.post("/transactions/borrow", json={"user_id": me["id"], "book_id": book["id"]}, headers={"Authorization": f"Bearer {user_token}"})
+        await validation_client.post(f"/admin/transactions/{borrow.json()['id']}/approve-borrow", headers=headers)
+        events = [subscriber.queue.get_nowait() for _ in range(2)]
+        assert [(e["event"], e["data"]["previous_status"], e["data"]["status"]) for e in events] == [
+            ("transaction", None, "Pending"), ("transaction", "Pending", "Borrowed"),
+        ]
+        assert events[0]["data"]["transaction_id"] == borrow.json()["id"]
+    finally:
+        event_broker.unsubscribe(subscriber)
+
+    # ผู้ใช้ทั่วไปเปิด stream ไม่ได้
+    response = await validation_client.get("/admin/events", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+    broker = EventBroker(queue_size=2, replay_size=3)
+    slow = broker.subscribe()
+    for i in range(4):
+        broker.publish("transaction", {"n": i})
+    # คิวเต็ม - event เก่าถูกแทนด้วย resync แล้วต่อด้วย event ใหม่
+    assert [slow.queue.get_nowait()["event"] for _ in range(slow.queue.qsize())] == ["resync", "transaction"]
+    assert [e["data"]["n"] for e in broker.subscribe(last_event_id=2).queue._queue] == [2, 3]
+    assert broker.subscribe(last_event_id=0).queue.get_nowait()["event"] == "resync"
+
+    stream = sse_stream(broker, last_event_id=4, heartbeat=0.01)
+    assert await stream.__anext__() == b"retry: 3000\n\n"
+    broker.publish("transaction", {"n": 4})
+    assert await stream.__anext__() == b'id: 5\nevent: transaction\ndata: {"n":4}\n\n'
+    assert await stream.__anext__() == b": ping\n\n"
+    subscribers = broker.stats()["subscribers"]
+    await stream.aclose()
+    assert broker.stats()["subscribers"] == subscribers - 1
+
+# 34. Single-flight - Concurrent identical reads share one database call
+@pytest.mark.asyncio
+async def test_single_flight(validation_client: AsyncClient):
+    import asyncio
+
+    group = SingleFlight("test")
+    release = asyncio.Event()
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await release.wait()
+        return {"title": "shared"}
+
+    waiters = [asyncio.ensure_future(group.do("k", lookup)) for _ in range(10)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()  # ผู้เรียกคนแรกยกเลิก - คนอื่นยังได้ผล
+    release.set()
+    results = await asyncio.gather(*waiters[1:])
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+    assert group.stats() == {"executed": 1, "coalesced": 9, "in_flight": 0}
+
+    async def failing():
+        raise ValueError("boom")
+    outcomes = await asyncio.gather(group.do("e", failing), group.do("e", failing), return_exceptions=True)
+    assert all(isinstance(o, ValueError) for o in outcomes)
+    assert group.stats()["executed"] == 2  # key ถูกลบหลังจบ - ครั้งถัดไปเรียกใหม่
+
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    book = (await validation_client.post("/books/", json={"title": "sf", "author": "a", "isbn": "sf-1", "quantity": 1}, headers=headers)).json()
+    before = singleflight_stats().get("book", {"executed": 0, "coalesced": 0})
+    responses = await asyncio.gather(*[validation_client.get(f"/books/{book['id']}") for _ in range(20)])
+    assert {r.json()["title"] for r in responses} == {"sf"}
+    after = (await validation_client.get("/admin/system/singleflight", headers=headers)).json()["book"]
+    assert after["executed"] + after["coalesced"] - before["executed"] - before["coalesced"] == 20
+    assert 'singleflight_calls_total{group="book",result="coalesced"}' in (await validation_client.get("/metrics")).text
+
+# 35. Background Jobs - Enqueue returns 202, progress and results are persisted
+@pytest.mark.asyncio
+async def test_background_jobs(validation_client: AsyncClient, monkeypatch, tmp_path):
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    async def finished(job_id):
+        await jobs.job_runner.join()
+        return (await validation_client.get(f"/admin/jobs/{job_id}", headers=headers)).json()
+
+    body = "title,author,isbn,quantity\nJob One,A,job-1,2\nJob Two,B,job-2,-1\n"
+    response = await validation_client.post("/admin/jobs/import-books", content=body,
+                                            headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 202 and response.json()["status"] == "queued"
+    job = await finished(response.json()["id"])
+    assert job["status"] == "succeeded" and job["result"]["inserted"] == 2
+    assert job["done"] == job["total"] == len(body)
+    assert list(tmp_path.iterdir()) == []  # ไฟล์ที่อัปโหลดถูกลบเมื่อ import เสร็จ
+
+    response = await validation_client.post("/admin/jobs/export/books?format=csv", headers=headers)
+    job = await finished(response.json()["id"])
+    assert job["status"] == "succeeded" and job["done"] == job["total"] == 2
+    download = await validation_client.get(f"/admin/jobs/{job['id']}/download", headers=headers)
+    rows = list(csv.DictReader(io.StringIO(download.text)))
+    assert sorted(row["isbn"] for row in rows) == ["job-1", "job-2"]
+
+    response = await validation_client.post("/admin/jobs/recount-inventory", headers=headers)
+    job = await finished(response.json()["id"])
+    negative = next(row["id"] for row in rows if row["isbn"] == "job-2")
+    assert job["result"]["copies_available"] == 2 and job["result"]["negative_stock"] == [negative]
+
+    # ผู้ใช้ที่ยังยืมหนังสืออยู่ลบไม่ได้ ส่วนคำขอที่รออนุมัติถูกยกเลิก
+    await get_user_token(validation_client)
+    user = (await validation_client.get("/admin/users", headers=headers)).json()[-1]
+    borrowed = await repositories().transactions.insert(transaction_document(user["id"], negative, "Borrowed"))
+    pending = await repositories().transactions.insert(transaction_document(user["id"], negative))
+    subscriber = event_broker.subscribe()
+    try:
+        response = await validation_client.post(f"/admin/jobs/delete-user/{user['id']}", headers=headers)
+        job = await finished(response.json()["id"])
+        assert job["status"] == "failed" and "on loan" in job["error"]
+        # คำขอที่ถูก claim ระหว่างงานได้สถานะ Pending คืน และ Admin เห็นทั้งการยกเลิกและการคืนสถานะ
+        assert (await repositories().transactions.get(pending["_id"]))["status"] == "Pending"
+        await repositories().transactions.transition(borrowed["_id"], "Borrowed", {"status": "Pending"})
+        response = await validation_client.post(f"/admin/jobs/delete-user/{user['id']}", headers=headers)
+        job = await finished(response.json()["id"])
+        assert job["status"] == "succeeded" and job["result"]["pending_cancelled"] == 2
+        changes = [subscriber.queue.get_nowait()["data"] for _ in range(subscriber.queue.qsize())]
+    finally:
+        event_broker.unsubscribe(subscriber)
+    assert [(e["status"], e["previous_status"]) for e in changes if e["transaction_id"] == str(pending["_id"])] == [
+        ("Cancelled", "Pending"), ("Pending", "Cancelled"), ("Cancelled", "Pending"),
+    ]
+    assert await repositories().transactions.count(user_id=user["id"]) == 0
+    assert (await validation_client.get(f"/admin/users/{user['id']}", headers=headers)).status_code == 404
+
+    me = (await validation_client.get("/auth/me", headers=headers)).json()
+    assert (await validation_client.post(f"/admin/jobs/delete-user/{me['id']}", headers=headers)).status_code == 400
+    listed = (await validation_client.get("/admin/jobs/?kind=delete_user", headers=headers)).json()
+    assert sorted(job["status"] for job in listed) == ["failed", "succeeded"]
+    assert (await validation_client.get("/admin/system/jobs", headers=headers)).json()["running"] == 0
+
+    with pytest.raises(HTTPException) as exc:
+        await jobs.JobRunner(max_queued=0).enqueue("recount_inventory", {}, "admin")
+    assert exc.value.status_code == 503
+
+# 36. Transaction Archive - Old returned transactions move to buckets, reads span both tiers
+@pytest.mark.asyncio
+async def test_transaction_archive(validation_client: AsyncClient):
+    from datetime import datetime, timedelta
+
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    user_token = await get_user_token(validation_client)
+    user_id = (await validation_client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"})).json()["id"]
+    now = datetime.utcnow()
+    transactions = repositories().transactions
+    old = [
+        await transactions.insert(transaction_document(user_id, f"b{i}", "Returned",
+                                  borrow_date=now - timedelta(days=400 + i), return_date=now - timedelta(days=390 + i)))
+        for i in range(3)
+    ]
+    await transactions.insert(transaction_document(user_id, "b3", "Returned",
+                              borrow_date=now - timedelta(days=10), return_date=now - timedelta(days=5)))
+    await transactions.insert(transaction_document(user_id, "b4", "Borrowed", borrow_date=now))
+
+    response = await validation_client.post("/admin/jobs/archive-transactions?older_than_days=180", headers=headers)
+    assert response.status_code == 202
+    await jobs.job_runner.join()
+    job = (await validation_client.get(f"/admin/jobs/{response.json()['id']}", headers=headers)).json()
+    assert job["status"] == "succeeded" and job["result"]["archived"] == 3 and job["done"] == job["total"] == 3
+    assert sum((await transactions.count_by_status()).values()) == 2
+    assert await transactions.count_archived() == 3
+
+    # ประวัติ export และสถิติเห็นทั้งสองที่
+    history = (await validation_client.get(f"/transactions/user/{user_id}", headers=headers)).json()
+    assert len(history) == 5 and {t["id"] for t in history} >= {str(t["_id"]) for t in old}
+    # เรียงตาม borrow_date รวมกันทั้งสองที่ (ไม่ใช่ archive ทั้งหมดก่อน)
+    assert [t["book_id"] for t in history] == ["b2", "b1", "b0", "b3", "b4"]
+    listed = (await validation_client.get("/admin/transactions", headers=headers)).json()
+    assert [t["book_id"] for t in listed if t["user_id"] == user_id] == ["b2", "b1", "b0", "b3", "b4"]
+    archived = await validation_client.get(f"/admin/transactions/{old[0]['_id']}", headers=headers)
+    assert archived.status_code == 200 and archived.json()["status"] == "Returned"
+    export = await validation_client.get("/admin/export/transactions?format=csv", headers=headers)
+    rows = list(csv.DictReader(io.StringIO(export.text)))
+    assert [row["book_id"] for row in rows] == ["b2", "b1", "b0", "b3", "b4"]
+    start = (now - timedelta(days=401)).isoformat()
+    ranged = await validation_client.get(f"/admin/export/transactions?start={start}&status=Returned", headers=headers)
+    assert sorted(json.loads(line)["book_id"] for line in ranged.text.splitlines()) == ["b0", "b1", "b3"]
+    borrowed = await validation_client.get("/admin/export/transactions?status=Borrowed", headers=headers)
+    assert len(borrowed.text.splitlines()) == 1
+    stats = (await validation_client.get("/admin/stats", headers=headers)).json()
+    assert stats["total_transactions"] == 5 and stats["returned_books"] == 4
+
+    # การย้ายที่หยุดกลางทาง (bucket เขียนแล้วแต่ยังไม่ได้ลบ) รันใหม่ได้โดยไม่ซ้ำ
+    await transactions.insert(await transactions.find(old[0]["_id"]))
+    assert (await archive_returned(180))["archived"] == 1
+    assert len((await validation_client.get(f"/transactions/user/{user_id}", headers=headers)).json()) == 5
+
+# 37. Principal Cache - A lookup that races an invalidation is not cached
+@pytest.mark.asyncio
+async def test_principal_cache_invalidation_race(validation_client: AsyncClient):
+    admin_token = await get_admin_token(validation_client)
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    user_token = await get_user_token(validation_client, "pc2", "pc2@test.com", "pass123")
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    user_id = (await validation_client.get("/auth/me", headers=user_headers)).json()["id"]
+    principal_cache.clear()
+
+    # The role changes while a cache miss is still waiting for its lookup
+    users = repositories().users
+    lookup = users.by_username
+    async def racing_lookup(username):
+        user = await lookup(username)
+        del users.by_username  # race once: the admin's own request uses the real lookup
+        await validation_client.put(f"/admin/users/{user_id}/role", params={"new_role": "admin"}, headers=admin_headers)
+        return user
+    users.by_username = racing_lookup
+    assert (await get_current_user(user_token)).role == "user"
+    assert principal_cache.get("pc2") is None
+    assert (await validation_client.get("/admin/stats", headers=user_headers)).status_code == 200
+
+    generation = principal_generation()
+    invalidate_principal("pc2")
+    assert store_principal("pc2", {"role": "user"}, generation) is False
+    assert principal_cache.get("pc2") is None
+
+# 38. Password Hashing Pool - A request cancelled while queued leaves the queue
+@pytest.mark.asyncio
+async def test_password_hash_pool_cancelled_while_queued():
+    import threading
+    pool = PasswordHashPool(workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "done"
+    busy = asyncio.create_task(pool.run(blocking))
+    assert await asyncio.to_thread(started.wait, 5)
+
+    waiting = asyncio.create_task(pool.run(str, "queued"))
+    await asyncio.sleep(0)
+    assert pool.stats()["queued"] == 1
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert pool.stats()["queued"] == 0
+
+    release.set()
+    assert await busy == "done"
+    assert await pool.run(str, "next") == "next"
+    assert pool.stats()["completed"] == 2
+
+# 39. Slow Query Log - An idle change stream tail is not a slow query
+def test_slow_query_log_ignores_idle_tail(caplog):
+    profiler = CommandProfiler(slow_query_ms=5)
+    commands = [
+        (1, {"getMore": 42, "collection": "books", "maxTimeMS": 1000}),  # awaitData: รอการเปลี่ยนแปลงครบ 1 วินาที
+        (2, {"getMore": 43, "collection": "books"}),  # cursor ปกติ: ยังเป็น slow query
+    ]
+    with caplog.at_level("WARNING", logger="app.profiler"):
+        for request_id, command in commands:
+            profiler.started(SimpleNamespace(command_name="getMore", command=command, connection_id=("h", 1), request_id=request_id))
+            profiler.succeeded(SimpleNamespace(command_name="getMore", connection_id=("h", 1), request_id=request_id, duration_micros=1_000_000))
+
+    assert len(caplog.records) == 1
+    assert "getMore on books took 1000.0ms" in caplog.records[0].getMessage()
+    assert not profiler._pending
+
+# 40. Background Jobs - Deleting a user with a book on loan fails and leaves requests intact
+@pytest.mark.asyncio
+async def test_delete_user_job_with_loan(validation_client: AsyncClient):
+    from bson import ObjectId
+
+    admin_token = await get_admin_token(validation_client)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    user_token = await get_user_token(validation_client, "du1", "du1@test.com", "pass123")
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    user_id = (await validation_client.get("/auth/me", headers=user_headers)).json()["id"]
+    book_ids = [
+        (await validation_client.post("/books/", json={"title": f"d{i}", "author": "a", "isbn": f"d-{i}", "quantity": 1}, headers=headers)).json()["id"]
+        for i in range(2)
+    ]
+    borrow = lambda book_id: validation_client.post("/transactions/borrow", json={"user_id": user_id, "book_id": book_id}, headers=user_headers)
+    loan = (await borrow(book_ids[0])).json()["id"]
+    assert (await validation_client.post(f"/admin/transactions/{loan}/approve-borrow", headers=headers)).status_code == 200
+    pending = (await borrow(book_ids[1])).json()["id"]
+    before = (await validation_client.get("/admin/stats", headers=headers)).json()
+
+    response = await validation_client.post(f"/admin/jobs/delete-user/{user_id}", headers=headers)
+    await jobs.job_runner.join()
+    job = (await validation_client.get(f"/admin/jobs/{response.json()['id']}", headers=headers)).json()
+    assert job["status"] == "failed" and "1 book(s) on loan" in job["error"]
+
+    assert (await validation_client.get("/auth/me", headers=user_headers)).status_code == 200
+    assert await repositories().transactions.count(user_id=user_id, status="Cancelled") == 0
+    after = (await validation_client.get("/admin/stats", headers=headers)).json()
+    assert after["total_transactions"] == before["total_transactions"] == 2
+    assert after["active_borrows"] == before["active_borrows"] == 1
+    assert (await repositories().transactions.get(ObjectId(pending)))["status"] == "Pending"
+
+    # คำขอที่ถูกคืนสถานะอนุมัติได้ตามปกติ
+    approved = await validation_client.post(f"/admin/transactions/{pending}/approve-borrow", headers=headers)
+    assert approved.status_code == 200 and approved.json()["status"] == "Borrowed"
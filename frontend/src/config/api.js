@@ -79,10 +79,12 @@ export const API_ENDPOINTS = {
   // Books Endpoints - จัดการข้อมูลหนังสือ
   BOOKS: `${API_BASE_URL}/books`,  // ดึงรายการหนังสือทั้งหมด
   BOOK_BY_ID: (id) => `${API_BASE_URL}/books/${id}`,  // ดึงข้อมูลหนังสือตาม ID
+  BOOKS_BATCH: `${API_BASE_URL}/books/batch`,  // ดึงหนังสือหลายเล่มตาม ID
   
   // Users Endpoints - จัดการข้อมูลผู้ใช้
   USERS: `${API_BASE_URL}/users`,  // สร้างผู้ใช้ใหม่
   USER_BY_ID: (id) => `${API_BASE_URL}/users/${id}`,  // ดึงข้อมูลผู้ใช้ตาม ID
+  USERS_BATCH: `${API_BASE_URL}/users/batch`,  // ดึงผู้ใช้หลายคนตาม ID
   
   // Admin Endpoints - จัดการฟีเจอร์สำหรับ Admin
   ADMIN_USERS: `${API_BASE_URL}/admin/users`,  // ดึงรายการผู้ใช้ทั้งหมด (Admin only)
@@ -94,6 +96,7 @@ export const API_ENDPOINTS = {
   ADMIN_TRANSACTION_BY_ID: (id) => `${API_BASE_URL}/admin/transactions/${id}`,  // ดึงข้อมูล transaction ตาม ID (Admin only)
   ADMIN_APPROVE_BORROW: (id) => `${API_BASE_URL}/admin/transactions/${id}/approve-borrow`,  // อนุมัติการยืม (Admin only)
   ADMIN_APPROVE_RETURN: (id) => `${API_BASE_URL}/admin/transactions/${id}/approve-return`,  // อนุมัติการคืน (Admin only)
+  ADMIN_EVENTS: `${API_BASE_URL}/admin/events`,  // รับการเปลี่ยนสถานะ transactions แบบ real-time (SSE, Admin only)
   
   // Transactions Endpoints - จัดการการยืม-คืนหนังสือ
   BORROW: `${API_BASE_URL}/transactions/borrow`,  // ยืมหนังสือ (สร้าง transaction แบบ Pending)
@@ -33,6 +33,8 @@ export default function BooksScreen() {
   const [books, setBooks] = useState([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [modalVisible, setModalVisible] = useState(false);
   const [editingBookId, setEditingBookId] = useState(null);
   const [formData, setFormData] = useState({
@@ -51,9 +53,10 @@ export default function BooksScreen() {
   const loadBooks = async () => {
     try {
       console.log('Loading books...');
-      const data = await booksAPI.getAll();
-      console.log('Books loaded:', data.length, 'books');
-      setBooks(data);
+      const page = await booksAPI.getPage();
+      console.log('Books loaded:', page.items.length, 'books');
+      setBooks(page.items);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Error loading books:', error);
       Alert.alert('Error', 'ไม่สามารถโหลดข้อมูลหนังสือได้');
@@ -68,6 +71,23 @@ export default function BooksScreen() {
     loadBooks();
   };
 
+  // loadMoreBooks - โหลดหน้าถัดไปเมื่อเลื่อนถึงท้ายรายการ
+  const loadMoreBooks = async () => {
+    if (!nextCursor || loadingMore) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const page = await booksAPI.getPage(nextCursor);
+      setBooks((current) => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error loading more books:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleImageInput = (text) => {
     setFormData({ ...formData, image_url: text });
     if (text && (text.startsWith('http') || text.startsWith('data:') || text.startsWith('/'))) {
@@ -380,6 +400,11 @@ export default function BooksScreen() {
         }
         contentContainerStyle={styles.listContainer}
         showsVerticalScrollIndicator={false}
+        onEndReached={loadMoreBooks}
+        onEndReachedThreshold={0.5}
+        ListFooterComponent={
+          loadingMore ? <ActivityIndicator size="small" color="#6366F1" /> : null
+        }
         ListEmptyComponent={
           <View style={styles.emptyContainer}>
             <Text style={styles.emptyIcon}>📚</Text>
@@ -25,7 +25,6 @@ export default function TransactionsScreen() {
   const isAdmin = user?.role === 'admin';
   
   const [books, setBooks] = useState([]);
-  const [users, setUsers] = useState([]);
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
@@ -92,24 +91,31 @@ export default function TransactionsScreen() {
   }, []);
 
   // Reload data when screen comes into focus (for admin to see new requests)
+  // While focused, admins also get pushed events (new borrow/return requests, approvals)
+  // and reload once per burst of events instead of polling
   useFocusEffect(
     React.useCallback(() => {
-      if (isAdmin) {
-        console.log('TransactionsScreen: Screen focused, reloading data...');
-        loadData();
-      }
+      if (!isAdmin) return undefined;
+      console.log('TransactionsScreen: Screen focused, reloading data...');
+      loadData();
+      let reloadTimer = null;
+      const unsubscribe = adminAPI.subscribeEvents(() => {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(loadData, 500);
+      });
+      return () => {
+        clearTimeout(reloadTimer);
+        unsubscribe();
+      };
     }, [isAdmin])
   );
 
   const loadData = async () => {
     try {
       if (isAdmin) {
-        // For admin, load all transactions, books, and users
-        const [transactionsData, booksData, usersData] = await Promise.all([
-          adminAPI.getAllTransactions(),
-          booksAPI.getAll(),
-          adminAPI.getAllUsers(),
-        ]);
+        // For admin, load all transactions with book titles and usernames
+        // resolved by the server (expand=true), no separate books/users requests
+        const transactionsData = await adminAPI.getAllTransactions(true);
         
         // Sort transactions: Pending requests first, then by date (newest first)
         const sortedTransactions = transactionsData.sort((a, b) => {
@@ -137,8 +143,6 @@ export default function TransactionsScreen() {
         console.log('Pending returns:', sortedTransactions.filter(t => t.status === 'PendingReturn').length);
         
         setTransactions(sortedTransactions);
-        setBooks(booksData);
-        setUsers(usersData);
       } else {
         // For regular users, just load books
         const [booksData] = await Promise.all([booksAPI.getAll()]);
@@ -202,11 +206,11 @@ export default function TransactionsScreen() {
     }
 
     const confirmApprove = Platform.OS === 'web' && typeof window !== 'undefined'
-      ? window.confirm(`คุณต้องการอนุมัติการยืมหนังสือ "${getBookTitle(transaction.book_id)}" ให้ผู้ใช้ "${getUserName(transaction.user_id)}" หรือไม่?`)
+      ? window.confirm(`คุณต้องการอนุมัติการยืมหนังสือ "${getBookTitle(transaction)}" ให้ผู้ใช้ "${getUserName(transaction)}" หรือไม่?`)
       : await new Promise(resolve => {
           Alert.alert(
             'ยืนยันการอนุมัติ',
-            `คุณต้องการอนุมัติการยืมหนังสือ "${getBookTitle(transaction.book_id)}" ให้ผู้ใช้ "${getUserName(transaction.user_id)}" หรือไม่?`,
+            `คุณต้องการอนุมัติการยืมหนังสือ "${getBookTitle(transaction)}" ให้ผู้ใช้ "${getUserName(transaction)}" หรือไม่?`,
             [
               { text: 'ยกเลิก', style: 'cancel', onPress: () => resolve(false) },
               { text: 'อนุมัติ', onPress: () => resolve(true) },
@@ -246,11 +250,11 @@ export default function TransactionsScreen() {
     }
 
     const confirmApprove = Platform.OS === 'web' && typeof window !== 'undefined'
-      ? window.confirm(`คุณต้องการอนุมัติการคืนหนังสือ "${getBookTitle(transaction.book_id)}" จากผู้ใช้ "${getUserName(transaction.user_id)}" หรือไม่?`)
+      ? window.confirm(`คุณต้องการอนุมัติการคืนหนังสือ "${getBookTitle(transaction)}" จากผู้ใช้ "${getUserName(transaction)}" หรือไม่?`)
       : await new Promise(resolve => {
           Alert.alert(
             'ยืนยันการอนุมัติ',
-            `คุณต้องการอนุมัติการคืนหนังสือ "${getBookTitle(transaction.book_id)}" จากผู้ใช้ "${getUserName(transaction.user_id)}" หรือไม่?`,
+            `คุณต้องการอนุมัติการคืนหนังสือ "${getBookTitle(transaction)}" จากผู้ใช้ "${getUserName(transaction)}" หรือไม่?`,
             [
               { text: 'ยกเลิก', style: 'cancel', onPress: () => resolve(false) },
               { text: 'อนุมัติ', onPress: () => resolve(true) },
@@ -298,22 +302,16 @@ export default function TransactionsScreen() {
     }
   };
 
-  // Helper function to get user name by ID
-  const getUserName = (userId) => {
-    const foundUser = users.find(u => u.id === userId);
-    return foundUser ? foundUser.username : userId;
-  };
+  // Helper function to get the user name of an (expanded) transaction
+  const getUserName = (transaction) => transaction.username || transaction.user_id;
 
-  // Helper function to get book title by ID
-  const getBookTitle = (bookId) => {
-    const foundBook = books.find(b => b.id === bookId);
-    return foundBook ? foundBook.title : bookId;
-  };
+  // Helper function to get the book title of an (expanded) transaction
+  const getBookTitle = (transaction) => transaction.book_title || transaction.book_id;
 
   // Component for transaction item with animation
   const TransactionItem = ({ item, index }) => {
-    const userName = getUserName(item.user_id);
-    const bookTitle = getBookTitle(item.book_id);
+    const userName = getUserName(item);
+    const bookTitle = getBookTitle(item);
     const isPending = item.status === 'Pending';
     const isBorrowed = item.status === 'Borrowed';
     const isPendingReturn = item.status === 'PendingReturn';
@@ -78,11 +78,33 @@ api.interceptors.response.use(
 // ============================================
 
 export const booksAPI = {
-  // getAll - ดึงรายการหนังสือทั้งหมด
+  // getPage - ดึงรายการหนังสือทีละหน้า (cursor pagination)
+  // Public endpoint - ไม่ต้อง login ก็ดูได้
+  // ส่ง cursor (nextCursor จากหน้าก่อนหน้า) เพื่อขอหน้าถัดไป
+  // nextCursor เป็น null เมื่อถึงหน้าสุดท้ายแล้ว
+  getPage: async (cursor = null, limit = 50) => {
+    const params = { limit };
+    if (cursor) {
+      params.after = cursor;
+    }
+    const response = await api.get(API_ENDPOINTS.BOOKS, { params });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
+  },
+
+  // getAll - ดึงรายการหนังสือทั้งหมด (ไล่ดึงทีละหน้าจนครบ)
   // Public endpoint - ไม่ต้อง login ก็ดูได้
   getAll: async () => {
-    const response = await api.get(API_ENDPOINTS.BOOKS);
-    return response.data;
+    const books = [];
+    let cursor = null;
+    do {
+      const page = await booksAPI.getPage(cursor, 200);
+      books.push(...page.items);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return books;
   },
   
   // getById - ดึงข้อมูลหนังสือตาม ID
@@ -92,6 +114,13 @@ export const booksAPI = {
     return response.data;
   },
   
+  // getByIds - ดึงหนังสือหลายเล่มตาม ID ใน request เดียว
+  // คืนค่า { items, missing } (items เรียงตามลำดับ ids)
+  getByIds: async (ids) => {
+    const response = await api.get(API_ENDPOINTS.BOOKS_BATCH, { params: { ids: ids.join(',') } });
+    return response.data;
+  },
+  
   // create - สร้างหนังสือใหม่
   // Admin only - ต้อง login เป็น Admin
   create: async (bookData) => {
@@ -135,6 +164,13 @@ export const usersAPI = {
     const response = await api.get(API_ENDPOINTS.USER_BY_ID(id));
     return response.data;
   },
+  
+  // getByIds - ดึงผู้ใช้หลายคนตาม ID ใน request เดียว
+  // คืนค่า { items, missing } (items เรียงตามลำดับ ids)
+  getByIds: async (ids) => {
+    const response = await api.get(API_ENDPOINTS.USERS_BATCH, { params: { ids: ids.join(',') } });
+    return response.data;
+  },
 };
 
 // ============================================
@@ -179,8 +215,11 @@ export const adminAPI = {
   
   // getAllTransactions - ดึงรายการ transactions ทั้งหมด
   // Admin only - ใช้ในหน้า TransactionsScreen
-  getAllTransactions: async () => {
-    const response = await api.get(API_ENDPOINTS.ADMIN_TRANSACTIONS);
+  // expand = true: ให้ server ส่งชื่อหนังสือ/ผู้แต่ง/ชื่อผู้ใช้มาด้วย (ไม่ต้องดึง books/users แยก)
+  getAllTransactions: async (expand = false) => {
+    const response = await api.get(API_ENDPOINTS.ADMIN_TRANSACTIONS, {
+      params: expand ? { expand: true } : {},
+    });
     return response.data;
   },
   
@@ -204,6 +243,67 @@ export const adminAPI = {
     const response = await api.post(API_ENDPOINTS.ADMIN_APPROVE_RETURN(transactionId));
     return response.data;
   },
+  
+  // subscribeEvents - รับการเปลี่ยนสถานะ transactions แบบ real-time (Server-Sent Events)
+  // Admin only - ใช้ในหน้า TransactionsScreen แทนการโหลดรายการซ้ำๆ
+  // onEvent(type, data): type = "transaction" หรือ "resync" (ให้โหลดรายการใหม่ทั้งหมด)
+  // คืนฟังก์ชันสำหรับปิดการเชื่อมต่อ
+  // ใช้ XMLHttpRequest เพราะ EventSource ส่ง Authorization header ไม่ได้ และ React Native ไม่มี EventSource
+  subscribeEvents: (onEvent) => {
+    let xhr = null;
+    let closed = false;
+    let lastEventId = null;
+    let retryMs = 3000;
+    let timer = null;
+    
+    const connect = async () => {
+      const token = await AsyncStorage.getItem('token');
+      if (closed) return;
+      let offset = 0;  // ตำแหน่งใน responseText ที่อ่านแล้ว
+      xhr = new XMLHttpRequest();
+      xhr.open('GET', API_ENDPOINTS.ADMIN_EVENTS);
+      xhr.setRequestHeader('Accept', 'text/event-stream');
+      if (token) xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+      if (lastEventId !== null) xhr.setRequestHeader('Last-Event-ID', String(lastEventId));
+      
+      // แยก response ที่เข้ามาเป็น event (คั่นด้วยบรรทัดว่าง)
+      xhr.onprogress = () => {
+        const text = xhr.responseText;
+        let end = text.indexOf('\n\n', offset);
+        while (end !== -1) {
+          const frame = text.slice(offset, end);
+          offset = end + 2;
+          end = text.indexOf('\n\n', offset);
+          let type = 'message';
+          let data = '';
+          frame.split('\n').forEach((line) => {
+            if (line.startsWith('event: ')) type = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+            else if (line.startsWith('id: ')) lastEventId = Number(line.slice(4));
+            else if (line.startsWith('retry: ')) retryMs = Number(line.slice(7));
+          });
+          if (data) onEvent(type, JSON.parse(data));
+        }
+        // responseText สะสมไปเรื่อยๆ - เชื่อมต่อใหม่เมื่อใหญ่เกิน 1 MB (ส่ง Last-Event-ID จึงไม่พลาด event)
+        if (offset > 1024 * 1024) xhr.abort();
+      };
+      
+      // การเชื่อมต่อจบ (server ปิด, เครือข่ายหลุด หรือเกิน 1 MB) - เชื่อมต่อใหม่หลัง retryMs
+      // ไม่เชื่อมต่อใหม่ถ้าไม่มีสิทธิ์ (token หมดอายุ หรือไม่ใช่ Admin)
+      xhr.onloadend = () => {
+        if (xhr.status === 401 || xhr.status === 403) return;
+        if (!closed) timer = setTimeout(connect, retryMs);
+      };
+      xhr.send();
+    };
+    
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      if (xhr) xhr.abort();
+    };
+  },
 };
 
 // ============================================
@@ -239,8 +339,11 @@ export const transactionsAPI = {
   // getUserHistory - ดูประวัติการยืม-คืนของผู้ใช้
   // Protected endpoint - ต้อง login
   // ผู้ใช้สามารถดูประวัติของตัวเองเท่านั้น (ยกเว้น Admin)
-  getUserHistory: async (userId) => {
-    const response = await api.get(API_ENDPOINTS.USER_HISTORY(userId));
+  // expand = true: ให้ server ส่งชื่อหนังสือและผู้แต่งมาด้วย
+  getUserHistory: async (userId, expand = false) => {
+    const response = await api.get(API_ENDPOINTS.USER_HISTORY(userId), {
+      params: expand ? { expand: true } : {},
+    });
     return response.data;
   },
 };